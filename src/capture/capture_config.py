@@ -0,0 +1,106 @@
+# src/capture/capture_config.py
+import ctypes
+import socket
+import struct
+import subprocess
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+DEFAULT_BPF_FILTER = "ip and (tcp or udp)"
+# Ethernet (14) + IPv4 with options (60) + TCP with options (60) fits in 134;
+# 96 covers the common no-options case and is what we use by default.
+DEFAULT_SNAPLEN = 96
+DEFAULT_BUFFER_BYTES = 32 * 1024 * 1024
+
+# Linux constants (not all exported by the socket module)
+SO_ATTACH_FILTER = 26
+SO_RCVBUFFORCE = 33
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
+
+@dataclass
+class CaptureConfig:
+    """
+    Capture settings for capture_live.
+    - bpf_filter: kernel-side filter, non-matching frames never reach Python
+    - snaplen: bytes copied per packet (headers only); byte counters still use
+      the length from the IP header
+    - buffer_bytes: socket receive buffer, absorbs bursts
+    - interfaces: empty = auto-detect
+    - stats_interval: seconds between kernel receive/drop reports (0 = off)
+    """
+    bpf_filter: str = DEFAULT_BPF_FILTER
+    snaplen: int = DEFAULT_SNAPLEN
+    buffer_bytes: int = DEFAULT_BUFFER_BYTES
+    interfaces: List[str] = field(default_factory=list)
+    stats_interval: float = 10.0
+
+
+def compile_bpf(bpf_filter: str, snaplen: int, iface: Optional[str] = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Compile a filter with `tcpdump -ddd`; -s makes the program's accept
+    instruction return `snaplen`, which is what truncates packets in-kernel.
+    """
+    cmd = ["tcpdump", "-ddd", "-s", str(int(snaplen))]
+    if iface:
+        cmd += ["-i", iface]
+    cmd.append(bpf_filter)
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.split("\n")
+    n = int(out[0])
+    return [tuple(int(v) for v in line.split()) for line in out[1:n + 1]]
+
+
+def attach_bpf(sock: socket.socket, program: List[Tuple[int, int, int, int]]):
+    insns = b"".join(struct.pack("HBBI", *ins) for ins in program)
+    buf = ctypes.create_string_buffer(insns)
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def open_capture_socket(iface: str, config: CaptureConfig):
+    """
+    Scapy listen socket with the configured filter, snaplen and buffer.
+    Falls back to scapy's own filter handling (no truncation) when the
+    filter cannot be compiled here (e.g. no tcpdump).
+    """
+    from scapy.all import conf
+
+    try:
+        program = compile_bpf(config.bpf_filter, config.snaplen, iface) if config.bpf_filter else None
+    except Exception as e:
+        print("[capture_config] cannot compile BPF with snaplen, using scapy filter:", e)
+        return conf.L2listen(iface=iface, filter=config.bpf_filter or None)
+
+    sock = conf.L2listen(iface=iface)
+    raw = getattr(sock, "ins", None)
+    if raw is None:
+        sock.close()
+        return conf.L2listen(iface=iface, filter=config.bpf_filter or None)
+    try:
+        # FORCE ignores net.core.rmem_max (needs CAP_NET_ADMIN, which capture has)
+        raw.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, int(config.buffer_bytes))
+    except OSError:
+        try:
+            raw.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(config.buffer_bytes))
+        except OSError as e:
+            print("[capture_config] cannot set receive buffer:", e)
+    if program:
+        attach_bpf(raw, program)
+    return sock
+
+
+def read_kernel_stats(sock) -> Optional[Tuple[int, int]]:
+    """
+    (received, dropped) since the previous call, from PACKET_STATISTICS.
+    The kernel resets the counters on every read. None when unavailable.
+    """
+    raw = getattr(sock, "ins", None)
+    if raw is None:
+        return None
+    try:
+        data = raw.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8)
+    except OSError:
+        return None
+    received, dropped = struct.unpack("II", data)
+    return received, dropped
@@ -6,6 +6,7 @@ import sys
 import time
 import csv
 import socket
+import argparse
 from datetime import datetime
 
 # --- FIX PYTHONPATH FOR ANY EXECUTION LOCATION ---
@@ -17,10 +18,23 @@ if PROJECT_ROOT not in sys.path:
 
 from src.control.decision_controller import DecisionController
 from src.ingestion.flow_aggregator import FlowAggregator
+from src.ingestion.sharded_aggregator import ShardedFlowAggregator
+from src.ingestion.host_aggregator import HostAggregator
 from src.models.analyzer import Analyzer
+from src.models.features import FEATURES as MODEL_FEATURES, needs_extended_stats
+from src.models.online_learner import OnlineLearner
+from src.capture.flow_feed import FlowFeedPublisher
+from src.capture.memory_budget import MemoryBudget
+from src.capture.sampling import PacketSampler, MODE_FLOW_HASH
+from src.capture.capture_config import (CaptureConfig, DEFAULT_BPF_FILTER, DEFAULT_SNAPLEN,
+                                        DEFAULT_BUFFER_BYTES)
+from src.capture.multi_capture import MultiCapture
+from src.capture.pipeline import FlowPipeline
+from src.control.prefix_map import PrefixMap
+from src.reporting import metrics
 
 try:
-    from scapy.all import sniff, IP, TCP, UDP
+    from scapy.all import IP, TCP, UDP
 except Exception as e:
     raise RuntimeError("scapy is required for live capture. Install scapy and run as root.") from e
 
@@ -31,6 +45,88 @@ except Exception:
 
 OUTPUT_FILE = os.path.join(PROJECT_ROOT, "data", "flows", "processed", "live_flows.csv")
 FLOW_TIMEOUT = 10.0
+# Idle timeout per IP protocol (falls back to FLOW_TIMEOUT)
+PROTO_TIMEOUTS = {6: FLOW_TIMEOUT, 17: 5.0}
+# Long-lived flows are emitted as partial records after this many seconds
+ACTIVE_TIMEOUT = 60.0
+# Grace period after FIN/RST before a TCP flow is closed
+FLOW_LINGER = 1.0
+
+# Flow table split across FLOW_SHARDS worker processes (0 = in-process);
+# shards are polled every SHARD_TICK_INTERVAL seconds of packet time
+FLOW_SHARDS = 0
+SHARD_TICK_INTERVAL = 0.1
+
+# Early scoring: score active flows after N packets or T seconds and then
+# every RESCORE_INTERVAL seconds, so the controller can act before expiry.
+# Provisional scores go to the controller only; the CSV keeps final flows.
+# A provisional score acts only as "attack" above EARLY_ATTACK_RATIO x the
+# model threshold (never as a temporary block); weaker ones wait for the
+# final score.
+EARLY_SCORING = True
+EARLY_SCORE_PACKETS = 20
+EARLY_SCORE_SECONDS = 1.0
+EARLY_ATTACK_RATIO = 3.0
+RESCORE_INTERVAL = 1.0
+
+# Host-level window counters (floods, scans); sources crossing a threshold
+# are reported to the controller as "attack", flooded targets are logged.
+HOST_AGGREGATION = True
+HOST_WINDOW = 5.0
+HOST_EVAL_INTERVAL = 1.0
+
+# Load shedding: "off", "flow_hash" (keep 1 in N flows) or "probabilistic"
+# (keep 1 in N packets, counters rescaled). With SAMPLING_AUTO the rate is
+# raised while packet rate / processing load is above the engage levels.
+SAMPLING_MODE = MODE_FLOW_HASH
+SAMPLING_FIXED_RATE = 1
+SAMPLING_AUTO = True
+SAMPLING_ENGAGE_PPS = 50000
+SAMPLING_ENGAGE_UTIL = 0.9
+# One flow per connection (both directions) instead of one per direction
+BIDIRECTIONAL_FLOWS = True
+
+# Local streaming feed of scored flow batches (Unix domain socket).
+# Disabled by default; consumers connect with flow_feed.FlowFeedSubscriber.
+FEED_ENABLED = False
+FEED_SOCKET = os.path.join(PROJECT_ROOT, "data", "flows", "live_flows.sock")
+FEED_MAX_QUEUE = 256
+
+# Packets waiting between the capture threads (one per interface) and the
+# aggregation / scoring loop; on overflow packets are dropped and counted
+CAPTURE_QUEUE_SIZE = 100000
+CAPTURE_BATCH = 512
+
+# Pipeline metrics (counters, gauges, latency histograms). When enabled they
+# are served in Prometheus text format on 127.0.0.1:METRICS_PORT/metrics
+# (0 = no HTTP endpoint) and summarised in the log every METRICS_LOG_INTERVAL
+# seconds (0 = no log line). Disabled metrics are no-op objects.
+METRICS_ENABLED = False
+METRICS_PORT = 9108
+METRICS_LOG_INTERVAL = 30.0
+
+# Online learning: every ONLINE_UPDATE_INTERVAL seconds the KMeans is
+# partial_fit on a reservoir of flows scoring well below the threshold
+# (ONLINE_LEARN_MARGIN * threshold) and the threshold follows the live
+# score distribution; the updated model is swapped into the Analyzer.
+# Off by default: the offline model in models/ is used unchanged.
+ONLINE_LEARNING = False
+ONLINE_UPDATE_INTERVAL = 300.0
+ONLINE_RESERVOIR_SIZE = 5000
+ONLINE_LEARN_MARGIN = 0.5
+
+# Memory budget (RSS, MB) of the capture process, 0 = unbounded. What is left
+# after start-up is split by MEMORY_SHARES into caps on the flow table, the
+# controller's source / block tables, the host tables and the score cache;
+# near the budget early scoring is paused and sampling forced, over it the
+# caps shrink (oldest flows flushed early). See memory_budget.py.
+MEMORY_BUDGET_MB = 0
+MEMORY_SHARES = {"flows": 0.5, "controller": 0.2, "hosts": 0.15, "score_cache": 0.1}
+MEMORY_SOFT_LIMIT = 0.8
+MEMORY_CHECK_INTERVAL = 1.0
+
+# Extra CIDRs treated as local when deciding flow direction (besides host addresses)
+LOCAL_NETWORKS = []
 
 FEATURES = [
     "timestamp",
@@ -47,7 +143,8 @@ FEATURES = [
     "src_port",
     "dst_port",
     "anomaly_score",
-    "label"
+    "label",
+    "sample_rate"
 ]
 
 import psutil
@@ -78,10 +175,33 @@ def get_local_ips():
     except:
         pass
     local_ips.add("127.0.0.1")
+    if netifaces is not None:
+        for iface in netifaces.interfaces():
+            for fam in (netifaces.AF_INET, netifaces.AF_INET6):
+                for addr in netifaces.ifaddresses(iface).get(fam, []):
+                    if addr.get("addr"):
+                        local_ips.add(addr["addr"].split("%")[0])
     return local_ips
 
+def get_local_networks():
+    nets = PrefixMap(LOCAL_NETWORKS)
+    for ip in get_local_ips():
+        try:
+            nets.insert(ip)
+        except (OSError, ValueError):
+            pass
+    return nets
+
 def ensure_out():
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    if os.path.exists(OUTPUT_FILE):
+        with open(OUTPUT_FILE, newline="") as f:
+            header = next(csv.reader(f), None)
+        if header != FEATURES:
+            # columns changed: keep the old file aside instead of mixing layouts
+            old = OUTPUT_FILE + datetime.now().strftime(".%Y%m%d%H%M%S.old")
+            os.replace(OUTPUT_FILE, old)
+            print(f"[capture_live] CSV columns changed, previous file moved to {old}")
     if not os.path.exists(OUTPUT_FILE):
         with open(OUTPUT_FILE, "w", newline="") as f:
             writer = csv.writer(f)
@@ -96,25 +216,64 @@ def pkt_to_tuple(pkt):
     proto = None
     sport = None
     dport = None
+    flags = 0
     if pkt.haslayer(TCP):
         proto = 6
         sport = pkt[TCP].sport
         dport = pkt[TCP].dport
+        flags = int(pkt[TCP].flags)
     elif pkt.haslayer(UDP):
         proto = 17
         sport = pkt[UDP].sport
         dport = pkt[UDP].dport
     else:
         return None
-    size = len(pkt)
-    return src, dst, sport, dport, proto, size
+    # with a snaplen the frame is truncated: take the length from the IP header
+    size = getattr(pkt, "wirelen", None) or max(len(pkt), int(ip.len or 0) + len(pkt) - len(ip))
+    return src, dst, sport, dport, proto, size, flags
 
-def main():
-    iface = detect_interface()
-    print(f"[capture_live] using interface: {iface}")
+def parse_args(argv=None) -> CaptureConfig:
+    parser = argparse.ArgumentParser(description="Live flow capture and scoring")
+    parser.add_argument("-i", "--iface", action="append", default=[],
+                        help="interface to capture on, repeatable; 'pcap:<file>' replays "
+                             "a capture file instead (default: busiest interface)")
+    parser.add_argument("--filter", default=DEFAULT_BPF_FILTER,
+                        help=f"BPF capture filter (default: {DEFAULT_BPF_FILTER!r}, '' = none)")
+    parser.add_argument("--snaplen", type=int, default=DEFAULT_SNAPLEN,
+                        help="bytes captured per packet")
+    parser.add_argument("--buffer-mb", type=float, default=DEFAULT_BUFFER_BYTES / 2 ** 20,
+                        help="kernel receive buffer in MiB")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="seconds between kernel drop reports (0 = off)")
+    args = parser.parse_args(argv)
+    return CaptureConfig(bpf_filter=args.filter, snaplen=args.snaplen,
+                         buffer_bytes=int(args.buffer_mb * 2 ** 20),
+                         interfaces=args.iface, stats_interval=args.stats_interval)
+
+def main(config: CaptureConfig = None):
+    config = config or parse_args()
+    # before any component is created: they look up their metrics once
+    metrics.configure(METRICS_ENABLED)
+    sources = config.interfaces or [detect_interface()]
+    print(f"[capture_live] using interfaces: {', '.join(sources)} "
+          f"(filter={config.bpf_filter!r}, snaplen={config.snaplen})")
+    capture = MultiCapture(sources, config, pkt_to_tuple, queue_size=CAPTURE_QUEUE_SIZE)
+    last_stats = time.time()
     ensure_out()
-    local_ips = get_local_ips()
-    aggregator = FlowAggregator(timeout=FLOW_TIMEOUT)
+    local_ips = get_local_networks()
+    flow_kwargs = dict(timeout=FLOW_TIMEOUT, bidirectional=BIDIRECTIONAL_FLOWS,
+                       idle_timeouts=PROTO_TIMEOUTS, active_timeout=ACTIVE_TIMEOUT,
+                       linger=FLOW_LINGER,
+                       extended_stats=needs_extended_stats(MODEL_FEATURES),
+                       provisional_packets=EARLY_SCORE_PACKETS if EARLY_SCORING else None,
+                       provisional_seconds=EARLY_SCORE_SECONDS if EARLY_SCORING else None,
+                       rescore_interval=RESCORE_INTERVAL)
+    if FLOW_SHARDS:
+        aggregator = ShardedFlowAggregator(n_shards=FLOW_SHARDS, tick_interval=SHARD_TICK_INTERVAL,
+                                           **flow_kwargs)
+        print(f"[capture_live] flow table split across {FLOW_SHARDS} shard processes")
+    else:
+        aggregator = FlowAggregator(**flow_kwargs)
 
     try:
         analyzer = Analyzer()
@@ -122,66 +281,125 @@ def main():
         print("[capture_live] Analyzer not available:", e)
         analyzer = None
 
+    learner = None
+    if ONLINE_LEARNING and analyzer is not None:
+        learner = OnlineLearner(analyzer, interval=ONLINE_UPDATE_INTERVAL,
+                                reservoir_size=ONLINE_RESERVOIR_SIZE, learn_margin=ONLINE_LEARN_MARGIN)
+        print(f"[capture_live] online learning every {ONLINE_UPDATE_INTERVAL:.0f}s")
+
     controller = DecisionController()
+    hosts = HostAggregator(window=HOST_WINDOW) if HOST_AGGREGATION else None
+    sampler = PacketSampler(mode=SAMPLING_MODE, fixed_rate=SAMPLING_FIXED_RATE, auto=SAMPLING_AUTO,
+                            engage_pps=SAMPLING_ENGAGE_PPS, release_pps=SAMPLING_ENGAGE_PPS * 0.6,
+                            engage_util=SAMPLING_ENGAGE_UTIL)
 
-    def handle(pkt):
-        tup = pkt_to_tuple(pkt)
-        if tup is None:
-            return
-        src, dst, sport, dport, proto, size = tup
-        direction = "fwd" if src in local_ips else "bwd"
-        ts = time.time()
-        aggregator.push_packet(src, dst, sport, dport, proto, size, direction, ts=ts)
-
-        ready = aggregator.extract_ready_flows()
-        if ready:
-            rows = []
-            for f in ready:
-                rec = f.to_dict()
-
-                if analyzer:
-                    try:
-                        score = analyzer.score(rec)
-                        label = analyzer.label_from_score(score)
-                    except Exception as e:
-                        score = -1.0
-                        label = "unknown"
-                else:
-                    score = -1.0
-                    label = "unknown"
-
-                rec["anomaly_score"] = float(score)
-                rec["label"] = label
-
-    
-                rec["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                try:
-                    controller.react(rec, label)
-                except Exception as e:
-                    print("[capture_live] controller error:", e)
-
-                rows.append(rec)
-
-            with open(OUTPUT_FILE, "a", newline="") as f:
-                writer = csv.writer(f)
-                for r in rows:
-                    writer.writerow([r.get(col, "") for col in FEATURES])
-
-    print("[capture_live] starting sniff()")
+    m_csv = metrics.histogram("csv_write_seconds", "CSV append time per expiry batch")
+    m_rows = metrics.counter("csv_rows_total", "Flow rows written to CSV")
+    metrics.gauge("capture_queue_fill", "Capture queue fill level (0..1)", fn=capture.backlog)
+    for w in capture.workers:
+        labels = {"source": w.source}
+        metrics.counter("capture_source_packets_total", "Packets captured per source", labels,
+                        fn=lambda w=w: w.packets)
+        metrics.counter("capture_source_bytes_total", "Bytes captured per source", labels,
+                        fn=lambda w=w: w.bytes)
+        metrics.counter("capture_source_queue_drops_total", "Packets dropped on a full capture queue",
+                        labels, fn=lambda w=w: w.queue_drops)
+        metrics.counter("capture_source_kernel_drops_total", "Packets dropped by the kernel", labels,
+                        fn=lambda w=w: w.kernel_dropped)
+    metrics_server = metrics_logger = None
+    if METRICS_ENABLED:
+        if METRICS_PORT:
+            try:
+                metrics_server = metrics.MetricsServer(port=METRICS_PORT)
+                print(f"[capture_live] metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+            except OSError as e:
+                print("[capture_live] metrics endpoint not available:", e)
+        if METRICS_LOG_INTERVAL:
+            metrics_logger = metrics.MetricsLogger(interval=METRICS_LOG_INTERVAL)
+
+    feed = None
+    if FEED_ENABLED:
+        try:
+            feed = FlowFeedPublisher(FEED_SOCKET, max_queue=FEED_MAX_QUEUE)
+            print(f"[capture_live] flow feed on {FEED_SOCKET}")
+        except Exception as e:
+            print("[capture_live] flow feed not available:", e)
+
+    def write_rows(rows):
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with m_csv.time(), open(OUTPUT_FILE, "a", newline="") as f:
+            writer = csv.writer(f)
+            for r in rows:
+                r["timestamp"] = stamp
+                writer.writerow([r.get(col, "") for col in FEATURES])
+        m_rows.inc(len(rows))
+
+    budget = None
+    if MEMORY_BUDGET_MB:
+        budget = MemoryBudget(MEMORY_BUDGET_MB * 2 ** 20, soft=MEMORY_SOFT_LIMIT,
+                              interval=MEMORY_CHECK_INTERVAL)
+        components = {"flows": aggregator, "controller": controller, "hosts": hosts,
+                      "score_cache": analyzer.cache if analyzer is not None else None,
+                      "sampler": sampler, "learner": learner, "feed": feed}
+        for name, component in components.items():
+            if component is not None:
+                budget.register(name, component, MEMORY_SHARES.get(name, 0.0))
+        print(f"[capture_live] memory budget {MEMORY_BUDGET_MB} MB "
+              f"({budget.available() / 2 ** 20:.0f} MB above start-up)")
+
+    pipeline = FlowPipeline(aggregator, analyzer, controller, hosts=hosts, sampler=sampler,
+                            sink=write_rows, feed=feed, early_scoring=EARLY_SCORING,
+                            provisional_attack_ratio=EARLY_ATTACK_RATIO,
+                            host_eval_interval=HOST_EVAL_INTERVAL,
+                            bidirectional=BIDIRECTIONAL_FLOWS, local_ips=local_ips,
+                            backlog=capture.backlog, learner=learner)
+
+    def report_capture_stats():
+        for source, st in capture.stats().items():
+            print(f"[capture_live] {source}: {st['pps']:.0f} pkt/s {st['bps'] / 1e6:.1f} Mbit/s, "
+                  f"packets {st['packets']} queue drops {st['queue_drops']} "
+                  f"kernel received {st['kernel_received']} dropped {st['kernel_dropped']}")
+
+    print("[capture_live] starting capture")
+    capture.start()
     try:
-        sniff(iface=iface, prn=handle, store=False)
+        while not capture.finished:
+            batch = capture.get_batch(CAPTURE_BATCH)
+            now = time.time()
+            if config.stats_interval and now - last_stats >= config.stats_interval:
+                last_stats = now
+                report_capture_stats()
+            if batch:
+                pipeline.handle_batch(batch)
+            if budget is not None:
+                budget.check(now)
+        print("[capture_live] all capture sources finished")
     except KeyboardInterrupt:
         print("[capture_live] stopped by user")
-        remaining = aggregator.force_close_all()
-        with open(OUTPUT_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
-            for fobj in remaining:
-                rec = fobj.to_dict()
-                rec["anomaly_score"] = -1.0
-                rec["label"] = "flushed"
-                rec["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                writer.writerow([rec.get(col, "") for col in FEATURES])
+    finally:
+        capture.stop()
+        pipeline.flush()
+        if FLOW_SHARDS:
+            aggregator.close()
+        report_capture_stats()
+        print("[capture_live] sampler stats:", sampler.stats())
+        print("[capture_live] controller stats:", controller.stats())
+        if budget is not None:
+            print("[capture_live] memory budget stats:", budget.stats())
+        if analyzer is not None and analyzer.cache is not None:
+            print("[capture_live] score cache stats:", analyzer.cache.stats())
+        controller.close()
+        if learner:
+            print("[capture_live] online learner stats:", learner.stats())
+            learner.close()
+        if metrics_logger:
+            print("[metrics]", metrics.REGISTRY.summary_line())
+            metrics_logger.close()
+        if metrics_server:
+            metrics_server.close()
+        if feed:
+            print("[capture_live] flow feed stats:", feed.stats())
+            feed.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,348 @@
+# src/capture/flow_feed.py
+import os
+import socket
+import struct
+import threading
+import time
+import ipaddress
+from collections import deque
+from typing import Dict, List, Optional
+
+# Binary framing of the feed:
+#   frame  = FRAME_HEADER + count * RECORD
+#   header = magic, version, reserved, record count
+#   record = fixed-size flow record, IPs stored as 16 bytes (IPv4 is v4-mapped)
+# Version 2: packet counters are 64-bit (version 1 had 32-bit ones)
+FEED_MAGIC = b"CFLF"
+FEED_VERSION = 2
+FRAME_HEADER = struct.Struct("<4sBBI")
+RECORD = struct.Struct("<dd16s16sHHBBQQQQf")
+
+# Subscriber handshake: magic + back-pressure policy code, read by the
+# subscriber's own thread within HELLO_TIMEOUT seconds
+HELLO = struct.Struct("<4sB")
+HELLO_TIMEOUT = 1.0
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_BLOCK = "block"
+_POLICY_CODES = {POLICY_DROP_OLDEST: 0, POLICY_BLOCK: 1}
+_POLICY_NAMES = {v: k for k, v in _POLICY_CODES.items()}
+
+LABEL_CODES = {"unknown": 0, "benign": 1, "suspicious": 2, "attack": 3, "flushed": 4}
+LABEL_NAMES = {v: k for k, v in LABEL_CODES.items()}
+
+
+def _pack_ip(ip) -> bytes:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return bytes(16)
+    if addr.version == 4:
+        addr = ipaddress.IPv6Address("::ffff:" + str(addr))
+    return addr.packed
+
+
+def _unpack_ip(raw: bytes) -> str:
+    addr = ipaddress.IPv6Address(raw)
+    if addr.ipv4_mapped is not None:
+        return str(addr.ipv4_mapped)
+    return str(addr)
+
+
+def encode_frame(rows, ts=None) -> bytes:
+    """
+    Encode a batch of scored flow dicts (as produced in capture_live.handle)
+    into a single feed frame. Rows that cannot be encoded (e.g. negative
+    counters) are left out; the header counts the records actually written.
+    """
+    ts = float(ts or time.time())
+    parts = []
+    for r in rows:
+        try:
+            parts.append(RECORD.pack(
+                ts,
+                float(r.get("duration", 0.0)),
+                _pack_ip(r.get("src_ip", "")),
+                _pack_ip(r.get("dst_ip", "")),
+                int(r.get("src_port", 0) or 0) & 0xFFFF,
+                int(r.get("dst_port", 0) or 0) & 0xFFFF,
+                int(r.get("protocol", 0) or 0) & 0xFF,
+                LABEL_CODES.get(r.get("label"), 0),
+                int(r.get("tot_fwd_pkts", 0)),
+                int(r.get("tot_bwd_pkts", 0)),
+                int(r.get("src_bytes", 0)),
+                int(r.get("dst_bytes", 0)),
+                float(r.get("anomaly_score", -1.0)),
+            ))
+        except (struct.error, TypeError, ValueError):
+            continue
+    return FRAME_HEADER.pack(FEED_MAGIC, FEED_VERSION, 0, len(parts)) + b"".join(parts)
+
+
+def decode_records(count: int, payload: bytes) -> List[Dict]:
+    out = []
+    for i in range(count):
+        (ts, duration, src, dst, sport, dport, proto, label,
+         fwd, bwd, sbytes, dbytes, score) = RECORD.unpack_from(payload, i * RECORD.size)
+        out.append({
+            "ts": ts,
+            "duration": duration,
+            "src_ip": _unpack_ip(src),
+            "dst_ip": _unpack_ip(dst),
+            "src_port": sport,
+            "dst_port": dport,
+            "protocol": proto,
+            "label": LABEL_NAMES.get(label, "unknown"),
+            "tot_fwd_pkts": fwd,
+            "tot_bwd_pkts": bwd,
+            "src_bytes": sbytes,
+            "dst_bytes": dbytes,
+            "anomaly_score": score,
+        })
+    return out
+
+
+def _recv_exact(sock, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class _Subscriber:
+    """
+    One connected consumer. Frames are queued by the publisher and written to
+    the socket by a dedicated sender thread so a slow consumer never stalls
+    the others. The thread first reads the HELLO; until then (and without
+    one) frames are queued under the publisher's default `policy`.
+    """
+
+    def __init__(self, conn, policy: str, max_queue: int):
+        self.conn = conn
+        self.policy = policy
+        self.max_queue = int(max_queue)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.dropped_frames = 0
+        self.blocked_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def offer(self, frame: bytes, block_timeout: float):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) >= self.max_queue:
+                if self.policy == POLICY_BLOCK:
+                    t0 = time.monotonic()
+                    self._cond.wait_for(
+                        lambda: self._closed or len(self._queue) < self.max_queue,
+                        timeout=block_timeout)
+                    self.blocked_seconds += time.monotonic() - t0
+                    if self._closed:
+                        return
+                    if len(self._queue) >= self.max_queue:
+                        self.dropped_frames += 1
+                        return
+                else:
+                    self._queue.popleft()
+                    self.dropped_frames += 1
+            self._queue.append(frame)
+            self._cond.notify_all()
+
+    def _hello(self):
+        try:
+            self.conn.settimeout(HELLO_TIMEOUT)
+            hello = _recv_exact(self.conn, HELLO.size)
+        except OSError:
+            hello = None
+        try:
+            self.conn.settimeout(None)
+        except OSError:
+            pass
+        if hello:
+            magic, code = HELLO.unpack(hello)
+            if magic == FEED_MAGIC:
+                with self._cond:
+                    self.policy = _POLICY_NAMES.get(code, self.policy)
+
+    def _run(self):
+        self._hello()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._queue)
+                if self._closed:
+                    return
+                frame = self._queue.popleft()
+                self._cond.notify_all()
+            try:
+                self.conn.sendall(frame)
+            except OSError:
+                self.close()
+                return
+            self.sent_frames += 1
+            self.sent_bytes += len(frame)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "policy": self.policy,
+            "queued": len(self._queue),
+            "sent_frames": self.sent_frames,
+            "sent_bytes": self.sent_bytes,
+            "dropped_frames": self.dropped_frames,
+            "blocked_seconds": round(self.blocked_seconds, 6),
+        }
+
+
+class FlowFeedPublisher:
+    """
+    Publishes scored flow batches on a local Unix domain socket.
+    Any number of subscribers may connect; each one announces its
+    back-pressure policy in a HELLO message:
+      - drop_oldest: when its queue is full the oldest frame is discarded
+      - block: publish() waits up to `block_timeout` seconds for space,
+               then drops the new frame
+    """
+
+    def __init__(self, path: str, max_queue: int = 256,
+                 default_policy: str = POLICY_DROP_OLDEST, block_timeout: float = 0.5):
+        if default_policy not in _POLICY_CODES:
+            raise ValueError(f"unknown back-pressure policy: {default_policy}")
+        self.path = path
+        self.max_queue = int(max_queue)
+        self.default_policy = default_policy
+        self.block_timeout = float(block_timeout)
+        self._subs: List[_Subscriber] = []
+        self._lock = threading.Lock()
+        self.published_frames = 0
+        self.published_records = 0
+        self.disconnected = 0
+        self.encode_errors = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(16)
+        self._running = True
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            sub = _Subscriber(conn, self.default_policy, self.max_queue)
+            with self._lock:
+                self._subs.append(sub)
+
+    def publish(self, rows):
+        if not rows:
+            return
+        frame = encode_frame(rows)
+        written = FRAME_HEADER.unpack_from(frame)[3]
+        if written < len(rows):
+            self.encode_errors += len(rows) - written
+            print(f"[FlowFeedPublisher] {len(rows) - written} records could not be encoded, skipped")
+        with self._lock:
+            live = [s for s in self._subs if not s.closed]
+            self.disconnected += len(self._subs) - len(live)
+            self._subs = live
+        for sub in live:
+            sub.offer(frame, self.block_timeout)
+        self.published_frames += 1
+        self.published_records += len(rows)
+
+    def memory_usage(self) -> int:
+        """Bytes of the frames queued for subscribers (a frame shared by several counts once)."""
+        with self._lock:
+            subs = list(self._subs)
+        frames = {}
+        for sub in subs:
+            with sub._cond:
+                for frame in sub._queue:
+                    frames[id(frame)] = len(frame)
+        return sum(frames.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            subs = [s.stats() for s in self._subs]
+        return {
+            "published_frames": self.published_frames,
+            "published_records": self.published_records,
+            "disconnected": self.disconnected,
+            "encode_errors": self.encode_errors,
+            "subscribers": subs,
+        }
+
+    def close(self):
+        self._running = False
+        try:
+            self._server.close()
+        except OSError:
+            pass
+        with self._lock:
+            for sub in self._subs:
+                sub.close()
+            self._subs = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class FlowFeedSubscriber:
+    """
+    Minimal client for FlowFeedPublisher. Iterate over it to receive
+    batches (lists of flow dicts).
+    """
+
+    def __init__(self, path: str, policy: str = POLICY_DROP_OLDEST, timeout: Optional[float] = None):
+        if policy not in _POLICY_CODES:
+            raise ValueError(f"unknown back-pressure policy: {policy}")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.sock.sendall(HELLO.pack(FEED_MAGIC, _POLICY_CODES[policy]))
+        self.sock.settimeout(timeout)
+
+    def recv_batch(self) -> Optional[List[Dict]]:
+        header = _recv_exact(self.sock, FRAME_HEADER.size)
+        if header is None:
+            return None
+        magic, version, _, count = FRAME_HEADER.unpack(header)
+        if magic != FEED_MAGIC or version != FEED_VERSION:
+            raise ValueError("bad flow feed frame header")
+        payload = _recv_exact(self.sock, count * RECORD.size)
+        if payload is None:
+            return None
+        return decode_records(count, payload)
+
+    def __iter__(self):
+        while True:
+            batch = self.recv_batch()
+            if batch is None:
+                return
+            yield batch
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,163 @@
+# src/capture/memory_budget.py
+import os
+import time
+from typing import Dict, Optional
+
+from src.reporting import metrics
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+NORMAL, PRESSURE, OVER = 0, 1, 2
+LEVEL_NAMES = ("normal", "pressure", "over")
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 if unknown)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryBudget:
+    """
+    Global memory budget (`budget_bytes` of RSS) for the capture process.
+    The part left after the start-up baseline (interpreter, libraries, model:
+    the RSS when the budget is created) is shared between registered
+    components. A component implements any of
+      - memory_usage() -> approximate bytes of its state
+      - set_memory_limit(nbytes): cap its state to about nbytes (flow table
+        size, tracked hosts / sources / blocks, cache entries)
+      - memory_pressure(level): degrade at level 1 / 2, undo at 0
+
+    check() runs every `interval` seconds and measures
+        estimate = baseline + sum of memory_usage()
+        used = estimate + RSS beyond the highest estimate seen so far
+    RSS seldom shrinks once state is freed (the allocator keeps the pages
+    for reuse), so it only counts where the estimates cannot explain it
+    (untracked growth, underestimates); after shedding `used` drops again.
+    Degradation policy, by level (between release and soft the level stays
+    where it is, over steps back to pressure):
+      - normal (< release * budget): memory_pressure(0); caps scaled down
+        earlier double back per check up to their full share
+      - pressure (>= soft * budget): memory_pressure(1): early scoring paused
+        and its pending state dropped, sampling at least 1 in 2
+      - over (>= budget): caps halved per check (down to `min_scale`), so the
+        oldest flows are flushed early and LRU host / source / cache entries
+        are evicted; memory_pressure(2): the sampling floor doubles per check
+    """
+
+    def __init__(self, budget_bytes: int, soft: float = 0.8, release: float = 0.7,
+                 interval: float = 1.0, min_scale: float = 0.125, rss_fn=current_rss):
+        self.budget = int(budget_bytes)
+        self.soft = float(soft)
+        self.release = float(release)
+        self.interval = float(interval)
+        self.min_scale = float(min_scale)
+        self.rss_fn = rss_fn
+        self.baseline = int(rss_fn())
+        self.scale = 1.0
+        self.level = NORMAL
+        self.rss = self.baseline
+        self.used = self.baseline
+        # highest baseline + usage seen: RSS up to it is accounted for
+        self._explained = self.baseline
+        self.level_changes = 0
+        self._components: Dict[str, tuple] = {}
+        self._last_check = 0.0
+
+        if self.available() <= 0:
+            print(f"[MemoryBudget] budget {self.budget / 2 ** 20:.0f} MB is below the start-up RSS "
+                  f"({self.baseline / 2 ** 20:.0f} MB): components get their minimum sizes")
+        metrics.gauge("memory_rss_bytes", "Resident set size at the last budget check", fn=lambda: self.rss)
+        metrics.gauge("memory_used_bytes", "Memory counted against the budget", fn=lambda: self.used)
+        metrics.gauge("memory_budget_bytes", "Configured memory budget", fn=lambda: self.budget)
+        metrics.gauge("memory_level", "Degradation level (0 normal, 1 pressure, 2 over)", fn=lambda: self.level)
+        metrics.gauge("memory_limit_scale", "Current fraction of each component's share", fn=lambda: self.scale)
+
+    def available(self) -> int:
+        """Bytes shared between the components (budget minus the start-up baseline)."""
+        return max(0, self.budget - self.baseline)
+
+    def register(self, name: str, component, share: float = 0.0):
+        """Track `component`; with share > 0 it is capped to share * available() * scale."""
+        self._components[name] = (component, float(share))
+        if hasattr(component, "memory_usage"):
+            metrics.gauge("memory_component_bytes", "Approximate memory per component",
+                          {"component": name}, fn=component.memory_usage)
+        self._apply_limit(component, share)
+
+    def _apply_limit(self, component, share):
+        if share > 0 and hasattr(component, "set_memory_limit"):
+            component.set_memory_limit(int(share * self.available() * self.scale))
+
+    def usage(self) -> Dict[str, int]:
+        out = {}
+        for name, (component, _) in self._components.items():
+            if hasattr(component, "memory_usage"):
+                try:
+                    out[name] = int(component.memory_usage())
+                except Exception as e:
+                    print(f"[MemoryBudget] {name}: memory_usage failed:", e)
+        return out
+
+    def check(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        if now - self._last_check < self.interval:
+            return self.level
+        self._last_check = now
+
+        self.rss = int(self.rss_fn())
+        estimate = self.baseline + sum(self.usage().values())
+        self._explained = max(self._explained, estimate)
+        self.used = estimate + max(0, self.rss - self._explained)
+        fill = self.used / self.budget if self.budget else 0.0
+        if fill >= 1.0:
+            level = OVER
+        elif fill >= self.soft:
+            level = PRESSURE
+        elif fill < self.release:
+            level = NORMAL
+        else:
+            # between release and soft: keep degrading, but stop shrinking
+            level = min(self.level, PRESSURE)
+
+        scale = self.scale
+        if level == OVER:
+            scale = max(self.min_scale, scale / 2)
+        elif level == NORMAL and scale < 1.0:
+            scale = min(1.0, scale * 2)
+        if scale != self.scale:
+            self.scale = scale
+            for component, share in self._components.values():
+                self._apply_limit(component, share)
+
+        if level != self.level:
+            print(f"[MemoryBudget] {LEVEL_NAMES[self.level]} -> {LEVEL_NAMES[level]}: "
+                  f"{self.used / 2 ** 20:.0f} of {self.budget / 2 ** 20:.0f} MB "
+                  f"(rss {self.rss / 2 ** 20:.0f} MB), limits at {self.scale:.0%}")
+            self.level_changes += 1
+        if level != self.level or level == OVER:
+            for name, (component, _) in self._components.items():
+                if hasattr(component, "memory_pressure"):
+                    component.memory_pressure(level)
+        self.level = level
+        return level
+
+    def stats(self) -> Dict:
+        return {
+            "level": LEVEL_NAMES[self.level],
+            "budget_mb": round(self.budget / 2 ** 20, 1),
+            "rss_mb": round(self.rss / 2 ** 20, 1),
+            "used_mb": round(self.used / 2 ** 20, 1),
+            "baseline_mb": round(self.baseline / 2 ** 20, 1),
+            "scale": self.scale,
+            "level_changes": self.level_changes,
+            "components_mb": {k: round(v / 2 ** 20, 2) for k, v in self.usage().items()},
+        }
@@ -0,0 +1,167 @@
+# src/capture/multi_capture.py
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+from src.capture.capture_config import CaptureConfig, open_capture_socket, read_kernel_stats
+
+PCAP_PREFIX = "pcap:"
+
+
+class CaptureWorker(threading.Thread):
+    """
+    Captures on one interface (or replays one pcap, source "pcap:<path>")
+    and puts parsed packets on a queue shared with the other workers:
+        (source, ts, (src, dst, sport, dport, proto, size, flags))
+    `parse` turns a scapy packet into that tuple or None (capture_live.pkt_to_tuple).
+    When the queue is full the packet is dropped and counted, so a slow
+    pipeline never blocks the capture socket.
+    """
+
+    def __init__(self, source: str, config: CaptureConfig, out: "queue.Queue",
+                 parse: Callable, put_timeout: float = 0.0):
+        super().__init__(name=f"capture-{source}", daemon=True)
+        self.source = source
+        self.config = config
+        self.out = out
+        self.parse = parse
+        self.put_timeout = put_timeout
+        self.sock = None
+        self.done = False
+        self._stop_event = threading.Event()
+
+        self.packets = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.queue_drops = 0
+        self.kernel_received = 0
+        self.kernel_dropped = 0
+
+    @property
+    def is_pcap(self) -> bool:
+        return self.source.startswith(PCAP_PREFIX)
+
+    def _on_packet(self, pkt):
+        tup = self.parse(pkt)
+        if tup is None:
+            self.skipped += 1
+            return
+        self.packets += 1
+        self.bytes += tup[5]
+        item = (self.source, float(getattr(pkt, "time", 0) or time.time()), tup)
+        try:
+            if self.put_timeout:
+                self.out.put(item, timeout=self.put_timeout)
+            else:
+                self.out.put_nowait(item)
+        except queue.Full:
+            self.queue_drops += 1
+
+    def run(self):
+        from scapy.all import sniff
+        try:
+            if self.is_pcap:
+                path = self.source[len(PCAP_PREFIX):]
+                sniff(offline=path, prn=self._on_packet, store=False,
+                      filter=self.config.bpf_filter or None,
+                      stop_filter=lambda p: self._stop_event.is_set())
+            else:
+                self.sock = open_capture_socket(self.source, self.config)
+                sniff(opened_socket=self.sock, prn=self._on_packet, store=False,
+                      stop_filter=lambda p: self._stop_event.is_set())
+        except Exception as e:
+            if not self._stop_event.is_set():
+                print(f"[CaptureWorker {self.source}] capture failed:", e)
+        finally:
+            self.done = True
+
+    def poll_kernel_stats(self):
+        if self.sock is None:
+            return
+        st = read_kernel_stats(self.sock)
+        if st:
+            self.kernel_received += st[0]
+            self.kernel_dropped += st[1]
+
+    def stop(self):
+        self._stop_event.set()
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+            "queue_drops": self.queue_drops,
+            "kernel_received": self.kernel_received,
+            "kernel_dropped": self.kernel_dropped,
+        }
+
+
+class MultiCapture:
+    """
+    One CaptureWorker per source feeding one bounded queue that the
+    aggregation / scoring pipeline drains with get_batch().
+    pcap sources are replayed as fast as possible; with `lossless_replay`
+    their workers wait for queue space instead of dropping.
+    """
+
+    def __init__(self, sources: List[str], config: CaptureConfig, parse: Callable,
+                 queue_size: int = 100000, lossless_replay: bool = True):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers = [
+            CaptureWorker(src, config, self.queue, parse,
+                          put_timeout=3600.0 if (lossless_replay and src.startswith(PCAP_PREFIX)) else 0.0)
+            for src in sources
+        ]
+        self._last = {w.source: (0, 0, time.time()) for w in self.workers}
+
+    def start(self):
+        for w in self.workers:
+            w.start()
+
+    @property
+    def finished(self) -> bool:
+        return all(w.done for w in self.workers) and self.queue.empty()
+
+    def get_batch(self, max_items: int = 512, timeout: float = 0.5) -> list:
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < max_items:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def backlog(self) -> float:
+        """Queue fill level, 0..1."""
+        return self.queue.qsize() / self.queue.maxsize if self.queue.maxsize else 0.0
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-source counters plus rates since the previous call."""
+        out = {}
+        now = time.time()
+        for w in self.workers:
+            w.poll_kernel_stats()
+            pkts0, bytes0, t0 = self._last[w.source]
+            dt = max(now - t0, 1e-9)
+            st = w.stats()
+            st["pps"] = (w.packets - pkts0) / dt
+            st["bps"] = (w.bytes - bytes0) * 8 / dt
+            self._last[w.source] = (w.packets, w.bytes, now)
+            out[w.source] = st
+        return out
+
+    def stop(self):
+        for w in self.workers:
+            w.stop()
+        for w in self.workers:
+            w.join(timeout=2.0)
@@ -0,0 +1,105 @@
+# src/capture/pcap_reader.py
+import gzip
+import socket
+import struct
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+# link type -> (bytes before the network header, offset of the ethertype or None)
+_LINK_HEADERS = {
+    LINKTYPE_ETHERNET: (14, 12),
+    LINKTYPE_LINUX_SLL: (16, 14),
+    LINKTYPE_LINUX_SLL2: (20, 0),
+    LINKTYPE_RAW: (0, None),
+    LINKTYPE_IPV4: (0, None),
+}
+READ_CHUNK = 1 << 22
+
+
+def open_pcap(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def read_pcap(path):
+    """
+    Yield (src, dst, sport, dport, proto, size, flags, ts) for the IPv4
+    TCP/UDP packets of a classic pcap (optionally .gz), the tuple
+    capture_live.pkt_to_tuple produces: size is the original frame length,
+    so files captured with a small snaplen give the same flows as live
+    capture. Ethernet (with VLAN tags), Linux cooked and raw IP link types;
+    non-first IP fragments are skipped. The file is read in chunks.
+    """
+    with open_pcap(path) as f:
+        header = f.read(24)
+        if len(header) < 24:
+            raise ValueError(f"{path}: not a pcap file")
+        magic = struct.unpack_from("<I", header)[0]
+        if magic in (0xA1B2C3D4, 0xA1B23C4D):
+            endian = "<"
+        elif magic in (0xD4C3B2A1, 0x4D3CB2A1):
+            endian = ">"
+        elif magic == 0x0A0D0D0A:
+            raise ValueError(f"{path}: pcapng is not supported, convert with "
+                             f"'editcap -F pcap in.pcapng out.pcap'")
+        else:
+            raise ValueError(f"{path}: not a pcap file")
+        frac = 1e-9 if magic in (0xA1B23C4D, 0x4D3CB2A1) else 1e-6
+        linktype = struct.unpack_from(endian + "I", header, 20)[0] & 0x0FFFFFFF
+        if linktype not in _LINK_HEADERS:
+            raise ValueError(f"{path}: unsupported link type {linktype}")
+        link_len, type_off = _LINK_HEADERS[linktype]
+
+        rec = struct.Struct(endian + "IIII")
+        ntoa = socket.inet_ntoa
+        unpack_h = struct.Struct("!H").unpack_from
+        unpack_ports = struct.Struct("!HH").unpack_from
+        data = b""
+        off = 0
+        while True:
+            if len(data) - off < 16:
+                more = f.read(READ_CHUNK)
+                if not more:
+                    return
+                data = data[off:] + more
+                off = 0
+                continue
+            sec, sub, incl, orig = rec.unpack_from(data, off)
+            if len(data) - off < 16 + incl:
+                more = f.read(max(READ_CHUNK, incl + 16))
+                if not more:
+                    return
+                data = data[off:] + more
+                off = 0
+                continue
+            start = off + 16
+            end = start + incl
+            off = end
+
+            ip = start + link_len
+            if type_off is not None:
+                if ip > end:
+                    continue
+                ethertype = unpack_h(data, start + type_off)[0]
+                while ethertype in (0x8100, 0x88A8) and ip + 4 <= end:
+                    ethertype = unpack_h(data, ip + 2)[0]
+                    ip += 4
+                if ethertype != 0x0800:
+                    continue
+            if ip + 20 > end or data[ip] >> 4 != 4:
+                continue
+            proto = data[ip + 9]
+            if proto not in (6, 17) or unpack_h(data, ip + 6)[0] & 0x1FFF:
+                continue
+            l4 = ip + (data[ip] & 0x0F) * 4
+            if l4 + 4 > end:
+                continue
+            sport, dport = unpack_ports(data, l4)
+            flags = data[l4 + 13] if proto == 6 and l4 + 14 <= end else 0
+            # frame length as seen on the wire, whatever link header the file has
+            size = orig - link_len + 14 if linktype != LINKTYPE_ETHERNET else orig
+            yield (ntoa(data[ip + 12:ip + 16]), ntoa(data[ip + 16:ip + 20]), sport, dport, proto,
+                   size, flags, sec + sub * frac)
@@ -0,0 +1,168 @@
+# src/capture/sampling.py
+import random
+import time
+from typing import Dict, Tuple
+
+from src.ingestion.host_aggregator import stable_hash64
+
+MODE_OFF = "off"
+MODE_FLOW_HASH = "flow_hash"          # keep every packet of 1 in N flows
+MODE_PROBABILISTIC = "probabilistic"  # keep each packet with probability 1/N
+
+
+def flow_hash(src_ip, dst_ip, src_port, dst_port, proto) -> int:
+    """
+    Direction-independent hash of the 5-tuple, stable across processes and
+    restarts, so every capture process keeps the same flows.
+    """
+    a = (src_ip, int(src_port or 0))
+    b = (dst_ip, int(dst_port or 0))
+    if b < a:
+        a, b = b, a
+    return stable_hash64(f"{a[0]}|{a[1]}|{b[0]}|{b[1]}|{int(proto or 0)}".encode())
+
+
+class PacketSampler:
+    """
+    1-in-N packet sampling in front of the aggregators.
+    - flow_hash: a flow is kept or dropped as a whole (hash of the canonical
+      5-tuple), so kept flows have exact counters; each stands for N flows.
+    - probabilistic: each packet is kept with probability 1/N and carries
+      weight N, so flow counters become estimates.
+    `fixed_rate` > 1 samples all the time. With `auto=True` sampling engages
+    when the rate of packets let through exceeds `engage_pps` or the share
+    of wall time spent processing (report it with record_busy) or the fill
+    level of the capture queue (record_backlog) exceeds `engage_util`; N then doubles every `interval` while overloaded and
+    halves once the halved rate would stay below the release levels,
+    disengaging at N == fixed_rate. N stays a power of two times fixed_rate,
+    so in flow_hash mode the flows kept at 1/2N are a subset of those kept
+    at 1/N and no kept flow is cut in half by a rate change.
+    memory_pressure() (MemoryBudget) sets a floor under N: sampling stays at
+    least that strong, whatever the load, until the pressure is gone.
+    """
+
+    def __init__(self, mode: str = MODE_FLOW_HASH, fixed_rate: int = 1, auto: bool = True,
+                 engage_pps: float = 50000.0, release_pps: float = 30000.0,
+                 engage_util: float = 0.9, release_util: float = 0.5,
+                 max_rate: int = 1024, interval: float = 1.0, seed=None):
+        if mode not in (MODE_OFF, MODE_FLOW_HASH, MODE_PROBABILISTIC):
+            raise ValueError(f"unknown sampling mode: {mode}")
+        self.mode = mode
+        self.fixed_rate = max(1, int(fixed_rate))
+        self.auto = auto and mode != MODE_OFF
+        self.engage_pps = float(engage_pps)
+        self.release_pps = float(release_pps)
+        self.engage_util = float(engage_util)
+        self.release_util = float(release_util)
+        self.max_rate = int(max_rate)
+        self.interval = float(interval)
+        self._rng = random.Random(seed)
+
+        self.rate = self.fixed_rate if mode != MODE_OFF else 1
+        self.floor = self.rate
+        self._interval_start = None
+        self._interval_seen = 0
+        self._interval_busy = 0.0
+        self._interval_backlog = 0.0
+        self.last_pps = 0.0
+        self.last_util = 0.0
+
+        self.seen = 0
+        self.kept = 0
+        self.engaged_intervals = 0
+
+    @property
+    def engaged(self) -> bool:
+        return self.rate > 1
+
+    def record_busy(self, seconds: float):
+        self._interval_busy += seconds
+
+    def record_backlog(self, fill: float):
+        """Fill level (0..1) of the queue in front of the sampler."""
+        if fill > self._interval_backlog:
+            self._interval_backlog = fill
+
+    def _adapt(self, now: float):
+        elapsed = now - self._interval_start
+        self.last_pps = self._interval_seen / elapsed
+        self.last_util = max(self._interval_busy / elapsed, self._interval_backlog)
+        kept_pps = self.last_pps / self.rate
+        overloaded = kept_pps > self.engage_pps or self.last_util > self.engage_util
+        relaxed = kept_pps * 2 < self.release_pps and self.last_util * 2 < self.release_util
+        if overloaded:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate * 2)
+                print(f"[PacketSampler] overload ({self.last_pps:.0f} pkt/s, "
+                      f"util {self.last_util:.2f}): sampling 1 in {self.rate}")
+        elif relaxed and self.rate > max(self.fixed_rate, self.floor):
+            self.rate = max(self.fixed_rate, self.floor, self.rate // 2)
+            if self.rate == self.fixed_rate:
+                print("[PacketSampler] load back to normal: sampling released")
+        if self.engaged:
+            self.engaged_intervals += 1
+        self._interval_start = now
+        self._interval_seen = 0
+        self._interval_busy = 0.0
+        self._interval_backlog = 0.0
+
+    def memory_pressure(self, level: int):
+        """Level 0: no floor; 1: sample at least 1 in 2*fixed_rate; 2: double the floor (per call)."""
+        if self.mode == MODE_OFF:
+            return
+        if level <= 0:
+            floor = self.fixed_rate
+        elif level == 1:
+            floor = max(self.floor, self.fixed_rate * 2)
+        else:
+            floor = max(self.floor * 2, self.fixed_rate * 2)
+        floor = min(self.max_rate, floor)
+        if floor == self.floor:
+            return
+        self.floor = floor
+        if floor > self.rate:
+            self.rate = floor
+            print(f"[PacketSampler] memory pressure: sampling 1 in {self.rate}")
+        elif not self.auto:
+            # no load-driven release without auto: drop back right away
+            self.rate = max(self.fixed_rate, floor)
+
+    def sample(self, src_ip, dst_ip, src_port, dst_port, proto, now=None) -> Tuple[bool, int]:
+        """
+        Returns (keep, weight). weight is the number of packets a kept packet
+        stands for in flow counters (1 in flow_hash mode).
+        """
+        self.seen += 1
+        if self.auto:
+            self._interval_seen += 1
+            now = now or time.time()
+            if self._interval_start is None:
+                self._interval_start = now
+            elif now - self._interval_start >= self.interval:
+                self._adapt(now)
+        n = self.rate
+        if n <= 1:
+            self.kept += 1
+            return True, 1
+        if self.mode == MODE_FLOW_HASH:
+            if flow_hash(src_ip, dst_ip, src_port, dst_port, proto) % n:
+                return False, 0
+            self.kept += 1
+            return True, 1
+        if self._rng.random() * n >= 1.0:
+            return False, 0
+        self.kept += 1
+        return True, n
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "rate": self.rate,
+            "floor": self.floor,
+            "seen": self.seen,
+            "kept": self.kept,
+            "dropped": self.seen - self.kept,
+            "engaged_intervals": self.engaged_intervals,
+            "last_pps": round(self.last_pps, 1),
+            "last_util": round(self.last_util, 3),
+        }
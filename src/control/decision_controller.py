@@ -1,11 +1,56 @@
 # src/control/decision_controller.py
-import subprocess
+import os
 import threading
 import time
-import os
+
+from src.control.firewall_backend import IpsetBackend, IptablesBackend
+from src.control.expiry_scheduler import ExpiryScheduler
+from src.control.source_tracker import SourceTracker, SOURCE_BYTES
+from src.control.prefix_map import PrefixMap, parse_prefix, format_prefix
+from src.reporting import metrics
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 
 # SAFE DEFAULT: do not run iptables commands unless explicitly enabled.
 ENABLE_ACTIVE_BLOCKING = False
+# "ipset": one set + batched background updates, "iptables": one rule per IP
+FIREWALL_BACKEND = "ipset"
+
+# Temporary blocks: one scheduler thread, bounded, persisted across restarts
+MAX_TEMP_BLOCKS = 10000
+TEMP_BLOCK_STATE = os.path.join(PROJECT_ROOT, "data", "state", "temp_blocks.json")
+TEMP_BLOCK_SECONDS = 30
+
+# Decide per source IP over a sliding window instead of per flow
+AGGREGATE_BY_SOURCE = True
+
+# Networks that are never blocked (our own infrastructure), CIDR strings
+ALLOW_LIST = []
+# Block the whole /24 (IPv4) or /64 (IPv6) once this many of its hosts are blocked
+PREFIX_BLOCK_THRESHOLD = 16
+PREFIX_LEN_V4 = 24
+PREFIX_LEN_V6 = 64
+
+# Approximate bytes per blocked address (set entry + prefix membership) and
+# per temporary-block deadline; floors for set_memory_limit()
+BLOCK_BYTES = 200
+MIN_BLOCKED = 1000
+MIN_SOURCES = 1000
+MIN_TEMP_BLOCKS = 1000
+
+# Seconds a source stays pinned at "attack" after its latest host alert
+# (FlowPipeline passes two host windows, so a sustained alert never lapses)
+HOST_ALERT_HOLD = 10.0
+
+_ACTIONABLE = ("attack", "suspicious", "benign")
+
+
+def make_backend(name=FIREWALL_BACKEND, iface=None, runner=None):
+    if name == "ipset":
+        return IpsetBackend(iface=iface, runner=runner)
+    if name == "iptables":
+        return IptablesBackend(iface=iface, runner=runner)
+    raise ValueError(f"unknown firewall backend: {name}")
 
 class DecisionController:
     """
@@ -13,58 +58,192 @@ class DecisionController:
     - block_ip(ip): add a DROP rule (if ENABLE_ACTIVE_BLOCKING True)
     - allow_ip(ip): remove that rule
     - temporary_block(ip, seconds): block then schedule unblock
+    Addresses in the allow-list are never blocked. When PREFIX_BLOCK_THRESHOLD
+    hosts of one /24 (/64) are blocked, the whole prefix is blocked too; it
+    stays until allow_ip() is called with that CIDR.
+    Actions that would not change the in-memory `_blocked` state are skipped,
+    so benign flows from never-blocked sources cost nothing.
+    Firewall changes go through `backend` (see firewall_backend.py); pass one
+    explicitly (e.g. with a FakeCommandRunner) to exercise it without root.
+    Block state is shared with the ExpiryScheduler thread (temporary blocks
+    expire through allow_ip), so block_ip / allow_ip hold `_lock`.
+    `clock` replaces time.time for source windows and expiries (capture time
+    on replay); the owner then calls tick() as that clock advances.
+    With `max_blocked` set (MemoryBudget: set_memory_limit), new host blocks
+    beyond it are refused and counted ("capped"); existing blocks and
+    prefix blocks stay, since they are firewall state. The same limit caps
+    the tracked sources and the temporary-block timers (the nearest
+    expiries are released early).
     """
 
-    def __init__(self, iface=None):
+    def __init__(self, iface=None, backend=None, state_file=TEMP_BLOCK_STATE,
+                 aggregate=AGGREGATE_BY_SOURCE, allow_list=None, clock=None):
+        self._lock = threading.Lock()
+        self._clock = clock or time.time
         self._blocked = set()
-        self._timers = {}
+        self._allow = PrefixMap(ALLOW_LIST if allow_list is None else allow_list)
+        self._blocked_prefixes = PrefixMap()
+        self._prefix_members = {}
+        self.allowlisted = 0
         self.iface = iface  # optional: interface to scope rules
+        if backend is None and ENABLE_ACTIVE_BLOCKING:
+            backend = make_backend(iface=iface)
+        self.backend = backend
+        self.skipped_actions = 0
+        self.max_blocked = None
+        self.capped = 0
+        self._expiry = ExpiryScheduler(self._release_temp, max_tracked=MAX_TEMP_BLOCKS,
+                                       state_file=state_file, clock=clock)
+        for ip in self._expiry.restored:
+            self.block_ip(ip)
+        self._sources = SourceTracker() if aggregate else None
+        self._m_react = metrics.histogram("controller_react_seconds", "DecisionController.react latency")
+        metrics.gauge("controller_blocked", "Blocked addresses and prefixes", fn=self._blocked.__len__)
+
+    def _count(self, action: str):
+        metrics.counter("controller_actions_total", "Controller actions, by action",
+                        {"action": action}).inc()
+
+    def block_ip(self, ip: str) -> bool:
+        """True if `ip` is blocked afterwards (False: allow-listed or over max_blocked)."""
+        with self._lock:
+            return self._block_ip(ip)
 
-    def _run_cmd(self, cmd):
-        try:
-            subprocess.run(cmd, check=True)
+    def _block_ip(self, ip: str) -> bool:
+        if ip in self._blocked or ip in self._blocked_prefixes:
+            self.skipped_actions += 1
             return True
-        except Exception as e:
-            print("[DecisionController] Command failed:", e)
+        if ip in self._allow:
+            self.allowlisted += 1
+            self._count("allowlisted")
+            return False
+        if self.max_blocked is not None and len(self._blocked) >= self.max_blocked:
+            self.capped += 1
+            self._count("capped")
             return False
-
-    def block_ip(self, ip: str):
         print(f"[DecisionController] block_ip: {ip}")
+        self._count("block")
         self._blocked.add(ip)
-        if ENABLE_ACTIVE_BLOCKING:
-            cmd = ["sudo", "iptables", "-I", "INPUT", "-s", ip, "-j", "DROP"]
-            if self.iface:
-                cmd[2:2] = ["-i", self.iface]
-            self._run_cmd(cmd)
+        if self.backend:
+            self.backend.add(ip)
+        self._note_prefix(ip)
+        return True
+
+    def _prefix_of(self, ip: str) -> str:
+        plen = PREFIX_LEN_V6 if ":" in ip else PREFIX_LEN_V4
+        return format_prefix(*parse_prefix(f"{ip}/{plen}"))
+
+    def _note_prefix(self, ip: str):
+        if not PREFIX_BLOCK_THRESHOLD:
+            return
+        prefix = self._prefix_of(ip)
+        members = self._prefix_members.setdefault(prefix, set())
+        members.add(ip)
+        if len(members) < PREFIX_BLOCK_THRESHOLD:
+            return
+        if self._allow.overlaps(prefix):
+            # never widen a block over allow-listed space
+            return
+        print(f"[DecisionController] block_prefix: {prefix} ({len(members)} hosts)")
+        self._count("block_prefix")
+        self._blocked_prefixes.insert(prefix)
+        self._blocked.add(prefix)
+        if self.backend:
+            self.backend.add(prefix)
 
     def allow_ip(self, ip: str):
+        with self._lock:
+            self._allow_ip(ip)
+
+    def _allow_ip(self, ip: str):
+        if ip not in self._blocked:
+            self.skipped_actions += 1
+            return
         print(f"[DecisionController] allow_ip: {ip}")
-        if ip in self._blocked:
-            self._blocked.remove(ip)
-        if ENABLE_ACTIVE_BLOCKING:
-            cmd = ["sudo", "iptables", "-D", "INPUT", "-s", ip, "-j", "DROP"]
-            if self.iface:
-                cmd[2:2] = ["-i", self.iface]
-            while True:
-                try:
-                    subprocess.run(cmd, check=True)
-                except Exception:
-                    break
+        self._count("allow")
+        self._blocked.remove(ip)
+        if self.backend:
+            self.backend.remove(ip)
+        if "/" in ip:
+            self._blocked_prefixes.remove(ip)
+            self._prefix_members.pop(ip, None)
+        else:
+            members = self._prefix_members.get(self._prefix_of(ip))
+            if members is not None:
+                members.discard(ip)
+                if not members:
+                    del self._prefix_members[self._prefix_of(ip)]
+
+    def stats(self):
+        out = {
+            "blocked": len(self._blocked),
+            "blocked_prefixes": len(self._blocked_prefixes),
+            "skipped_actions": self.skipped_actions,
+            "allowlisted": self.allowlisted,
+            "capped": self.capped,
+        }
+        out.update({f"temp_{k}": v for k, v in self._expiry.stats().items()})
+        if self._sources:
+            out.update({f"src_{k}": v for k, v in self._sources.stats().items()})
+        if self.backend:
+            out.update(self.backend.stats())
+        return out
+
+    def memory_usage(self) -> int:
+        used = (len(self._blocked) + len(self._expiry)) * BLOCK_BYTES
+        if self._sources is not None:
+            used += len(self._sources) * SOURCE_BYTES
+        return used
+
+    def set_memory_limit(self, nbytes):
+        """
+        Split `nbytes` between the source tracker (LRU, shrinks now), max_blocked
+        and the temporary-block timers (2:1, at most MAX_TEMP_BLOCKS timers).
+        """
+        if nbytes is None:
+            self.max_blocked = None
+            self._expiry.set_max_tracked(MAX_TEMP_BLOCKS)
+            return
+        nbytes = int(nbytes)
+        if self._sources is not None:
+            nbytes //= 2
+            self._sources.set_max_sources(max(MIN_SOURCES, nbytes // SOURCE_BYTES))
+        entries = nbytes // BLOCK_BYTES
+        self.max_blocked = max(MIN_BLOCKED, entries * 2 // 3)
+        self._expiry.set_max_tracked(min(MAX_TEMP_BLOCKS, max(MIN_TEMP_BLOCKS, entries // 3)))
+
+    def close(self):
+        self._expiry.close()
+        if self.backend:
+            self.backend.close()
+
+    def tick(self):
+        """Release due temporary blocks; needed only with a `clock` (no expiry thread then)."""
+        if self._clock is not time.time:
+            self._expiry.run_due()
 
     def temporary_block(self, ip: str, duration: int):
         print(f"[DecisionController] temporary_block: {ip} for {duration}s")
-        self.block_ip(ip)
-        if ip in self._timers:
-            self._timers[ip].cancel()
-        timer = threading.Timer(duration, lambda: self._release_temp(ip))
-        self._timers[ip] = timer
-        timer.daemon = True
-        timer.start()
+        if self.block_ip(ip):
+            self._expiry.schedule(ip, duration)
+
+    def host_alert(self, ip: str, reason: str, hold: float = HOST_ALERT_HOLD) -> bool:
+        """
+        Block `ip` for a host-level alert (scan, flood) without going through
+        the per-flow verdict hysteresis. With source aggregation the source
+        is pinned at "attack" for `hold` seconds, so the benign labels of its
+        individual flows cannot unblock it while the alert is live.
+        """
+        print(f"[DecisionController] host alert: {ip} ({reason})")
+        if self._sources is not None:
+            now = self._clock()
+            self._sources.pin(ip, now + float(hold), now)
+        # permanent, like an attack verdict
+        self._expiry.cancel(ip)
+        return self.block_ip(ip)
 
     def _release_temp(self, ip: str):
         self.allow_ip(ip)
-        if ip in self._timers:
-            del self._timers[ip]
 
     def react(self, flow_dict, label: str):
         """
@@ -73,14 +252,29 @@ class DecisionController:
           - attack -> immediate block (permanent)
           - suspicious -> temporary block (30s)
           - benign -> ensure allowed (remove block)
+          - anything else ("unknown": no model / scoring failed) -> ignored
+        With source aggregation on, `label` is first folded into the source's
+        sliding window and only a change of the per-source verdict is acted on.
         """
+        if not self._m_react.enabled:
+            return self._react(flow_dict, label)
+        with self._m_react.time():
+            return self._react(flow_dict, label)
+
+    def _react(self, flow_dict, label: str):
         ip = flow_dict.get("src_ip")
-        if not ip:
+        if not ip or label not in _ACTIONABLE:
             return
+        if self._sources is not None:
+            label = self._sources.observe(ip, label, self._clock())
+            if label is None:
+                return
         if label == "attack":
+            # permanent: a pending temporary expiry must not lift it
+            self._expiry.cancel(ip)
             self.block_ip(ip)
         elif label == "suspicious":
-            self.temporary_block(ip, 30)
+            self.temporary_block(ip, TEMP_BLOCK_SECONDS)
         else:
             # benign
             self.allow_ip(ip)
@@ -0,0 +1,226 @@
+# src/control/expiry_scheduler.py
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class ExpiryScheduler:
+    """
+    Single-thread scheduler for temporary blocks.
+    Deadlines live in a min-heap; `_deadlines` holds the current deadline per
+    IP and heap entries that no longer match it are skipped (lazy deletion),
+    so extending a block is O(log n) and never spawns a thread.
+
+    - schedule(ip, seconds): expire at now+seconds, or later if already scheduled
+    - cancel(ip): forget the IP without calling on_expire
+    - at most `max_tracked` IPs; scheduling a new one beyond that expires the
+      one with the nearest deadline right away (set_max_tracked lowers the
+      cap the same way)
+    - if `state_file` is set, active deadlines (wall clock) are saved there and
+      reloaded on start; `restored` lists the IPs that were still active
+    - with a `clock` (e.g. capture time on replay) no thread is started and
+      the owner calls run_due() as that clock advances
+    """
+
+    def __init__(self, on_expire: Callable[[str], None], max_tracked: int = 10000,
+                 state_file: Optional[str] = None, save_interval: float = 2.0,
+                 clock: Optional[Callable[[], float]] = None):
+        self.on_expire = on_expire
+        self.clock = clock or time.time
+        self.max_tracked = int(max_tracked)
+        self.state_file = state_file
+        self.save_interval = float(save_interval)
+
+        self._heap = []
+        self._deadlines: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._running = True
+        self._dirty = False
+        self._last_save = 0.0
+
+        self.expired = 0
+        self.extended = 0
+        self.evicted = 0
+
+        self.restored: List[str] = self._load()
+
+        self._thread = None
+        if clock is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._deadlines)
+
+    def __contains__(self, ip):
+        with self._cond:
+            return ip in self._deadlines
+
+    def _push(self, ip, deadline):
+        self._deadlines[ip] = deadline
+        heapq.heappush(self._heap, (deadline, ip))
+
+    def _pop_earliest(self):
+        # caller holds the lock; returns the live (deadline, ip) with the smallest deadline
+        while self._heap:
+            deadline, ip = heapq.heappop(self._heap)
+            if self._deadlines.get(ip) == deadline:
+                del self._deadlines[ip]
+                return deadline, ip
+        return None
+
+    def _peek_deadline(self):
+        while self._heap:
+            deadline, ip = self._heap[0]
+            if self._deadlines.get(ip) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def schedule(self, ip: str, seconds: float) -> float:
+        deadline = self.clock() + float(seconds)
+        evicted = None
+        with self._cond:
+            current = self._deadlines.get(ip)
+            if current is not None:
+                if deadline <= current:
+                    return current
+                self.extended += 1
+            elif len(self._deadlines) >= self.max_tracked:
+                item = self._pop_earliest()
+                if item:
+                    evicted = item[1]
+                    self.evicted += 1
+            self._push(ip, deadline)
+            self._dirty = True
+            # compact when stale entries dominate the heap
+            if len(self._heap) > 4 * len(self._deadlines) + 64:
+                self._heap = [(d, i) for i, d in self._deadlines.items()]
+                heapq.heapify(self._heap)
+            self._cond.notify()
+        if evicted is not None:
+            self._fire(evicted)
+        return deadline
+
+    def set_max_tracked(self, n: int) -> int:
+        """Change max_tracked; IPs beyond a lower cap expire now, nearest deadline first."""
+        evicted = []
+        with self._cond:
+            self.max_tracked = int(n)
+            while len(self._deadlines) > self.max_tracked:
+                item = self._pop_earliest()
+                if item is None:
+                    break
+                evicted.append(item[1])
+            if evicted:
+                self.evicted += len(evicted)
+                self._dirty = True
+        for ip in evicted:
+            self._fire(ip)
+        return len(evicted)
+
+    def cancel(self, ip: str) -> bool:
+        with self._cond:
+            if self._deadlines.pop(ip, None) is None:
+                return False
+            self._dirty = True
+            return True
+
+    def _fire(self, ip):
+        try:
+            self.on_expire(ip)
+        except Exception as e:
+            print("[ExpiryScheduler] on_expire failed:", e)
+
+    def _pop_due(self, now):
+        # caller holds the lock
+        due = []
+        nxt = self._peek_deadline()
+        while nxt is not None and nxt <= now:
+            due.append(self._pop_earliest()[1])
+            nxt = self._peek_deadline()
+        if due:
+            self._dirty = True
+        return due, nxt
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Expire every IP whose deadline is at or before `now` (default: clock())."""
+        with self._cond:
+            due, _ = self._pop_due(self.clock() if now is None else float(now))
+        for ip in due:
+            self.expired += 1
+            self._fire(ip)
+        if self._dirty and time.time() - self._last_save >= self.save_interval:
+            self.save()
+        return len(due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = self.clock()
+                due, nxt = self._pop_due(now)
+                if not due:
+                    timeout = self.save_interval if nxt is None else min(nxt - now, self.save_interval)
+                    self._cond.wait(timeout=timeout)
+            for ip in due:
+                self.expired += 1
+                self._fire(ip)
+            if self._dirty and time.time() - self._last_save >= self.save_interval:
+                self.save()
+
+    def save(self):
+        if not self.state_file:
+            return
+        with self._cond:
+            snapshot = dict(self._deadlines)
+            self._dirty = False
+        self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+            tmp = self.state_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            print("[ExpiryScheduler] could not save state:", e)
+
+    def _load(self) -> List[str]:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return []
+        try:
+            with open(self.state_file) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print("[ExpiryScheduler] could not load state:", e)
+            return []
+        now = self.clock()
+        active = sorted((float(d), ip) for ip, d in saved.items() if float(d) > now)
+        for deadline, ip in active[-self.max_tracked:]:
+            self._push(ip, deadline)
+        return [ip for _, ip in active[-self.max_tracked:]]
+
+    def stats(self) -> Dict:
+        with self._cond:
+            tracked = len(self._deadlines)
+            heap = len(self._heap)
+        return {
+            "tracked": tracked,
+            "heap_entries": heap,
+            "expired": self.expired,
+            "extended": self.extended,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self.save()
@@ -0,0 +1,229 @@
+# src/control/firewall_backend.py
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.reporting import metrics
+
+# IptablesBackend.remove: most duplicate rules for one IP deleted per call
+MAX_RULE_DELETES = 16
+
+
+class SubprocessRunner:
+    """Runs firewall commands for real (needs root / sudo)."""
+
+    def __init__(self, use_sudo: bool = True):
+        self.use_sudo = use_sudo
+
+    def __call__(self, cmd: List[str], input: Optional[str] = None) -> bool:
+        if self.use_sudo:
+            cmd = ["sudo"] + list(cmd)
+        try:
+            subprocess.run(cmd, input=input, text=True, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            return True
+        except Exception as e:
+            print("[firewall_backend] Command failed:", e)
+            return False
+
+
+class FakeCommandRunner:
+    """
+    Records commands instead of executing them, so backends can be
+    exercised without root. `fail_on` lets a caller simulate failures
+    for commands whose argv starts with the given prefix.
+    """
+
+    def __init__(self, fail_on: Optional[List[str]] = None):
+        self.calls = []
+        self.fail_on = list(fail_on or [])
+        self._lock = threading.Lock()
+
+    def __call__(self, cmd: List[str], input: Optional[str] = None) -> bool:
+        with self._lock:
+            self.calls.append((list(cmd), input))
+        return not (self.fail_on and list(cmd[:len(self.fail_on)]) == self.fail_on)
+
+    def restore_inputs(self) -> List[str]:
+        with self._lock:
+            return [inp for cmd, inp in self.calls if cmd[:2] == ["ipset", "restore"]]
+
+
+class IptablesBackend:
+    """
+    Legacy backend: one iptables rule per blocked IP, one subprocess per action.
+    """
+
+    def __init__(self, iface=None, runner=None):
+        self.iface = iface
+        self.runner = runner or SubprocessRunner()
+
+    def _cmd(self, op, ip):
+        cmd = ["iptables", op, "INPUT", "-s", ip, "-j", "DROP"]
+        if self.iface:
+            cmd[1:1] = ["-i", self.iface]
+        return cmd
+
+    def add(self, ip: str):
+        self.runner(self._cmd("-I", ip))
+
+    def remove(self, ip: str):
+        # rules may have been inserted more than once by older runs; bounded,
+        # since a runner that always succeeds (FakeCommandRunner) never stops
+        for _ in range(MAX_RULE_DELETES):
+            if not self.runner(self._cmd("-D", ip)):
+                break
+
+    def stats(self) -> Dict:
+        return {"backend": "iptables", "queue_depth": 0}
+
+    def close(self):
+        pass
+
+
+class IpsetBackend:
+    """
+    Keeps blocked addresses and prefixes in a pair of hash:net ipsets
+    (IPv4 / IPv6) matched by a single iptables rule each. add()/remove() only enqueue; a background
+    worker coalesces pending actions per IP and applies them in one
+    `ipset restore` call per batch.
+    """
+
+    def __init__(self, set_name: str = "cefalon_block", iface=None, runner=None,
+                 flush_interval: float = 0.05, max_batch: int = 1000):
+        self.set_name = set_name
+        self.set_name6 = set_name + "6"
+        self.iface = iface
+        self.runner = runner or SubprocessRunner()
+        self.flush_interval = float(flush_interval)
+        self.max_batch = int(max_batch)
+
+        # ip -> (op, enqueue time); a later action for the same IP replaces the earlier one
+        self._pending: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._running = True
+
+        self.batches = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.failed_batches = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._latency_sum = 0.0
+        self._m_latency = metrics.histogram("firewall_apply_latency_seconds",
+                                            "Time from controller action to ipset update")
+        self._m_batch = metrics.histogram("firewall_batch_size", "Actions per ipset restore", scale=1)
+        metrics.gauge("firewall_queue_depth", "Pending ipset actions", fn=lambda: len(self._pending))
+
+        self._setup()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _setup(self):
+        self.runner(["ipset", "create", self.set_name, "hash:net", "family", "inet", "-exist"])
+        self.runner(["ipset", "create", self.set_name6, "hash:net", "family", "inet6", "-exist"])
+        for tool, name in (("iptables", self.set_name), ("ip6tables", self.set_name6)):
+            rule = ["INPUT", "-m", "set", "--match-set", name, "src", "-j", "DROP"]
+            if self.iface:
+                rule[1:1] = ["-i", self.iface]
+            if not self.runner([tool, "-C"] + rule):
+                self.runner([tool, "-I"] + rule)
+
+    def _enqueue(self, op: str, ip: str):
+        with self._cond:
+            if ip in self._pending:
+                self.coalesced += 1
+                del self._pending[ip]
+            self._pending[ip] = (op, time.monotonic())
+            # wake the worker for the first action (it then lingers
+            # flush_interval to collect more) and for a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def add(self, ip: str):
+        self._enqueue("add", ip)
+
+    def remove(self, ip: str):
+        self._enqueue("del", ip)
+
+    def _set_for(self, ip: str) -> str:
+        return self.set_name6 if ":" in ip else self.set_name
+
+    def _take_batch(self):
+        batch = []
+        while self._pending and len(batch) < self.max_batch:
+            ip, (op, t0) = self._pending.popitem(last=False)
+            batch.append((op, ip, t0))
+        return batch
+
+    def _apply(self, batch):
+        lines = [f"{op} {self._set_for(ip)} {ip} -exist" for op, ip, _ in batch]
+        ok = self.runner(["ipset", "restore"], input="\n".join(lines) + "\n")
+        now = time.monotonic()
+        self.batches += 1
+        if not ok:
+            self.failed_batches += 1
+            return
+        self.applied += len(batch)
+        self._m_batch.observe(len(batch))
+        for _, _, t0 in batch:
+            lat = now - t0
+            self._m_latency.observe(lat)
+            self._latency_sum += lat
+            if lat > self.max_latency:
+                self.max_latency = lat
+        self.last_latency = now - batch[0][2]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._pending)
+                if not self._running and not self._pending:
+                    return
+            # let a burst of actions accumulate into one batch
+            if self._running:
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running or len(self._pending) >= self.max_batch,
+                                        timeout=self.flush_interval)
+            with self._cond:
+                batch = self._take_batch()
+                self._inflight = len(batch)
+            if batch:
+                self._apply(batch)
+            with self._cond:
+                self._inflight = 0
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued action has been applied."""
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._inflight,
+                                       timeout=timeout)
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "ipset",
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "applied": self.applied,
+            "coalesced": self.coalesced,
+            "failed_batches": self.failed_batches,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+            "avg_latency": self._latency_sum / self.applied if self.applied else 0.0,
+        }
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._worker.join(timeout=5.0)
@@ -0,0 +1,129 @@
+# src/control/prefix_map.py
+import socket
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def parse_ip(ip: str) -> Tuple[int, int]:
+    """Return (family bits, address as int) for an IPv4 / IPv6 string."""
+    try:
+        return 32, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        return 128, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+
+
+def parse_prefix(cidr: str) -> Tuple[int, int, int]:
+    """Return (family bits, network as int, prefix length); host bits are cleared."""
+    addr, _, plen = cidr.partition("/")
+    bits, value = parse_ip(addr)
+    plen = int(plen) if plen else bits
+    if not 0 <= plen <= bits:
+        raise ValueError(f"bad prefix length in {cidr!r}")
+    return bits, value & _mask(bits, plen), plen
+
+
+def format_prefix(bits: int, network: int, plen: int) -> str:
+    if bits == 32:
+        addr = socket.inet_ntop(socket.AF_INET, network.to_bytes(4, "big"))
+    else:
+        addr = socket.inet_ntop(socket.AF_INET6, network.to_bytes(16, "big"))
+    return f"{addr}/{plen}"
+
+
+def _mask(bits: int, plen: int) -> int:
+    return ((1 << plen) - 1) << (bits - plen)
+
+
+class PrefixMap:
+    """
+    Longest-prefix-match table for IPv4 and IPv6.
+    Prefixes are stored in one dict per (family, prefix length); a lookup
+    masks the address for each length present, longest first, so its cost
+    depends on the number of distinct lengths (at most 33 / 129), not on
+    the number of prefixes. In CPython this beats walking a bit trie.
+    """
+
+    def __init__(self, prefixes: Iterable[str] = ()):
+        # family bits -> {prefix length -> {network int -> value}}
+        self._tables: Dict[int, Dict[int, Dict[int, object]]] = {32: {}, 128: {}}
+        # family bits -> [(prefix length, mask)] longest first
+        self._lengths: Dict[int, List[Tuple[int, int]]] = {32: [], 128: []}
+        self._size = 0
+        for p in prefixes:
+            self.insert(p)
+
+    def __len__(self):
+        return self._size
+
+    def _refresh_lengths(self, bits):
+        self._lengths[bits] = [(plen, _mask(bits, plen))
+                               for plen in sorted(self._tables[bits], reverse=True)]
+
+    def insert(self, cidr: str, value=True):
+        bits, network, plen = parse_prefix(cidr)
+        table = self._tables[bits].get(plen)
+        if table is None:
+            table = self._tables[bits][plen] = {}
+            self._refresh_lengths(bits)
+        if network not in table:
+            self._size += 1
+        table[network] = value
+
+    def remove(self, cidr: str) -> bool:
+        bits, network, plen = parse_prefix(cidr)
+        table = self._tables[bits].get(plen)
+        if table is None or network not in table:
+            return False
+        del table[network]
+        self._size -= 1
+        if not table:
+            del self._tables[bits][plen]
+            self._refresh_lengths(bits)
+        return True
+
+    def lookup(self, ip: str) -> Optional[Tuple[str, object]]:
+        """Longest matching prefix as (cidr, value), or None."""
+        try:
+            bits, value = parse_ip(ip)
+        except (OSError, TypeError):
+            return None
+        tables = self._tables[bits]
+        for plen, mask in self._lengths[bits]:
+            network = value & mask
+            hit = tables[plen].get(network, _MISSING)
+            if hit is not _MISSING:
+                return format_prefix(bits, network, plen), hit
+        return None
+
+    def __contains__(self, ip) -> bool:
+        try:
+            bits, value = parse_ip(ip)
+        except (OSError, TypeError):
+            return False
+        tables = self._tables[bits]
+        for plen, mask in self._lengths[bits]:
+            if (value & mask) in tables[plen]:
+                return True
+        return False
+
+    def overlaps(self, cidr: str) -> bool:
+        """True if any stored prefix covers or lies inside `cidr`."""
+        bits, network, plen = parse_prefix(cidr)
+        tables = self._tables[bits]
+        outer = _mask(bits, plen)
+        for length, mask in self._lengths[bits]:
+            if length <= plen:
+                if (network & mask) in tables[length]:
+                    return True
+            elif any((n & outer) == network for n in tables[length]):
+                return True
+        return False
+
+    def prefixes(self) -> List[str]:
+        out = []
+        for bits, by_len in self._tables.items():
+            for plen, table in by_len.items():
+                out.extend(format_prefix(bits, n, plen) for n in table)
+        return out
+
+
+_MISSING = object()
@@ -0,0 +1,180 @@
+# src/control/source_tracker.py
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+BENIGN = "benign"
+SUSPICIOUS = "suspicious"
+ATTACK = "attack"
+
+# Approximate bytes per tracked source (state + window buckets, tracemalloc)
+SOURCE_BYTES = 1100
+
+
+class SourceState:
+    """Sliding-window label counts for one source IP (1 bucket per `bucket` seconds)."""
+
+    __slots__ = ("buckets", "attack", "suspicious", "benign", "verdict", "last_decision",
+                 "pinned_until")
+
+    def __init__(self):
+        self.buckets = deque()  # [bucket_start, attack, suspicious, benign]
+        self.attack = 0
+        self.suspicious = 0
+        self.benign = 0
+        self.verdict = BENIGN
+        self.last_decision = float("-inf")
+        self.pinned_until = float("-inf")
+
+    @property
+    def total(self) -> int:
+        return self.attack + self.suspicious + self.benign
+
+    def add(self, label: str, now: float, window: float, bucket: float):
+        start = now - (now % bucket)
+        if not self.buckets or self.buckets[-1][0] != start:
+            self.buckets.append([start, 0, 0, 0])
+        b = self.buckets[-1]
+        if label == ATTACK:
+            b[1] += 1
+            self.attack += 1
+        elif label == SUSPICIOUS:
+            b[2] += 1
+            self.suspicious += 1
+        else:
+            b[3] += 1
+            self.benign += 1
+        self.expire(now, window)
+
+    def expire(self, now: float, window: float):
+        while self.buckets and self.buckets[0][0] <= now - window:
+            _, a, s, n = self.buckets.popleft()
+            self.attack -= a
+            self.suspicious -= s
+            self.benign -= n
+
+
+class SourceTracker:
+    """
+    Per-source-IP decision table in front of DecisionController.
+    observe() folds one flow label into the source's sliding window and
+    returns a verdict only when the controller has to act:
+      - the verdict changed (with hysteresis: enter/exit ratios differ), or
+      - the source is still suspicious and its temporary block needs a refresh.
+    Escalations apply immediately; de-escalations wait for `cooldown` seconds
+    since the last decision. A benign source whose window holds only benign
+    labels is forgotten. At most `max_sources` states are kept (LRU).
+    pin() holds a source at ATTACK (host alerts): its labels are still
+    counted, but it is not de-escalated before the pin runs out.
+    """
+
+    def __init__(self, window: float = 10.0, bucket: float = 1.0, cooldown: float = 5.0,
+                 attack_enter: float = 0.5, attack_exit: float = 0.2,
+                 suspicious_enter: float = 0.5, suspicious_exit: float = 0.2,
+                 max_sources: int = 100000):
+        self.window = float(window)
+        self.bucket = float(bucket)
+        self.cooldown = float(cooldown)
+        self.attack_enter = attack_enter
+        self.attack_exit = attack_exit
+        self.suspicious_enter = suspicious_enter
+        self.suspicious_exit = suspicious_exit
+        self.max_sources = int(max_sources)
+        self._states: "OrderedDict[str, SourceState]" = OrderedDict()
+
+        self.flows = 0
+        self.decisions = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def _classify(self, st: SourceState) -> str:
+        total = st.total
+        if not total:
+            return BENIGN
+        attack_ratio = st.attack / total
+        bad_ratio = (st.attack + st.suspicious) / total
+        if st.verdict == ATTACK:
+            if attack_ratio >= self.attack_exit:
+                return ATTACK
+        elif attack_ratio >= self.attack_enter:
+            return ATTACK
+        if st.verdict in (ATTACK, SUSPICIOUS):
+            return SUSPICIOUS if bad_ratio >= self.suspicious_exit else BENIGN
+        return SUSPICIOUS if bad_ratio >= self.suspicious_enter else BENIGN
+
+    def observe(self, ip: str, label: str, now: Optional[float] = None) -> Optional[str]:
+        now = time.time() if now is None else float(now)
+        self.flows += 1
+        if label == BENIGN and ip not in self._states:
+            # unknown benign sources need no action and no state
+            return None
+        st = self._get_or_create(ip)
+
+        st.add(label, now, self.window, self.bucket)
+        if now < st.pinned_until:
+            return None
+        verdict = self._classify(st)
+        cooled = now - st.last_decision >= self.cooldown
+
+        if verdict == st.verdict:
+            if verdict == SUSPICIOUS and cooled:
+                st.last_decision = now
+                self.decisions += 1
+                return verdict
+            if verdict == BENIGN and not (st.attack or st.suspicious):
+                # the window decayed to benign labels only: nothing left to track
+                del self._states[ip]
+            return None
+
+        escalation = _RANK[verdict] > _RANK[st.verdict]
+        if not escalation and not cooled:
+            return None
+        st.verdict = verdict
+        st.last_decision = now
+        self.decisions += 1
+        return verdict
+
+    def _get_or_create(self, ip: str) -> SourceState:
+        st = self._states.get(ip)
+        if st is None:
+            st = SourceState()
+            self._states[ip] = st
+            if len(self._states) > self.max_sources:
+                self._states.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._states.move_to_end(ip)
+        return st
+
+    def pin(self, ip: str, until: float, now: Optional[float] = None):
+        """Set `ip` to ATTACK and keep it there until `until` (extends an earlier pin)."""
+        now = time.time() if now is None else float(now)
+        st = self._get_or_create(ip)
+        if st.verdict != ATTACK:
+            st.verdict = ATTACK
+            self.decisions += 1
+        st.last_decision = now
+        st.pinned_until = max(st.pinned_until, float(until))
+
+    def set_max_sources(self, n: int):
+        """Lower or raise max_sources; the least recently seen states beyond it are dropped."""
+        self.max_sources = int(n)
+        while len(self._states) > self.max_sources:
+            self._states.popitem(last=False)
+            self.evicted += 1
+
+    def state(self, ip: str) -> Optional[SourceState]:
+        return self._states.get(ip)
+
+    def stats(self) -> Dict:
+        return {
+            "sources": len(self._states),
+            "flows": self.flows,
+            "decisions": self.decisions,
+            "evicted": self.evicted,
+        }
+
+
+_RANK = {BENIGN: 0, SUSPICIOUS: 1, ATTACK: 2}
@@ -1,14 +1,17 @@
 #src/gui/multi_plots_widget.py
 import os
-import pandas as pd
 import numpy as np
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as Canvas
 from matplotlib.figure import Figure
 
+from reporting.dashboard_utils import read_csv_tail
+
 _THIS_DIR = os.path.dirname(__file__)
 _PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
 CSV_FILE_DEFAULT = os.path.join(_PROJECT_ROOT, "data", "flows", "processed", "live_flows.csv")
+# plots cover the most recent flows only: the CSV grows for as long as capture runs
+MAX_ROWS = 50000
 
 
 class MplFigure(Canvas):
@@ -55,7 +58,7 @@ class MultiPlotsWidget(QWidget):
         if not os.path.exists(self.csv):
             return
 
-        df = pd.read_csv(self.csv)
+        df = read_csv_tail(self.csv, MAX_ROWS)
         if df.empty:
             return
 
@@ -1,6 +1,5 @@
 import os
 import sys
-import pandas as pd
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QTableWidget, QTableWidgetItem, QPushButton
 from PyQt5.QtCore import QTimer
@@ -13,10 +12,17 @@ _PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
 _SRC_DIR = os.path.join(_PROJECT_ROOT, "src")
 if _SRC_DIR not in sys.path:
     sys.path.insert(0, _SRC_DIR)
+# analyzer imports its siblings as src.models.*
+if _PROJECT_ROOT not in sys.path:
+    sys.path.append(_PROJECT_ROOT)
 
 from models.analyzer import Analyzer
+from reporting.dashboard_utils import read_csv_tail
 
 CSV_FILE_DEFAULT = os.path.join(_PROJECT_ROOT, "data", "flows", "processed", "live_flows.csv")
+# rows read from the end of the CSV per refresh (the file itself keeps growing)
+PLOT_ROWS = 120
+TABLE_ROWS = 200
 
 
 # ------------------ WSPÓLNA KLASA DLA WYKRESÓW ------------------
@@ -88,11 +94,11 @@ class LivePlotWidget(QWidget):
         if not os.path.exists(self.csv_file):
             return
         try:
-            df = pd.read_csv(self.csv_file)
+            df = read_csv_tail(self.csv_file, PLOT_ROWS)
             if df.empty or self.current_metric not in df.columns:
                 return
 
-            y = df[self.current_metric].astype(float).tail(120).values
+            y = df[self.current_metric].astype(float).values
 
             # anomaly_score skalujemy na % jak w tabeli
             if self.current_metric == "anomaly_score":
@@ -149,13 +155,11 @@ class FlowTableWidget(QWidget):
         if not os.path.exists(self.csv_file):
             return
         try:
-            df = pd.read_csv(self.csv_file)
+            df = read_csv_tail(self.csv_file, TABLE_ROWS)
             if df.empty:
                 self.table.clear()
                 return
 
-            df = df.tail(200).reset_index(drop=True)
-
             if self.analyzer:
                 try:
                     df = self.analyzer.annotate_df(df)
@@ -1,7 +1,20 @@
 # src/ingestion/flow_aggregator.py
 import time
+import heapq
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
+
+from src.ingestion.flow_stats import FlowStats, TCP_FIN, TCP_RST
+from src.reporting import metrics
+
+# Approximate bytes per tracked flow (key, Flow, timer entries), measured with
+# tracemalloc; used for memory_usage() and to turn a memory limit into max_flows
+FLOW_BYTES = 600
+FLOW_STATS_BYTES = 600
+PROVISIONAL_BYTES = 170
+# a memory limit never caps the table below this many flows
+MIN_FLOWS = 1000
 
 
 @dataclass
@@ -17,6 +30,15 @@ class Flow:
     tot_bwd_pkts: int = 0
     src_bytes: int = 0
     dst_bytes: int = 0
+    fwd_flags: int = 0
+    bwd_flags: int = 0
+    end_reason: str = ""
+    stats: Optional[FlowStats] = None
+    score_count: int = 0
+    # total_pkts when last handed out for a provisional score
+    scored_pkts: int = 0
+    # >1 when packets of this flow were sampled (1 in sample_rate)
+    sample_rate: int = 1
 
     @property
     def duration(self) -> float:
@@ -31,7 +53,7 @@ class Flow:
         return self.src_bytes + self.dst_bytes
 
     def to_dict(self) -> Dict:
-        return {
+        d = {
             "duration": float(self.duration),
             "tot_fwd_pkts": int(self.tot_fwd_pkts),
             "tot_bwd_pkts": int(self.tot_bwd_pkts),
@@ -44,57 +66,352 @@ class Flow:
             "dst_ip": self.dst_ip,
             "src_port": int(self.src_port),
             "dst_port": int(self.dst_port),
+            "end_reason": self.end_reason,
+            "sample_rate": int(self.sample_rate),
         }
+        if self.stats is not None:
+            d.update(self.stats.to_dict(self.duration, self.total_pkts, self.total_bytes))
+        return d
 
 
 class FlowAggregator:
     """
     Simple 5-tuple flow aggregator. Keyed by (src, dst, sport, dport, proto).
     A flow is closed and returned by extract_ready_flows when no packets seen
-    for `timeout` seconds.
+    for its protocol's idle timeout (`idle_timeouts`, default `timeout`).
+
+    With `bidirectional=True` both directions of a connection share one
+    canonical key (endpoints sorted). The sender of the first packet becomes
+    the flow's src (initiator); its packets count as fwd, the peer's as bwd,
+    and the `direction` argument of push_packet is ignored.
+
+    TCP flags (push_packet `flags`) end flows early:
+      - RST closes the flow `linger` seconds later
+      - FIN closes it `linger` seconds after both sides sent FIN (or after the
+        one direction we key on did, in unidirectional mode); a half-closed
+        bidirectional flow waits `fin_timeout`
+    Flows older than `active_timeout` are emitted as partial records
+    (end_reason "active") and continue as a fresh flow under the same key;
+    a continuation that never sees another packet is dropped, not emitted.
+
+    With `extended_stats=True` every flow also carries a FlowStats
+    (packet size / inter-arrival statistics, flag counts), see
+    src/models/features.py for the matching feature set.
+
+    Early scoring: with `provisional_packets` / `provisional_seconds` set,
+    extract_provisional_flows() returns still-active flows once they reach
+    that many packets or that age, and again every `rescore_interval`
+    seconds as long as they get new packets. The flows are not removed.
+
+    Sampling: push_packet `weight` scales packet/byte counters (a sampled
+    packet standing for `weight` packets); `sample_rate` only marks the flow
+    record (e.g. flow-hash sampling keeps whole flows, counters stay exact).
+
+    Memory: with `max_flows` set, a packet that would open a flow beyond it
+    first flushes the least recently seen flow (end_reason "evicted"; it is
+    returned by the next extract_ready_flows like any ended flow).
+    set_memory_limit() / memory_pressure() are the MemoryBudget hooks
+    (src/capture/memory_budget.py); under pressure early scoring is paused
+    and its pending state dropped.
     """
 
-    def __init__(self, timeout: int = 30):
+    def __init__(self, timeout: int = 30, bidirectional: bool = False,
+                 idle_timeouts: Optional[Dict[int, float]] = None,
+                 active_timeout: Optional[float] = 120.0,
+                 linger: float = 1.0, fin_timeout: float = 5.0,
+                 extended_stats: bool = False,
+                 provisional_packets: Optional[int] = None,
+                 provisional_seconds: Optional[float] = None,
+                 rescore_interval: float = 1.0, max_flows: Optional[int] = None):
         self.timeout = float(timeout)
+        self.extended_stats = extended_stats
+        self.bidirectional = bidirectional
+        self.idle_timeouts = {int(p): float(t) for p, t in (idle_timeouts or {}).items()}
+        self.active_timeout = float(active_timeout) if active_timeout else None
+        self.linger = float(linger)
+        self.fin_timeout = float(fin_timeout)
         self._flows: Dict[Tuple, Flow] = {}
-        self._last_seen: Dict[Tuple, float] = {}
+        # per protocol: key -> last seen, kept in last-seen order
+        self._last_seen: Dict[int, "OrderedDict[Tuple, float]"] = {}
+        # key -> start time, kept in start order (for the active timeout)
+        self._started: "OrderedDict[Tuple, float]" = OrderedDict()
+        # flows that saw FIN/RST: key -> close deadline (+ lazy heap)
+        self._closing: Dict[Tuple, float] = {}
+        self._closing_heap: List[Tuple[float, Tuple]] = []
+        self.provisional_packets = int(provisional_packets) if provisional_packets else None
+        self.provisional_seconds = float(provisional_seconds) if provisional_seconds else None
+        self.rescore_interval = float(rescore_interval)
+        # (due time, seq, key, flow) of flows waiting for a provisional score
+        self._score_heap: List[Tuple[float, int, Tuple, Flow]] = []
+        self._score_seq = 0
+        self._score_due: Dict[Tuple, float] = {}
+        self._score_now: List[Tuple] = []
+        self.max_flows = int(max_flows) if max_flows else None
+        # flows flushed early by the cap, handed out by the next extract
+        self._evicted: List[Flow] = []
+        self.evicted = 0
+        self.provisional_paused = False
+
+        self._m_created = metrics.counter("flow_created_total", "Flows created")
+        self._m_batch = metrics.histogram("flow_expiry_batch_size", "Flows per non-empty expiry batch",
+                                          scale=1)
+        self._m_extract = metrics.histogram("flow_extract_seconds", "extract_ready_flows duration")
+        metrics.gauge("flow_active", "Flows currently tracked", fn=self.__len__)
+        self._m_evicted = metrics.counter("flow_evicted_total", "Flows flushed early by the flow table cap")
+
+    def __len__(self):
+        return len(self._flows)
 
     def _key(self, src_ip, dst_ip, src_port, dst_port, proto):
-        return (src_ip, dst_ip, int(src_port or 0), int(dst_port or 0), int(proto or 0))
+        sport, dport, proto = int(src_port or 0), int(dst_port or 0), int(proto or 0)
+        if self.bidirectional and (dst_ip, dport) < (src_ip, sport):
+            return (dst_ip, src_ip, dport, sport, proto)
+        return (src_ip, dst_ip, sport, dport, proto)
+
+    def _idle_timeout(self, proto: int) -> float:
+        return self.idle_timeouts.get(proto, self.timeout)
 
-    def push_packet(self, src_ip, dst_ip, src_port, dst_port, proto, size, direction, ts=None):
+    def push_packet(self, src_ip, dst_ip, src_port, dst_port, proto, size, direction=None,
+                    ts=None, flags=0, weight=1, sample_rate=1) -> Flow:
         ts = float(ts or time.time())
         k = self._key(src_ip, dst_ip, src_port, dst_port, proto)
-        if k not in self._flows:
+        seen = self._last_seen.setdefault(k[4], OrderedDict())
+        f = self._flows.get(k)
+        if f is None:
+            if self.max_flows and len(self._flows) >= self.max_flows:
+                self.evict_oldest(len(self._flows) - self.max_flows + 1)
             f = Flow(src_ip=src_ip, dst_ip=dst_ip, src_port=src_port or 0,
                      dst_port=dst_port or 0, protocol=int(proto or 0),
-                     start_time=ts, end_time=ts)
+                     start_time=ts, end_time=ts,
+                     stats=FlowStats() if self.extended_stats else None)
             self._flows[k] = f
-            self._last_seen[k] = ts
+            self._started[k] = ts
+            self._m_created.inc()
+            if self.provisional_seconds and not self.provisional_paused:
+                self._schedule_score(k, f, ts + self.provisional_seconds)
         else:
-            f = self._flows[k]
+            if f.score_count and not self.provisional_paused and k not in self._score_due:
+                # scored before and idle since (or a fresh active-timeout continuation)
+                self._schedule_score(k, f, ts + self.rescore_interval)
             f.end_time = ts
-            self._last_seen[k] = ts
+            seen.move_to_end(k)
+        seen[k] = ts
 
+        if self.bidirectional:
+            direction = "fwd" if (src_ip == f.src_ip and int(src_port or 0) == f.src_port) else "bwd"
         if direction == "fwd":
-            f.tot_fwd_pkts += 1
-            f.src_bytes += int(size or 0)
+            f.tot_fwd_pkts += weight
+            f.src_bytes += int(size or 0) * weight
+            f.fwd_flags |= flags
         else:
-            f.tot_bwd_pkts += 1
-            f.dst_bytes += int(size or 0)
+            f.tot_bwd_pkts += weight
+            f.dst_bytes += int(size or 0) * weight
+            f.bwd_flags |= flags
+        rate = max(sample_rate, weight)
+        if rate > f.sample_rate:
+            f.sample_rate = rate
+        if f.stats is not None:
+            f.stats.add(int(size or 0), ts, direction == "fwd", flags, weight)
+        if (self.provisional_packets and not f.score_count and not self.provisional_paused
+                and f.total_pkts - weight < self.provisional_packets <= f.total_pkts):
+            self._score_now.append(k)
+        if flags & (TCP_FIN | TCP_RST):
+            self._schedule_close(k, f, ts, flags)
+        return f
 
-    def extract_ready_flows(self) -> List[Flow]:
-        now = time.time()
-        ready = []
-        for k, last in list(self._last_seen.items()):
-            if (now - last) >= self.timeout:
-                f = self._flows.pop(k)
-                self._last_seen.pop(k)
-                ready.append(f)
+    def _schedule_close(self, k, f: Flow, ts: float, flags: int):
+        if flags & TCP_RST:
+            deadline, reason = ts + self.linger, "rst"
+        elif not self.bidirectional or (f.fwd_flags & f.bwd_flags & TCP_FIN):
+            deadline, reason = ts + self.linger, "fin"
+        else:
+            deadline, reason = ts + self.fin_timeout, "fin"
+        current = self._closing.get(k)
+        if current is not None and current <= deadline:
+            return
+        f.end_reason = reason
+        self._closing[k] = deadline
+        heapq.heappush(self._closing_heap, (deadline, k))
+
+    def _pop(self, k, reason: str = "") -> Flow:
+        f = self._flows.pop(k)
+        self._last_seen[k[4]].pop(k, None)
+        self._started.pop(k, None)
+        self._closing.pop(k, None)
+        self._score_due.pop(k, None)
+        f.end_reason = f.end_reason or reason
+        return f
+
+    def extract_ready_flows(self, now: Optional[float] = None) -> List[Flow]:
+        if not self._m_extract.enabled:
+            return self._extract_ready(now)
+        with self._m_extract.time():
+            ready = self._extract_ready(now)
+        if ready:
+            self._m_batch.observe(len(ready))
+            for f in ready:
+                metrics.counter("flow_ended_total", "Flows ended, by reason",
+                                {"reason": f.end_reason}).inc()
         return ready
 
+    def _extract_ready(self, now: Optional[float]) -> List[Flow]:
+        now = float(now or time.time())
+        ready = []
+        if self._evicted:
+            ready, self._evicted = self._evicted, []
+
+        while self._closing_heap and self._closing_heap[0][0] <= now:
+            deadline, k = heapq.heappop(self._closing_heap)
+            if self._closing.get(k) == deadline:
+                ready.append(self._pop(k))
+
+        for proto, seen in self._last_seen.items():
+            timeout = self._idle_timeout(proto)
+            while seen:
+                k, last = next(iter(seen.items()))
+                if now - last < timeout:
+                    break
+                ready.append(self._pop(k, "idle"))
+
+        if self.active_timeout:
+            while self._started:
+                k, started = next(iter(self._started.items()))
+                if now - started < self.active_timeout:
+                    break
+                if self._flows[k].total_pkts:
+                    ready.append(self._split_active(k))
+                else:
+                    self._pop(k)
+        # continuations without packets (closed or evicted before their first one)
+        return [f for f in ready if f.total_pkts]
+
+    def extract_provisional_flows(self, now: Optional[float] = None) -> List[Flow]:
+        """
+        Active flows due for a (re-)score; each is rescheduled `rescore_interval`
+        later. A flow without new packets since its last score is not returned
+        and waits unscheduled until its next packet (push_packet).
+        """
+        if self.provisional_paused:
+            return []
+        now = float(now or time.time())
+        due = {}
+        for k in self._score_now:
+            f = self._flows.get(k)
+            if f is not None and not f.score_count:
+                due[id(f)] = (k, f)
+        self._score_now = []
+        heap = self._score_heap
+        while heap and heap[0][0] <= now:
+            when, _, k, f = heapq.heappop(heap)
+            # skip flows that ended, were split or were rescheduled meanwhile
+            if self._flows.get(k) is not f or self._score_due.get(k) != when:
+                continue
+            if f.score_count and f.total_pkts == f.scored_pkts:
+                del self._score_due[k]
+                continue
+            due[id(f)] = (k, f)
+        out = []
+        for k, f in due.values():
+            f.score_count += 1
+            f.scored_pkts = f.total_pkts
+            self._schedule_score(k, f, now + self.rescore_interval)
+            out.append(f)
+        return out
+
+    def _schedule_score(self, k, f: Flow, when: float):
+        self._score_seq += 1
+        self._score_due[k] = when
+        heapq.heappush(self._score_heap, (when, self._score_seq, k, f))
+
+    def _split_active(self, k) -> Flow:
+        """Emit the flow so far as a partial record and keep counting in a new one."""
+        f = self._flows[k]
+        # the continuation starts at the active-timeout boundary (or after the
+        # last packet counted in the partial record), not when extract ran
+        boundary = max(f.start_time + self.active_timeout, f.end_time)
+        cont = Flow(src_ip=f.src_ip, dst_ip=f.dst_ip, src_port=f.src_port,
+                    dst_port=f.dst_port, protocol=f.protocol,
+                    start_time=boundary, end_time=boundary,
+                    fwd_flags=f.fwd_flags, bwd_flags=f.bwd_flags,
+                    end_reason=f.end_reason,
+                    stats=FlowStats() if f.stats is not None else None)
+        f.end_reason = "active"
+        self._flows[k] = cont
+        self._started.pop(k)
+        self._started[k] = boundary
+        if self.provisional_packets or self.provisional_seconds:
+            # rescored like its predecessor once it has packets (push_packet)
+            cont.score_count = 1
+        return f
+
+    def evict_oldest(self, n: int) -> int:
+        """Flush the `n` least recently seen flows now (end_reason "evicted")."""
+        evicted = 0
+        while evicted < n and self._flows:
+            # oldest head of the per-protocol last-seen orders
+            oldest = None
+            for seen in self._last_seen.values():
+                if seen:
+                    k, last = next(iter(seen.items()))
+                    if oldest is None or last < oldest[1]:
+                        oldest = (k, last)
+            if oldest is None:
+                break
+            self._evicted.append(self._pop(oldest[0], "evicted"))
+            evicted += 1
+        self.evicted += evicted
+        self._m_evicted.inc(evicted)
+        return evicted
+
+    def _flow_bytes(self) -> int:
+        return FLOW_BYTES + (FLOW_STATS_BYTES if self.extended_stats else 0)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by tracked flows and pending provisional scores."""
+        return (len(self._flows) + len(self._evicted)) * self._flow_bytes() + \
+            len(self._score_heap) * PROVISIONAL_BYTES
+
+    def set_memory_limit(self, nbytes: Optional[int]):
+        """Cap the flow table to about `nbytes`; flows beyond the new cap are flushed now."""
+        if nbytes is None:
+            self.max_flows = None
+            return
+        self.max_flows = max(MIN_FLOWS, int(nbytes) // self._flow_bytes())
+        if len(self._flows) > self.max_flows:
+            self.evict_oldest(len(self._flows) - self.max_flows)
+
+    def memory_pressure(self, level: int):
+        """Level >= 1: pause early scoring and drop its pending state; 0: resume."""
+        paused = level >= 1
+        if paused == self.provisional_paused:
+            return
+        self.provisional_paused = paused
+        if paused:
+            self._score_heap = []
+            self._score_now = []
+            self._score_due.clear()
+        elif self._flows and (self.provisional_packets or self.provisional_seconds):
+            # reschedule what the pause dropped (times are packet times)
+            now = max(f.end_time for f in self._flows.values())
+            for k, f in self._flows.items():
+                if f.score_count:
+                    self._schedule_score(k, f, now + self.rescore_interval)
+                elif self.provisional_seconds:
+                    self._schedule_score(k, f, max(now, f.start_time + self.provisional_seconds))
+                elif self.provisional_packets and f.total_pkts >= self.provisional_packets:
+                    self._score_now.append(k)
+
     def force_close_all(self) -> List[Flow]:
-        all_flows = list(self._flows.values())
+        all_flows = [f for f in list(self._flows.values()) + self._evicted if f.total_pkts]
+        self._evicted = []
+        for f in all_flows:
+            f.end_reason = f.end_reason or "forced"
         self._flows.clear()
         self._last_seen.clear()
+        self._started.clear()
+        self._closing.clear()
+        self._closing_heap = []
+        self._score_heap = []
+        self._score_now = []
+        self._score_due.clear()
         return all_flows
@@ -0,0 +1,129 @@
+# src/ingestion/flow_stats.py
+import math
+from typing import Dict
+
+# TCP flag bits as in the TCP header
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+
+
+class RunningStats:
+    """Welford mean / variance plus min / max in O(1) memory; `w` weights a value as w copies."""
+
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def add(self, x: float, w: int = 1):
+        if not self.n:
+            self.n = w
+            self.mean = self.min = self.max = x
+            return
+        n = self.n + w
+        self.n = n
+        delta = x - self.mean
+        self.mean += delta * w / n
+        self.m2 += w * delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        elif x > self.max:
+            self.max = x
+
+    @property
+    def std(self) -> float:
+        # sample standard deviation, as in CICFlowMeter
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def to_dict(self, prefix: str) -> Dict:
+        return {
+            f"{prefix}_mean": float(self.mean),
+            f"{prefix}_std": float(self.std),
+            f"{prefix}_min": float(self.min),
+            f"{prefix}_max": float(self.max),
+        }
+
+
+class FlowStats:
+    """
+    Extended CICIDS-style statistics of one flow, updated per packet
+    without keeping per-packet lists: packet sizes (all / fwd / bwd),
+    inter-arrival times (all / fwd / bwd) and TCP flag counts.
+    A sampled packet with `weight` w stands for w packets, as in the flow's
+    counters: its size and flags count w times, and the gap since the
+    previous sampled packet counts as w gaps of 1/w of it.
+    """
+
+    __slots__ = ("pkt_len", "fwd_pkt_len", "bwd_pkt_len",
+                 "flow_iat", "fwd_iat", "bwd_iat",
+                 "last_ts", "last_fwd_ts", "last_bwd_ts",
+                 "fin", "syn", "rst", "psh", "ack", "urg")
+
+    def __init__(self):
+        self.pkt_len = RunningStats()
+        self.fwd_pkt_len = RunningStats()
+        self.bwd_pkt_len = RunningStats()
+        self.flow_iat = RunningStats()
+        self.fwd_iat = RunningStats()
+        self.bwd_iat = RunningStats()
+        self.last_ts = None
+        self.last_fwd_ts = None
+        self.last_bwd_ts = None
+        self.fin = self.syn = self.rst = self.psh = self.ack = self.urg = 0
+
+    def add(self, size: int, ts: float, fwd: bool, flags: int = 0, weight: int = 1):
+        self.pkt_len.add(size, weight)
+        if self.last_ts is not None:
+            self.flow_iat.add((ts - self.last_ts) / weight, weight)
+        self.last_ts = ts
+        if fwd:
+            self.fwd_pkt_len.add(size, weight)
+            if self.last_fwd_ts is not None:
+                self.fwd_iat.add((ts - self.last_fwd_ts) / weight, weight)
+            self.last_fwd_ts = ts
+        else:
+            self.bwd_pkt_len.add(size, weight)
+            if self.last_bwd_ts is not None:
+                self.bwd_iat.add((ts - self.last_bwd_ts) / weight, weight)
+            self.last_bwd_ts = ts
+        if flags:
+            if flags & TCP_FIN:
+                self.fin += weight
+            if flags & TCP_SYN:
+                self.syn += weight
+            if flags & TCP_RST:
+                self.rst += weight
+            if flags & TCP_PSH:
+                self.psh += weight
+            if flags & TCP_ACK:
+                self.ack += weight
+            if flags & TCP_URG:
+                self.urg += weight
+
+    def to_dict(self, duration: float, total_pkts: int, total_bytes: int) -> Dict:
+        out = {}
+        out.update(self.pkt_len.to_dict("pkt_len"))
+        out.update(self.fwd_pkt_len.to_dict("fwd_pkt_len"))
+        out.update(self.bwd_pkt_len.to_dict("bwd_pkt_len"))
+        out.update(self.flow_iat.to_dict("flow_iat"))
+        out.update(self.fwd_iat.to_dict("fwd_iat"))
+        out.update(self.bwd_iat.to_dict("bwd_iat"))
+        out.update({
+            "fin_flag_cnt": self.fin,
+            "syn_flag_cnt": self.syn,
+            "rst_flag_cnt": self.rst,
+            "psh_flag_cnt": self.psh,
+            "ack_flag_cnt": self.ack,
+            "urg_flag_cnt": self.urg,
+            "flow_bytes_s": float(total_bytes / duration) if duration > 0 else 0.0,
+            "flow_pkts_s": float(total_pkts / duration) if duration > 0 else 0.0,
+        })
+        return out
@@ -0,0 +1,308 @@
+# src/ingestion/host_aggregator.py
+import math
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.ingestion.flow_stats import TCP_SYN, TCP_ACK
+
+_M64 = (1 << 64) - 1
+
+
+def mix64(z: int) -> int:
+    """splitmix64 finaliser: spreads any integer over 64 well-mixed bits."""
+    z = (z + 0x9E3779B97F4A7C15) & _M64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _M64
+    return z ^ (z >> 31)
+
+
+def hash64(x) -> int:
+    """mix64 over Python's hash(): fast, but salted per process for strings (in-process sketches only)."""
+    return mix64(hash(x))
+
+
+def stable_hash64(data: bytes) -> int:
+    """mix64 over crc32: the same value in every process and across restarts."""
+    return mix64(zlib.crc32(data))
+
+
+# Approximate bytes per host table entry (tracemalloc); a memory limit never
+# caps a table below MIN_HOSTS entries
+HOST_BYTES = 500
+MIN_HOSTS = 1000
+
+# 2**-rank for every possible register value
+_INV_POW2 = tuple(2.0 ** -r for r in range(66))
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**p one-byte registers (std. error ~1.04/sqrt(2**p))."""
+
+    __slots__ = ("p", "reg")
+
+    def __init__(self, p: int = 8):
+        self.p = p
+        self.reg = bytearray(1 << p)
+
+    def add(self, item):
+        h = hash64(item)
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.reg[idx]:
+            self.reg[idx] = rank
+
+    def count(self, other: Optional["HyperLogLog"] = None) -> float:
+        """Estimate; with `other` the estimate of the union of both sketches."""
+        reg = self.reg if other is None else bytes(map(max, self.reg, other.reg))
+        m = len(reg)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        est = alpha * m * m / sum(map(_INV_POW2.__getitem__, reg))
+        zeros = reg.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)
+        return est
+
+
+# counters kept per window
+_PKTS, _FLOWS, _SYN_ONLY, _TCP, _UDP = range(5)
+
+
+class HostState:
+    """
+    Counters of one host over the current and the previous window.
+    Rates blend both windows (sliding-window approximation); distinct counts
+    use the union of both windows' sketches. Sketches are only allocated
+    once the host has sent `promote_after` packets in a window, so one-packet
+    spoofed sources stay a few dozen bytes; the (port, peer) pairs seen
+    before that are kept in `pending` and seed the sketches on promotion.
+    """
+
+    __slots__ = ("start", "cur", "prev", "ports", "prev_ports", "peers", "prev_peers", "pending",
+                 "last_alert")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.cur = [0, 0, 0, 0, 0]
+        self.prev = None
+        self.ports = None
+        self.prev_ports = None
+        self.peers = None
+        self.prev_peers = None
+        self.pending = None
+        self.last_alert = float("-inf")
+
+    def roll(self, now: float, window: float):
+        if now < self.start + window:
+            return
+        if now < self.start + 2 * window:
+            self.prev, self.prev_ports, self.prev_peers = self.cur, self.ports, self.peers
+        else:
+            self.prev, self.prev_ports, self.prev_peers = None, None, None
+        self.cur = [0, 0, 0, 0, 0]
+        self.ports = self.peers = None
+        self.pending = None
+        self.start = now - (now % window)
+
+    def features(self, now: float, window: float) -> Dict:
+        weight = max(0.0, 1.0 - (now - self.start) / window)
+        vals = list(self.cur)
+        if self.prev:
+            vals = [c + p * weight for c, p in zip(self.cur, self.prev)]
+        pkts, flows, syn_only, tcp, udp = vals
+
+        def distinct(cur, prev, fallback):
+            if cur is None and prev is None:
+                return float(fallback)
+            if cur is None or prev is None:
+                return (cur or prev).count()
+            return cur.count(prev)
+
+        return {
+            "pkts_s": pkts / window,
+            "flows_s": flows / window,
+            "syn_only_s": syn_only / window,
+            "syn_ratio": syn_only / tcp if tcp else 0.0,
+            "udp_s": udp / window,
+            "distinct_ports": distinct(self.ports, self.prev_ports, pkts),
+            "distinct_peers": distinct(self.peers, self.prev_peers, pkts),
+        }
+
+
+DEFAULT_THRESHOLDS = {
+    # source role
+    "port_scan_ports": 100,       # distinct dst ports
+    "host_sweep_peers": 50,       # distinct dst IPs
+    "src_flow_rate": 500.0,       # new flows / s
+    "src_syn_rate": 200.0,        # SYN-without-ACK / s
+    "src_udp_rate": 1000.0,       # UDP packets / s
+    # destination role
+    "dst_syn_rate": 500.0,
+    "dst_udp_rate": 2000.0,
+    "syn_ratio": 0.8,             # SYN-without-ACK share of TCP packets
+}
+
+
+class HostAggregator:
+    """
+    Host-level stage next to FlowAggregator: per-source and per-destination
+    window counters (packets/s, new flows/s, SYN-without-ACK ratio, UDP rate,
+    distinct ports and distinct peers via HyperLogLog).
+    Each table holds at most `max_hosts` entries (LRU), so memory stays
+    bounded under any number of spoofed sources; floods from spoofed
+    sources are still visible on the destination side.
+    alerts(now) returns hosts whose features cross `thresholds`, at most once
+    per window per host.
+    """
+
+    def __init__(self, window: float = 5.0, max_hosts: int = 50000, promote_after: int = 4,
+                 src_precision: int = 8, dst_precision: int = 10, thresholds: Optional[Dict] = None):
+        self.window = float(window)
+        self.max_hosts = int(max_hosts)
+        self.promote_after = int(promote_after)
+        self.src_precision = src_precision
+        self.dst_precision = dst_precision
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self._src: "OrderedDict[str, HostState]" = OrderedDict()
+        self._dst: "OrderedDict[str, HostState]" = OrderedDict()
+        # hosts touched since the last alerts(); if more than max_hosts were
+        # touched the whole table is evaluated instead
+        self._dirty_src = set()
+        self._dirty_dst = set()
+        self._overflow = {"src": False, "dst": False}
+        self.evicted = 0
+
+    def _state(self, table, host, now):
+        st = table.get(host)
+        if st is None:
+            st = HostState(now - (now % self.window))
+            table[host] = st
+            if len(table) > self.max_hosts:
+                table.popitem(last=False)
+                self.evicted += 1
+        else:
+            table.move_to_end(host)
+            st.roll(now, self.window)
+        return st
+
+    def _count(self, st, proto, flags, new_flow, weight):
+        c = st.cur
+        c[_PKTS] += weight
+        if new_flow:
+            c[_FLOWS] += weight
+        if proto == 6:
+            c[_TCP] += weight
+            if flags & TCP_SYN and not flags & TCP_ACK:
+                c[_SYN_ONLY] += weight
+        elif proto == 17:
+            c[_UDP] += weight
+
+    def observe(self, src_ip, dst_ip, src_port, dst_port, proto, flags=0, ts=None, new_flow=False,
+                weight=1):
+        """`weight` > 1 scales the counters when the input is sampled 1 in `weight`."""
+        now = float(ts or time.time())
+        s = self._state(self._src, src_ip, now)
+        self._count(s, proto, flags, new_flow, weight)
+        self._distinct(s, dst_port, dst_ip, self.src_precision)
+        self._touch(self._dirty_src, "src", src_ip)
+
+        d = self._state(self._dst, dst_ip, now)
+        self._count(d, proto, flags, new_flow, weight)
+        self._distinct(d, src_port, src_ip, self.dst_precision)
+        self._touch(self._dirty_dst, "dst", dst_ip)
+
+    def _distinct(self, st, port, peer, precision):
+        if st.ports is None:
+            if st.cur[_PKTS] < self.promote_after:
+                if st.pending is None:
+                    st.pending = []
+                st.pending.append((port, peer))
+                return
+            # promotion: the sketches also get the peers seen before it
+            st.ports = HyperLogLog(precision)
+            st.peers = HyperLogLog(precision)
+            for p, q in st.pending or ():
+                st.ports.add(p)
+                st.peers.add(q)
+            st.pending = None
+        st.ports.add(port)
+        st.peers.add(peer)
+
+    def _touch(self, dirty, role, host):
+        if len(dirty) < self.max_hosts:
+            dirty.add(host)
+        else:
+            self._overflow[role] = True
+
+    def host_features(self, host: str, role: str = "src", now: Optional[float] = None) -> Optional[Dict]:
+        now = float(now or time.time())
+        st = (self._src if role == "src" else self._dst).get(host)
+        if st is None:
+            return None
+        st.roll(now, self.window)
+        return st.features(now, self.window)
+
+    def _check_src(self, f) -> Optional[str]:
+        t = self.thresholds
+        if f["distinct_ports"] >= t["port_scan_ports"]:
+            return "port_scan"
+        if f["distinct_peers"] >= t["host_sweep_peers"]:
+            return "host_sweep"
+        if f["syn_only_s"] >= t["src_syn_rate"] and f["syn_ratio"] >= t["syn_ratio"]:
+            return "syn_flood"
+        if f["udp_s"] >= t["src_udp_rate"]:
+            return "udp_flood"
+        if f["flows_s"] >= t["src_flow_rate"]:
+            return "flow_rate"
+        return None
+
+    def _check_dst(self, f) -> Optional[str]:
+        t = self.thresholds
+        if f["syn_only_s"] >= t["dst_syn_rate"] and f["syn_ratio"] >= t["syn_ratio"]:
+            return "syn_flood_target"
+        if f["udp_s"] >= t["dst_udp_rate"]:
+            return "udp_flood_target"
+        return None
+
+    def alerts(self, now: Optional[float] = None) -> List[Dict]:
+        """Evaluate hosts touched since the last call."""
+        now = float(now or time.time())
+        out = []
+        for role, table, dirty, check in (("src", self._src, self._dirty_src, self._check_src),
+                                          ("dst", self._dst, self._dirty_dst, self._check_dst)):
+            hosts = list(table) if self._overflow[role] else dirty
+            self._overflow[role] = False
+            for host in hosts:
+                st = table.get(host)
+                if st is None or now - st.last_alert < self.window:
+                    continue
+                st.roll(now, self.window)
+                feats = st.features(now, self.window)
+                reason = check(feats)
+                if reason:
+                    st.last_alert = now
+                    out.append(dict(feats, host=host, role=role, reason=reason))
+            dirty.clear()
+        return out
+
+    def memory_usage(self) -> int:
+        return (len(self._src) + len(self._dst)) * HOST_BYTES
+
+    def set_memory_limit(self, nbytes: Optional[int]):
+        """Set max_hosts so both tables fit in about `nbytes`, evicting the oldest hosts beyond it."""
+        if nbytes is None:
+            return
+        self.max_hosts = max(MIN_HOSTS, int(nbytes) // (2 * HOST_BYTES))
+        for table in (self._src, self._dst):
+            while len(table) > self.max_hosts:
+                table.popitem(last=False)
+                self.evicted += 1
+
+    def stats(self) -> Dict:
+        return {
+            "src_hosts": len(self._src),
+            "dst_hosts": len(self._dst),
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Build data/flows/processed/merged_dataset.parquet (the input of
+train_models.py) from what tools/download_datasets.sh fetches:
+
+  - pcaps (data/raw_pcaps, data/captures; .pcap / .pcap.gz) are turned into
+    flows by FlowAggregator with the capture_live settings, so training sees
+    exactly the features live capture produces. Flows are labelled from a
+    "<name>.labels.json" file next to the pcap ({cidr: label} on the flow
+    source, the e2e_regression.py format), "unknown" without one.
+  - CICIDS2017 and UNSW-NB15 CSVs (data/CICIDS2017, data/UNSW-NB15; the
+    format is detected from the columns) are mapped to the FEATURES schema:
+    seconds, frame bytes (link + IP headers added), protocol numbers.
+
+Every input file is converted by its own worker process into a part file
+(parts/ next to the output), written in ROW_GROUP_SIZE row groups; the
+parts are then streamed into the merged file in input order.
+
+    python src/ingestion/prepare_dataset.py
+    python src/ingestion/prepare_dataset.py --workers 8 --sources pcap cicids
+    python src/ingestion/prepare_dataset.py --input my.pcap --input extra.csv
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- FIX PYTHONPATH FOR ANY EXECUTION LOCATION ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+# --------------------------------------------------
+
+from src.capture.pcap_reader import read_pcap
+from src.control.prefix_map import PrefixMap
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.models.features import FEATURES, needs_extended_stats
+
+# CONFIG
+
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+PCAP_DIRS = [os.path.join(DATA_DIR, "raw_pcaps"), os.path.join(DATA_DIR, "captures")]
+CICIDS_DIR = os.path.join(DATA_DIR, "CICIDS2017")
+UNSW_DIR = os.path.join(DATA_DIR, "UNSW-NB15")
+OUTPUT_FILE = os.path.join(DATA_DIR, "flows", "processed", "merged_dataset.parquet")
+
+# rows per Parquet row group (= train_models.py BATCH_SIZE) and per CSV chunk
+ROW_GROUP_SIZE = 200_000
+CSV_CHUNK = 200_000
+WORKERS = os.cpu_count() or 1
+
+# capture_live defaults (capture_live itself needs scapy to import)
+FLOW_TIMEOUT = 10.0
+PROTO_TIMEOUTS = {6: FLOW_TIMEOUT, 17: 5.0}
+ACTIVE_TIMEOUT = 60.0
+FLOW_LINGER = 1.0
+BIDIRECTIONAL_FLOWS = True
+
+# live capture counts whole frames; the CSV datasets count less per packet
+ETH_HEADER = 14
+# CICFlowMeter: payload lengths plus TCP/UDP header lengths
+CIC_PACKET_OVERHEAD = ETH_HEADER + 20
+UNKNOWN_LABEL = "unknown"
+
+SCHEMA = pa.schema([(f, pa.float64()) for f in FEATURES]
+                   + [("label", pa.string()), ("dataset", pa.string())])
+
+# UNSW-NB15_{1..4}.csv have no header row
+UNSW_COLUMNS = [
+    "srcip", "sport", "dstip", "dsport", "proto", "state", "dur", "sbytes", "dbytes",
+    "sttl", "dttl", "sloss", "dloss", "service", "sload", "dload", "spkts", "dpkts",
+    "swin", "dwin", "stcpb", "dtcpb", "smeansz", "dmeansz", "trans_depth", "res_bdy_len",
+    "sjit", "djit", "stime", "ltime", "sintpkt", "dintpkt", "tcprtt", "synack", "ackdat",
+    "is_sm_ips_ports", "ct_state_ttl", "ct_flw_http_mthd", "is_ftp_login", "ct_ftp_cmd",
+    "ct_srv_src", "ct_srv_dst", "ct_dst_ltm", "ct_src_ltm", "ct_src_dport_ltm",
+    "ct_dst_sport_ltm", "ct_dst_src_ltm", "attack_cat", "label",
+]
+# names used by the UNSW-NB15 training / testing set files
+UNSW_ALIASES = {"smean": "smeansz", "dmean": "dmeansz", "sinpkt": "sintpkt", "dinpkt": "dintpkt"}
+
+# (our prefix, CICIDS prefix) of the mean / std / min / max column groups
+CIC_STATS = [
+    ("fwd_pkt_len", "Fwd Packet Length"),
+    ("bwd_pkt_len", "Bwd Packet Length"),
+    ("flow_iat", "Flow IAT"),
+    ("fwd_iat", "Fwd IAT"),
+    ("bwd_iat", "Bwd IAT"),
+]
+CIC_FLAGS = ["fin", "syn", "rst", "psh", "ack", "urg"]
+
+# UTILS
+
+
+class RowGroupWriter:
+    """ParquetWriter that writes row groups of exactly `row_group_size` rows (the last one shorter)."""
+
+    def __init__(self, path, row_group_size: int = ROW_GROUP_SIZE, schema=SCHEMA):
+        self.schema = schema
+        self.row_group_size = int(row_group_size)
+        self.writer = pq.ParquetWriter(path, schema)
+        self.pending = []
+        self.pending_rows = 0
+        self.rows = 0
+
+    def write(self, table: pa.Table):
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        while self.pending_rows >= self.row_group_size:
+            self._flush(self.row_group_size)
+
+    def _flush(self, n):
+        table = pa.concat_tables(self.pending)
+        self.writer.write_table(table.slice(0, n), row_group_size=n)
+        rest = table.slice(n)
+        self.pending = [rest] if rest.num_rows else []
+        self.pending_rows = rest.num_rows
+        self.rows += n
+
+    def close(self):
+        if self.pending_rows:
+            self._flush(self.pending_rows)
+        self.writer.close()
+
+
+def to_table(features: dict, labels, dataset: str) -> pa.Table:
+    """Columns of FEATURES (missing ones as 0, NaN / inf as 0) + label + dataset."""
+    n = len(labels)
+    cols = []
+    for f in FEATURES:
+        v = features.get(f)
+        v = np.zeros(n) if v is None else np.asarray(v, dtype=np.float64)
+        cols.append(pa.array(np.where(np.isfinite(v), v, 0.0)))
+    cols.append(pa.array(list(labels), type=pa.string()))
+    cols.append(pa.array([dataset] * n, type=pa.string()))
+    return pa.Table.from_arrays(cols, schema=SCHEMA)
+
+
+def clean_label(value) -> str:
+    s = str(value).strip().lower() if value is not None and value == value else ""
+    return "benign" if s in ("", "benign", "normal", "0") else s
+
+
+# PCAP
+
+
+def labels_file(path):
+    base = os.path.basename(path)
+    for ext in (".gz", ".pcap", ".cap"):
+        if base.endswith(ext):
+            base = base[:-len(ext)]
+    candidate = os.path.join(os.path.dirname(path), base + ".labels.json")
+    return candidate if os.path.exists(candidate) else None
+
+
+def convert_pcap(path, writer):
+    truth = None
+    labels_path = labels_file(path)
+    if labels_path:
+        with open(labels_path) as f:
+            truth = PrefixMap()
+            for cidr, name in json.load(f).items():
+                truth.insert(cidr, name)
+
+    agg = FlowAggregator(timeout=FLOW_TIMEOUT, bidirectional=BIDIRECTIONAL_FLOWS,
+                         idle_timeouts=PROTO_TIMEOUTS, active_timeout=ACTIVE_TIMEOUT,
+                         linger=FLOW_LINGER, extended_stats=needs_extended_stats(FEATURES))
+    rows = []
+
+    def emit(flows):
+        for f in flows:
+            rows.append(f.to_dict())
+        if len(rows) >= ROW_GROUP_SIZE:
+            flush()
+
+    def flush():
+        if not rows:
+            return
+        labels = []
+        for r in rows:
+            hit = truth.lookup(r["src_ip"]) if truth is not None else None
+            labels.append(clean_label(hit[1]) if hit else (UNKNOWN_LABEL if truth is None else "benign"))
+        features = {f: [r.get(f, 0.0) for r in rows] for f in FEATURES}
+        writer.write(to_table(features, labels, "pcap"))
+        rows.clear()
+
+    # packet by packet, as FlowPipeline.process does
+    push, extract = agg.push_packet, agg.extract_ready_flows
+    for src, dst, sport, dport, proto, size, flags, ts in read_pcap(path):
+        push(src, dst, sport, dport, proto, size, ts=ts, flags=flags)
+        ready = extract(now=ts)
+        if ready:
+            emit(ready)
+    emit(agg.force_close_all())
+    flush()
+    return []
+
+
+# CSV
+
+
+def read_header(path):
+    return pd.read_csv(path, nrows=0, encoding="latin-1").columns
+
+
+def csv_format(path):
+    cols = {str(c).strip().lower() for c in read_header(path)}
+    if "flow duration" in cols:
+        return "cicids"
+    if {"sbytes", "dbytes", "spkts"} <= cols:
+        return "unsw"
+    if len(cols) == len(UNSW_COLUMNS):
+        # headerless UNSW-NB15_n.csv: the first row is data
+        return "unsw_raw"
+    return None
+
+
+def num(df, col):
+    if col not in df:
+        return None
+    return pd.to_numeric(df[col], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def per_packet(total, pkts):
+    return np.divide(total, pkts, out=np.zeros_like(total), where=pkts > 0)
+
+
+def cicids_features(df):
+    df.columns = [str(c).strip() for c in df.columns]
+    out = {}
+    dur = np.maximum(num(df, "Flow Duration"), 0.0) / 1e6
+    fwd, bwd = num(df, "Total Fwd Packets"), num(df, "Total Backward Packets")
+    # header lengths are negative in some rows (CICFlowMeter bug)
+    fwd_hdr = np.maximum(num(df, "Fwd Header Length"), 0.0)
+    bwd_hdr = np.maximum(num(df, "Bwd Header Length"), 0.0)
+    fwd_bytes = num(df, "Total Length of Fwd Packets") + fwd_hdr + CIC_PACKET_OVERHEAD * fwd
+    bwd_bytes = num(df, "Total Length of Bwd Packets") + bwd_hdr + CIC_PACKET_OVERHEAD * bwd
+    out.update(duration=dur, tot_fwd_pkts=fwd, tot_bwd_pkts=bwd, src_bytes=fwd_bytes,
+               dst_bytes=bwd_bytes, total_pkts=fwd + bwd, total_bytes=fwd_bytes + bwd_bytes,
+               protocol=num(df, "Protocol"))
+
+    # payload lengths -> frame lengths (mean per-packet header of the direction)
+    offsets = {
+        "fwd_pkt_len": per_packet(fwd_hdr, fwd) + CIC_PACKET_OVERHEAD,
+        "bwd_pkt_len": per_packet(bwd_hdr, bwd) + CIC_PACKET_OVERHEAD,
+        "pkt_len": per_packet(fwd_hdr + bwd_hdr, fwd + bwd) + CIC_PACKET_OVERHEAD,
+    }
+    for ours, theirs in CIC_STATS:
+        for stat in ("mean", "std", "min", "max"):
+            v = num(df, f"{theirs} {stat.capitalize()}")
+            if v is None:
+                continue
+            if ours in offsets:
+                out[f"{ours}_{stat}"] = v if stat == "std" else v + offsets[ours]
+            else:
+                out[f"{ours}_{stat}"] = v / 1e6
+    for stat, col in (("mean", "Packet Length Mean"), ("std", "Packet Length Std"),
+                      ("min", "Min Packet Length"), ("max", "Max Packet Length")):
+        v = num(df, col)
+        if v is not None:
+            out[f"pkt_len_{stat}"] = v if stat == "std" else v + offsets["pkt_len"]
+    for flag in CIC_FLAGS:
+        v = num(df, f"{flag.upper()} Flag Count")
+        if v is not None:
+            out[f"{flag}_flag_cnt"] = v
+    out["flow_bytes_s"] = np.divide(out["total_bytes"], dur, out=np.zeros_like(dur), where=dur > 0)
+    out["flow_pkts_s"] = np.divide(out["total_pkts"], dur, out=np.zeros_like(dur), where=dur > 0)
+    labels = df["Label"] if "Label" in df else [UNKNOWN_LABEL] * len(df)
+    return out, [clean_label(x) for x in labels]
+
+
+_PROTO_NUMBERS = {"tcp": 6, "udp": 17, "icmp": 1}
+
+
+def proto_number(name) -> float:
+    name = str(name).strip().lower()
+    if name not in _PROTO_NUMBERS:
+        try:
+            _PROTO_NUMBERS[name] = socket.getprotobyname(name)
+        except OSError:
+            _PROTO_NUMBERS[name] = 0
+    return _PROTO_NUMBERS[name]
+
+
+def unsw_features(df):
+    df.columns = [UNSW_ALIASES.get(c, c) for c in (str(c).strip().lower() for c in df.columns)]
+    out = {}
+    dur = np.maximum(num(df, "dur"), 0.0)
+    fwd, bwd = num(df, "spkts"), num(df, "dpkts")
+    # sbytes / dbytes count IP packets
+    fwd_bytes = num(df, "sbytes") + ETH_HEADER * fwd
+    bwd_bytes = num(df, "dbytes") + ETH_HEADER * bwd
+    total_pkts, total_bytes = fwd + bwd, fwd_bytes + bwd_bytes
+    out.update(duration=dur, tot_fwd_pkts=fwd, tot_bwd_pkts=bwd, src_bytes=fwd_bytes,
+               dst_bytes=bwd_bytes, total_pkts=total_pkts, total_bytes=total_bytes,
+               protocol=np.array([proto_number(p) for p in df["proto"]], dtype=np.float64))
+    out["pkt_len_mean"] = per_packet(total_bytes, total_pkts)
+    if "smeansz" in df:
+        out["fwd_pkt_len_mean"] = np.where(fwd > 0, num(df, "smeansz") + ETH_HEADER, 0.0)
+        out["bwd_pkt_len_mean"] = np.where(bwd > 0, num(df, "dmeansz") + ETH_HEADER, 0.0)
+    if "sintpkt" in df:
+        # milliseconds
+        out["fwd_iat_mean"] = num(df, "sintpkt") / 1e3
+        out["bwd_iat_mean"] = num(df, "dintpkt") / 1e3
+    out["flow_bytes_s"] = np.divide(total_bytes, dur, out=np.zeros_like(dur), where=dur > 0)
+    out["flow_pkts_s"] = np.divide(total_pkts, dur, out=np.zeros_like(dur), where=dur > 0)
+
+    if "attack_cat" in df:
+        cats = [clean_label(c) for c in df["attack_cat"]]
+        flags = num(df, "label")
+        if flags is not None:
+            # attack_cat is empty for normal traffic, label says 0
+            cats = [c if f else "benign" for c, f in zip(cats, flags)]
+        labels = cats
+    elif "label" in df:
+        labels = ["benign" if not f else "attack" for f in num(df, "label")]
+    else:
+        labels = [UNKNOWN_LABEL] * len(df)
+    return out, labels
+
+
+def convert_csv(path, fmt, writer):
+    if fmt == "unsw_raw":
+        reader = pd.read_csv(path, header=None, names=UNSW_COLUMNS, chunksize=CSV_CHUNK,
+                             encoding="latin-1", low_memory=False)
+    else:
+        reader = pd.read_csv(path, chunksize=CSV_CHUNK, encoding="latin-1", low_memory=False)
+    features_of = cicids_features if fmt == "cicids" else unsw_features
+    dataset = "cicids" if fmt == "cicids" else "unsw"
+    missing = set(FEATURES)
+    for df in reader:
+        features, labels = features_of(df)
+        missing &= {f for f in FEATURES if features.get(f) is None}
+        writer.write(to_table(features, labels, dataset))
+    return sorted(missing)
+
+
+# DRIVER
+
+
+def find_inputs(sources):
+    inputs = []
+    if "pcap" in sources:
+        for d in PCAP_DIRS:
+            for pattern in ("*.pcap", "*.pcap.gz", "*.cap"):
+                inputs += sorted(glob.glob(os.path.join(d, "**", pattern), recursive=True))
+    for source, d in (("cicids", CICIDS_DIR), ("unsw", UNSW_DIR)):
+        if source in sources:
+            for pattern in ("*.csv", "*.csv.gz"):
+                inputs += sorted(glob.glob(os.path.join(d, "**", pattern), recursive=True))
+    return inputs
+
+
+def input_kind(path):
+    if path.endswith((".pcap", ".pcap.gz", ".cap")):
+        return "pcap"
+    if path.endswith((".csv", ".csv.gz")):
+        return csv_format(path)
+    return None
+
+
+def convert(index, path, parts_dir):
+    """Worker: one input file -> one part file. Returns (part path, kind, rows, features left at 0)."""
+    kind = input_kind(path)
+    if kind is None:
+        return None, None, 0, []
+    name = os.path.basename(path).split(".")[0]
+    part = os.path.join(parts_dir, f"{index:04d}_{name}.parquet")
+    writer = RowGroupWriter(part)
+    try:
+        missing = convert_pcap(path, writer) if kind == "pcap" else convert_csv(path, kind, writer)
+    finally:
+        writer.close()
+    return part, kind, writer.rows, missing
+
+
+def merge(parts, output):
+    """Stream the part files, in order, into `output` with ROW_GROUP_SIZE row groups."""
+    tmp = output + ".tmp"
+    writer = RowGroupWriter(tmp)
+    for part in parts:
+        for batch in pq.ParquetFile(part).iter_batches(batch_size=ROW_GROUP_SIZE):
+            writer.write(pa.Table.from_batches([batch], schema=SCHEMA))
+    writer.close()
+    os.replace(tmp, output)
+    return writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", nargs="+", choices=("pcap", "cicids", "unsw"),
+                        default=["pcap", "cicids", "unsw"], help="dataset directories to read")
+    parser.add_argument("--input", action="append", default=[],
+                        help="convert this file instead of the dataset directories (repeatable)")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--keep-parts", action="store_true", help="keep the per-file part files")
+    args = parser.parse_args(argv)
+
+    inputs = args.input or find_inputs(args.sources)
+    if not inputs:
+        print("[prepare_dataset] no input files found (run tools/download_datasets.sh)")
+        return 1
+    parts_dir = os.path.join(os.path.dirname(os.path.abspath(args.output)), "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    print(f"[prepare_dataset] {len(inputs)} input files, {args.workers} workers")
+
+    t0 = time.time()
+    parts = {}
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(convert, i, path, parts_dir): (i, path) for i, path in enumerate(inputs)}
+        for fut in as_completed(futures):
+            i, path = futures[fut]
+            try:
+                part, kind, rows, missing = fut.result()
+            except Exception as e:
+                print(f"[prepare_dataset] {path}: failed: {e}")
+                continue
+            if part is None:
+                print(f"[prepare_dataset] {path}: unknown format, skipped")
+                continue
+            parts[i] = part
+            print(f"[prepare_dataset] {path} ({kind}): {rows} flows")
+            if missing:
+                print(f"[prepare_dataset]   no source for {', '.join(missing)} (left at 0)")
+
+    if not parts:
+        print("[prepare_dataset] nothing converted")
+        return 1
+    rows = merge([parts[i] for i in sorted(parts)], args.output)
+    if not args.keep_parts:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    print(f"[prepare_dataset] {rows} flows -> {args.output} in {time.time() - t0:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# src/ingestion/sharded_aggregator.py
+import heapq
+import multiprocessing as mp
+import queue
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.ingestion.flow_aggregator import Flow, FlowAggregator
+from src.ingestion.host_aggregator import stable_hash64
+
+
+def _canonical(src_ip, dst_ip, src_port, dst_port, proto):
+    """Direction-independent 5-tuple: ((ip, port), (ip, port), proto), lower endpoint first."""
+    a = (src_ip, int(src_port or 0))
+    b = (dst_ip, int(dst_port or 0))
+    if b < a:
+        a, b = b, a
+    return a, b, int(proto or 0)
+
+
+def _shard_index(key, n_shards: int) -> int:
+    (ip_a, port_a), (ip_b, port_b), proto = key
+    return stable_hash64(f"{ip_a}|{port_a}|{ip_b}|{port_b}|{proto}".encode()) % n_shards
+
+
+def shard_of(src_ip, dst_ip, src_port, dst_port, proto, n_shards: int) -> int:
+    """Shard index from the canonical 5-tuple; the same in every process and across restarts."""
+    return _shard_index(_canonical(src_ip, dst_ip, src_port, dst_port, proto), n_shards)
+
+
+class FlowHandle:
+    """What push_packet returns for a sharded flow: its initiator and packet count as seen here."""
+
+    __slots__ = ("src_ip", "src_port", "total_pkts")
+
+    def __init__(self, src_ip, src_port):
+        self.src_ip = src_ip
+        self.src_port = int(src_port or 0)
+        self.total_pkts = 0
+
+
+def _shard_worker(shard_id, inbox, outbox, aggregator_kwargs):
+    agg = FlowAggregator(**aggregator_kwargs)
+    early_scoring = bool(agg.provisional_packets or agg.provisional_seconds)
+    now = 0.0
+    while True:
+        kind, payload = inbox.get()
+        early = []
+        ready = []
+        if kind == "pkts":
+            # extract after every packet, as FlowPipeline does in-process, so
+            # an expired flow never absorbs a later packet of the same 5-tuple
+            for src, dst, sport, dport, proto, size, direction, ts, flags, weight, rate in payload:
+                agg.push_packet(src, dst, sport, dport, proto, size, direction, ts=ts, flags=flags,
+                                weight=weight, sample_rate=rate)
+                now = ts
+                if early_scoring:
+                    early.extend(agg.extract_provisional_flows(now=now))
+                ready.extend(agg.extract_ready_flows(now=now))
+        elif kind == "tick":
+            now = max(now, payload)
+            if early_scoring:
+                early = agg.extract_provisional_flows(now=now)
+            ready = agg.extract_ready_flows(now=now)
+        elif kind == "flush":
+            ready = agg.force_close_all()
+            now = float("inf")
+        else:
+            outbox.put((shard_id, float("inf"), [], [], True))
+            return
+        outbox.put((shard_id, now, ready, early, kind == "flush"))
+
+
+class ShardedFlowAggregator:
+    """
+    FlowAggregator partitioned across `n_shards` worker processes.
+    Packets are routed by a stable hash of the canonical 5-tuple (so both
+    directions of a connection land on the same shard) and shipped in
+    batches of `batch_size`. Each shard runs its own table and expiry;
+    expired flows come back with the shard's clock ("watermark"), and
+    extract_ready_flows() releases them as one stream ordered by end_time,
+    only up to the lowest watermark so that a slower shard cannot be
+    overtaken. Shards are polled every `tick_interval` seconds of packet
+    time. All other keyword arguments go to each shard's aggregator.
+
+    push_packet returns a FlowHandle (initiator address / port, packets
+    pushed) kept in this process until the shard returns the flow, which
+    is what FlowPipeline reads for its host counters. A 5-tuple reused
+    before the shard's record of the old flow comes back keeps the old
+    handle. extract_provisional_flows returns snapshots of the flows the
+    shards found due for an early score. The MemoryBudget hooks are not
+    forwarded.
+    """
+
+    def __init__(self, n_shards: int = 4, batch_size: int = 512,
+                 tick_interval: float = 0.5, **aggregator_kwargs):
+        self.n_shards = int(n_shards)
+        self.batch_size = int(batch_size)
+        self.tick_interval = float(tick_interval)
+        self.bidirectional = bool(aggregator_kwargs.get("bidirectional", False))
+        ctx = mp.get_context("spawn")
+        self._outbox = ctx.Queue()
+        self._inboxes = [ctx.Queue() for _ in range(self.n_shards)]
+        self._buffers: List[list] = [[] for _ in range(self.n_shards)]
+        self._watermarks = [0.0] * self.n_shards
+        self._pending: List[tuple] = []  # heap of (end_time, seq, Flow)
+        self._provisional: List[Flow] = []
+        self._handles: "OrderedDict[tuple, FlowHandle]" = OrderedDict()
+        self._seq = 0
+        self._last_tick = 0.0
+        self.packets = 0
+        self._procs = [
+            ctx.Process(target=_shard_worker,
+                        args=(i, self._inboxes[i], self._outbox, aggregator_kwargs),
+                        daemon=True)
+            for i in range(self.n_shards)
+        ]
+        for p in self._procs:
+            p.start()
+
+    def __len__(self):
+        """Flows pushed here whose record has not come back from a shard yet."""
+        return len(self._handles)
+
+    def _handle_key(self, key, src_ip, src_port):
+        # without bidirectional flows each direction is its own flow
+        return key if self.bidirectional else (key, src_ip, int(src_port or 0))
+
+    def push_packet(self, src_ip, dst_ip, src_port, dst_port, proto, size, direction=None,
+                    ts=None, flags=0, weight=1, sample_rate=1) -> FlowHandle:
+        ts = float(ts or time.time())
+        key = _canonical(src_ip, dst_ip, src_port, dst_port, proto)
+        i = _shard_index(key, self.n_shards)
+        buf = self._buffers[i]
+        buf.append((src_ip, dst_ip, src_port, dst_port, proto, size, direction, ts, flags,
+                    weight, sample_rate))
+        self.packets += 1
+        if len(buf) >= self.batch_size:
+            self._inboxes[i].put(("pkts", buf))
+            self._buffers[i] = []
+
+        hk = self._handle_key(key, src_ip, src_port)
+        handle = self._handles.get(hk)
+        if handle is None:
+            handle = self._handles[hk] = FlowHandle(src_ip, src_port)
+        handle.total_pkts += weight
+        return handle
+
+    def _send_buffers(self):
+        for i, buf in enumerate(self._buffers):
+            if buf:
+                self._inboxes[i].put(("pkts", buf))
+                self._buffers[i] = []
+
+    def _forget(self, f: Flow):
+        # an active-timeout split keeps counting in the shard under the same handle
+        if f.end_reason == "active":
+            return
+        key = _canonical(f.src_ip, f.dst_ip, f.src_port, f.dst_port, f.protocol)
+        self._handles.pop(self._handle_key(key, f.src_ip, f.src_port), None)
+
+    def _collect(self, block_until_done: bool = False) -> int:
+        done = 0
+        while True:
+            try:
+                if block_until_done:
+                    shard_id, mark, flows, early, last = self._outbox.get(timeout=30.0)
+                else:
+                    shard_id, mark, flows, early, last = self._outbox.get_nowait()
+            except queue.Empty:
+                return done
+            self._watermarks[shard_id] = max(self._watermarks[shard_id], mark)
+            self._provisional.extend(early)
+            for f in flows:
+                self._forget(f)
+                heapq.heappush(self._pending, (f.end_time, self._seq, f))
+                self._seq += 1
+            if last:
+                done += 1
+                if block_until_done and done == self.n_shards:
+                    return done
+
+    def _release(self, upto: float) -> List[Flow]:
+        out = []
+        while self._pending and self._pending[0][0] <= upto:
+            out.append(heapq.heappop(self._pending)[2])
+        return out
+
+    def extract_ready_flows(self, now: Optional[float] = None) -> List[Flow]:
+        """Flows every shard has passed; the shards are polled once per tick_interval."""
+        now = float(now or time.time())
+        if now - self._last_tick < self.tick_interval:
+            return []
+        self._send_buffers()
+        for inbox in self._inboxes:
+            inbox.put(("tick", now))
+        self._last_tick = now
+        self._collect()
+        return self._release(min(self._watermarks))
+
+    def extract_provisional_flows(self, now: Optional[float] = None) -> List[Flow]:
+        """Snapshots of active flows the shards returned for a (re-)score since the last call."""
+        out, self._provisional = self._provisional, []
+        return out
+
+    def force_close_all(self) -> List[Flow]:
+        self._send_buffers()
+        for inbox in self._inboxes:
+            inbox.put(("flush", None))
+        self._collect(block_until_done=True)
+        self._watermarks = [0.0] * self.n_shards
+        self._provisional = []
+        self._handles.clear()
+        return self._release(float("inf"))
+
+    def stats(self) -> Dict:
+        return {
+            "shards": self.n_shards,
+            "packets": self.packets,
+            "handles": len(self._handles),
+            "pending_output": len(self._pending),
+            "pending_provisional": len(self._provisional),
+            "watermarks": list(self._watermarks),
+        }
+
+    def close(self):
+        for inbox in self._inboxes:
+            inbox.put(("stop", None))
+        for p in self._procs:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
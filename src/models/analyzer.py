@@ -1,20 +1,20 @@
 # src/models/analyzer.py
 import os
+from operator import itemgetter
+from typing import NamedTuple, Optional
+
 import joblib
 import numpy as np
 import pandas as pd
 
-# Feature order MUST match training
-FEATURES = [
-    "duration",
-    "tot_fwd_pkts",
-    "tot_bwd_pkts",
-    "src_bytes",
-    "dst_bytes",
-    "total_pkts",
-    "total_bytes",
-    "protocol"
-]
+from src.models.features import FEATURES  # order MUST match training
+from src.models.centroid_index import CentroidIndex
+from src.models.compact_model import CompactModel
+from src.models.preprocessing import Preprocessor
+from src.models.score_cache import ScoreCache
+from src.reporting import metrics
+
+_feature_values = itemgetter(*FEATURES)
 
 MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", "models")
 
@@ -23,16 +23,97 @@ PROJECT_ROOT = os.path.abspath(os.path.join(_current_dir, "..", ".."))
 SCALER_PATH = os.path.join(PROJECT_ROOT, "models", "scaler.pkl")
 KMEANS_PATH = os.path.join(PROJECT_ROOT, "models", "kmeans.pkl")
 THRESHOLD_PATH = os.path.join(PROJECT_ROOT, "models", "threshold.pkl")
+# Written by train_models.py when it trains on preprocessed features
+PREPROCESS_PATH = os.path.join(PROJECT_ROOT, "models", "preprocess.pkl")
+
+# Nearest-centre search: "sklearn" (kmeans.predict), "brute" or "kdtree"
+# (see centroid_index.py); eps > 0 makes the kdtree approximate, bounded
+# to (1 + eps) x the exact distance
+CENTROID_BACKEND = "sklearn"
+CENTROID_EPS = 0.0
+# "float64" (scaler + CENTROID_BACKEND), or "float32" / "int16" / "int8":
+# scaler and centres folded into a CompactModel, scored in float32
+INFERENCE_PRECISION = "float64"
+# LRU cache of scores keyed by the flow's features (score_cache.py); 0 = off.
+# Quantization 0 caches exact feature vectors only (scores unchanged);
+# r > 0 (opt-in, e.g. 0.01) shares a score between flows whose features
+# differ by less than a factor (1 + r), trading exactness for more hits
+SCORE_CACHE_SIZE = 65536
+SCORE_CACHE_QUANTIZATION = 0.0
+
+
+class ModelSnapshot(NamedTuple):
+    """Everything one score reads; replaced as a whole by Analyzer.swap_model."""
+    scaler: object
+    kmeans: object
+    threshold: float
+    preprocess: Optional[Preprocessor]
+    index: CentroidIndex
+    compact: Optional[CompactModel]
 
 
 class Analyzer:
-    def __init__(self):
+    def __init__(self, backend: str = CENTROID_BACKEND, eps: float = CENTROID_EPS,
+                 precision: str = INFERENCE_PRECISION, cache_size: int = SCORE_CACHE_SIZE,
+                 cache_quantization: float = SCORE_CACHE_QUANTIZATION):
         if not os.path.exists(SCALER_PATH) or not os.path.exists(KMEANS_PATH) or not os.path.exists(THRESHOLD_PATH):
             raise FileNotFoundError("Scaler / KMeans / threshold pkl not found under models/. "
                                     "Expected: scaler.pkl, kmeans.pkl, threshold.pkl")
-        self.scaler = joblib.load(SCALER_PATH)
-        self.kmeans = joblib.load(KMEANS_PATH)
-        self.threshold = float(joblib.load(THRESHOLD_PATH))
+        self.backend = backend
+        self.eps = float(eps)
+        self.precision = precision
+        preprocess = None
+        if os.path.exists(PREPROCESS_PATH):
+            preprocess = joblib.load(PREPROCESS_PATH)
+            if preprocess.features != list(FEATURES):
+                raise ValueError("models/preprocess.pkl was fitted on other features than "
+                                 "features.FEATURES; re-run train_models.py")
+        # swap_model replaces the snapshot in one assignment, so a score never
+        # mixes parts of two models; version counts the swaps
+        self._model = self._build(joblib.load(SCALER_PATH), joblib.load(KMEANS_PATH),
+                                  float(joblib.load(THRESHOLD_PATH)), preprocess)
+        self.version = 0
+        self.cache = ScoreCache(cache_size, cache_quantization) if cache_size else None
+        self._score_latency = metrics.histogram("analyzer_score_seconds", "Analyzer.score latency")
+        self._batch_latency = metrics.histogram("analyzer_score_batch_seconds",
+                                                "Analyzer.score_batch latency")
+    def _build(self, scaler, kmeans, threshold, preprocess) -> ModelSnapshot:
+        compact = None
+        if self.precision != "float64":
+            compact = CompactModel(scaler, kmeans, self.precision, preprocess)
+        return ModelSnapshot(scaler, kmeans, threshold, preprocess,
+                             CentroidIndex(kmeans, self.backend, self.eps), compact)
+    @property
+    def model(self) -> ModelSnapshot:
+        """The current model, read in one step."""
+        return self._model
+    @property
+    def scaler(self):
+        return self._model.scaler
+    @property
+    def kmeans(self):
+        return self._model.kmeans
+    @property
+    def threshold(self) -> float:
+        return self._model.threshold
+    def swap_model(self, kmeans=None, threshold=None, scaler=None):
+        """Install a new model (parts left as None are kept) without pausing scoring."""
+        old = self._model
+        if kmeans is None and scaler is None:
+            new = old._replace(threshold=old.threshold if threshold is None else float(threshold))
+        else:
+            new = self._build(old.scaler if scaler is None else scaler,
+                              old.kmeans if kmeans is None else kmeans,
+                              old.threshold if threshold is None else float(threshold),
+                              old.preprocess)
+        self._model = new
+        self.version += 1
+    def scale(self, X, model: ModelSnapshot = None) -> np.ndarray:
+        """Raw FEATURES rows -> the scaled space the KMeans works in."""
+        model = model or self._model
+        if model.preprocess is not None:
+            X = model.preprocess.transform(X)
+        return model.scaler.transform(X)
     def _flow_to_vector(self, flow_row) -> np.ndarray:
         vals = []
         for f in FEATURES:
@@ -41,30 +122,72 @@ class Analyzer:
             else:
                 vals.append(float(flow_row[f]))
         return np.array(vals, dtype=float).reshape(1, -1)
+    def _rows_to_matrix(self, rows) -> np.ndarray:
+        if isinstance(rows, pd.DataFrame):
+            return rows.reindex(columns=FEATURES, fill_value=0.0).to_numpy(dtype=float)
+        try:
+            return np.array([_feature_values(r) for r in rows], dtype=float)
+        except KeyError:
+            return np.array([[float(r.get(f, 0.0)) for f in FEATURES] for r in rows], dtype=float)
     def score(self, flow_row) -> float:
+        if not self._score_latency.enabled:
+            return self._score(flow_row)
+        with self._score_latency.time():
+            return self._score(flow_row)
+    def _score(self, flow_row) -> float:
+        if self.cache is not None:
+            return float(self._score_batch([flow_row])[0])
+        model = self._model
         x = self._flow_to_vector(flow_row)
-        x_scaled = self.scaler.transform(x)
-        labels = self.kmeans.predict(x_scaled)
-        centers = self.kmeans.cluster_centers_
-        dists = np.linalg.norm(x_scaled - centers[labels], axis=1)
+        if model.compact is not None:
+            return float(model.compact.score(x)[0])
+        dists, _ = model.index.query(self.scale(x, model))
         return float(dists[0])
+    def score_batch(self, rows) -> np.ndarray:
+        """Scores of a list of flow dicts or a DataFrame, in one pass."""
+        if not len(rows):
+            return np.empty(0)
+        if not self._batch_latency.enabled:
+            return self._score_batch(rows)
+        with self._batch_latency.time():
+            return self._score_batch(rows)
+    def _score_batch(self, rows) -> np.ndarray:
+        model = self._model
+        cache = self.cache
+        if cache is None or isinstance(rows, pd.DataFrame):
+            return self._score_matrix(self._rows_to_matrix(rows), model)
+        cache.bind(model)
+        keys = [cache.key(r) for r in rows]
+        out = np.empty(len(rows))
+        missed = []
+        for i, k in enumerate(keys):
+            sc = cache.get(k)
+            if sc is None:
+                missed.append(i)
+            else:
+                out[i] = sc
+        if missed:
+            scores = self._score_matrix(self._rows_to_matrix([rows[i] for i in missed]), model)
+            out[missed] = scores
+            for i, sc in zip(missed, scores):
+                cache.put(keys[i], float(sc))
+        return out
+    def _score_matrix(self, X, model: ModelSnapshot) -> np.ndarray:
+        if model.compact is not None:
+            return model.compact.score(X).astype(float)
+        dists, _ = model.index.query(self.scale(X, model))
+        return np.asarray(dists, dtype=float)
     def label_from_score(self, score: float) -> str:
-        if score > self.threshold * 1.8:
+        threshold = self._model.threshold
+        if score > threshold * 1.8:
             return "attack"
-        elif score > self.threshold:
+        elif score > threshold:
             return "suspicious"
         else:
             return "benign"
     def annotate_df(self, df):
-        import numpy as np
-        scores = []
-        labels = []
-        for _, row in df.iterrows():
-            sc = self.score(row)
-            lb = self.label_from_score(sc)
-            scores.append(sc)
-            labels.append(lb)
+        scores = self.score_batch(df)
         out = df.copy()
-        out["anomaly_score"] = np.array(scores)
-        out["label"] = labels
+        out["anomaly_score"] = scores
+        out["label"] = [self.label_from_score(sc) for sc in scores]
         return out
@@ -0,0 +1,61 @@
+# src/models/centroid_index.py
+import numpy as np
+
+BACKENDS = ("sklearn", "brute", "kdtree")
+# rows per block in brute-force batch queries (block x k distance matrix)
+BRUTE_BLOCK = 4096
+
+
+class CentroidIndex:
+    """
+    Nearest cluster centre lookup for Analyzer: query(X_scaled) -> (distances, indices).
+
+    - "sklearn": kmeans.predict + distance, the original path
+    - "brute":   numpy distances to every centre, exact, O(k) per row but without
+                 predict()'s input validation
+    - "kdtree":  scipy cKDTree over the centres (scipy ships with scikit-learn).
+                 Exact with eps=0; with eps > 0 the returned distance is at most
+                 (1 + eps) times the true nearest distance, so a score can only
+                 be overestimated and only labels of flows scoring within a
+                 factor (1 + eps) below a threshold can change.
+    The centres are copied: rebuild the index when the model changes.
+    """
+
+    def __init__(self, kmeans, backend: str = "sklearn", eps: float = 0.0, leafsize: int = 8):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown centroid index backend {backend!r}, expected one of {BACKENDS}")
+        self.kmeans = kmeans
+        self.backend = backend
+        self.eps = float(eps)
+        self.centers = np.ascontiguousarray(kmeans.cluster_centers_, dtype=float)
+        self._sq_norms = (self.centers ** 2).sum(axis=1)
+        self._tree = None
+        if backend == "kdtree":
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.centers, leafsize=leafsize)
+
+    def query(self, X):
+        if self.backend == "kdtree":
+            dist, idx = self._tree.query(X, k=1, eps=self.eps)
+            return dist, idx
+        if self.backend == "brute":
+            return self._brute(X)
+        idx = self.kmeans.predict(X)
+        return np.linalg.norm(X - self.centers[idx], axis=1), idx
+
+    def _brute(self, X):
+        C = self.centers
+        if len(X) == 1:
+            d = np.sqrt(((C - X[0]) ** 2).sum(axis=1))
+            i = int(d.argmin())
+            return d[i:i + 1], np.array([i])
+        dist = np.empty(len(X))
+        idx = np.empty(len(X), dtype=np.intp)
+        for s in range(0, len(X), BRUTE_BLOCK):
+            block = X[s:s + BRUTE_BLOCK]
+            # |x - c|^2 = |c|^2 - 2 x.c + |x|^2; |x|^2 does not change the argmin
+            i = (self._sq_norms - 2.0 * block @ C.T).argmin(axis=1)
+            idx[s:s + len(block)] = i
+            # the expansion cancels badly for near points: recompute the winner directly
+            dist[s:s + len(block)] = np.linalg.norm(block - C[i], axis=1)
+        return dist, idx
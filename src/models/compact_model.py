@@ -0,0 +1,88 @@
+# src/models/compact_model.py
+import numpy as np
+
+PRECISIONS = ("float64", "float32", "int16", "int8")
+_INT_TYPES = {"int16": (np.int16, 32767), "int8": (np.int8, 127)}
+# Quantized range per dimension: the farthest centre plus this many scaled
+# units (standard deviations). Rows outside it are scored in float32.
+QUANT_HEADROOM = 3.0
+# rows per block (block x k distance matrix)
+BLOCK = 4096
+
+
+class CompactModel:
+    """
+    StandardScaler + KMeans centres folded into float32 arrays for batch
+    scoring: scaled = (preprocess(x) - mean) * inv_scale, distance to the
+    nearest centre by |c|^2 - 2 x.c (one matrix product), winner distance
+    recomputed directly.
+
+    int16 / int8 quantize centres and scaled rows to a per-dimension step
+    (range / levels). Numpy has no fast integer matrix product, so the
+    arithmetic stays float32: these modes show the accuracy of a quantized
+    model (and store centres / row batches in 1/2 or 1/4 of the memory),
+    they are not faster than float32.
+    """
+
+    def __init__(self, scaler, kmeans, precision: str = "float32", preprocess=None):
+        if precision not in PRECISIONS or precision == "float64":
+            raise ValueError(f"CompactModel precision must be one of {PRECISIONS[1:]}, got {precision!r}")
+        self.precision = precision
+        self.preprocess = preprocess
+        self.mean = np.asarray(scaler.mean_, dtype=np.float32)
+        self.inv_scale = (1.0 / np.asarray(scaler.scale_, dtype=np.float64)).astype(np.float32)
+        centers = np.asarray(kmeans.cluster_centers_, dtype=np.float64)
+        self.step = None
+        self.qcenters = None
+        if precision in _INT_TYPES:
+            itype, levels = _INT_TYPES[precision]
+            span = np.abs(centers).max(axis=0) + QUANT_HEADROOM
+            self.step = (span / levels).astype(np.float32)
+            self.levels = levels
+            self.qcenters = np.round(centers / self.step).astype(itype)
+            centers = self.qcenters * self.step
+        self.centers = np.ascontiguousarray(centers, dtype=np.float32)
+        self._sq_norms = (self.centers ** 2).sum(axis=1)
+        self._centers_t = np.ascontiguousarray(self.centers.T)
+
+    def transform(self, X) -> np.ndarray:
+        if self.preprocess is not None:
+            X = self.preprocess.transform(X)
+        X = np.asarray(X, dtype=np.float32)
+        return (X - self.mean) * self.inv_scale
+
+    def quantize(self, Xs):
+        """(integer rows, mask of rows that needed clipping)"""
+        itype, levels = _INT_TYPES[self.precision]
+        q = np.rint(Xs / self.step)
+        saturated = (np.abs(q) > levels).any(axis=1)
+        np.clip(q, -levels, levels, out=q)
+        return q.astype(itype), saturated
+
+    def nearest(self, Xs):
+        """Distances (float32) of scaled rows to their nearest centre."""
+        C, Ct, sq = self.centers, self._centers_t, self._sq_norms
+        dist = np.empty(len(Xs), dtype=np.float32)
+        for s in range(0, len(Xs), BLOCK):
+            block = Xs[s:s + BLOCK]
+            i = (sq - 2.0 * (block @ Ct)).argmin(axis=1)
+            diff = block - C[i]
+            dist[s:s + len(block)] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        return dist
+
+    def score(self, X) -> np.ndarray:
+        """Anomaly scores of raw feature rows (n x features)."""
+        Xs = self.transform(X)
+        if self.qcenters is None:
+            return self.nearest(Xs)
+        q, saturated = self.quantize(Xs)
+        Xq = q * self.step
+        if saturated.any():
+            # far outside every centre's range: keep the float32 row
+            Xq[saturated] = Xs[saturated]
+        return self.nearest(Xq)
+
+    def nbytes(self) -> int:
+        """Bytes of the arrays scoring reads (scaler, centres)."""
+        centres = self.qcenters if self.qcenters is not None else self.centers
+        return int(self.mean.nbytes + self.inv_scale.nbytes + centres.nbytes)
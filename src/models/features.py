@@ -0,0 +1,42 @@
+# src/models/features.py
+# Feature sets shared by training (train_models.py), scoring (Analyzer)
+# and flow extraction (FlowAggregator). Order matters: it is the column
+# order the scaler and KMeans were fitted on.
+
+BASIC_FEATURES = [
+    "duration",
+    "tot_fwd_pkts",
+    "tot_bwd_pkts",
+    "src_bytes",
+    "dst_bytes",
+    "total_pkts",
+    "total_bytes",
+    "protocol"
+]
+
+# Needs FlowAggregator(extended_stats=True)
+EXTENDED_FEATURES = BASIC_FEATURES + [
+    "pkt_len_mean", "pkt_len_std", "pkt_len_min", "pkt_len_max",
+    "fwd_pkt_len_mean", "fwd_pkt_len_std", "fwd_pkt_len_min", "fwd_pkt_len_max",
+    "bwd_pkt_len_mean", "bwd_pkt_len_std", "bwd_pkt_len_min", "bwd_pkt_len_max",
+    "flow_iat_mean", "flow_iat_std", "flow_iat_min", "flow_iat_max",
+    "fwd_iat_mean", "fwd_iat_std", "fwd_iat_min", "fwd_iat_max",
+    "bwd_iat_mean", "bwd_iat_std", "bwd_iat_min", "bwd_iat_max",
+    "fin_flag_cnt", "syn_flag_cnt", "rst_flag_cnt", "psh_flag_cnt",
+    "ack_flag_cnt", "urg_flag_cnt",
+    "flow_bytes_s", "flow_pkts_s",
+]
+
+FEATURE_SETS = {
+    "basic": BASIC_FEATURES,
+    "extended": EXTENDED_FEATURES,
+}
+
+# The set the shipped models/*.pkl were trained on. Changing it requires
+# re-running train_models.py.
+FEATURE_SET = "basic"
+FEATURES = FEATURE_SETS[FEATURE_SET]
+
+
+def needs_extended_stats(features=FEATURES) -> bool:
+    return any(f not in BASIC_FEATURES for f in features)
@@ -0,0 +1,251 @@
+# src/models/online_learner.py
+import copy
+import random
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from src.models.features import FEATURES
+from src.reporting import metrics
+
+# Same percentile train_models.py derives threshold.pkl from
+THRESHOLD_PERCENTILE = 98
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with five markers (P-square algorithm,
+    Jain & Chlamtac 1985): O(1) memory and time per observation.
+    """
+
+    def __init__(self, p: float):
+        self.p = float(p)
+        self.n = 0
+        self._q = []                                     # marker heights
+        self._pos = [1.0, 2.0, 3.0, 4.0, 5.0]            # actual marker positions
+        self._want = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+        self._step = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float):
+        self.n += 1
+        q = self._q
+        if self.n <= 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        pos, want = self._pos, self._want
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            want[i] += self._step[i]
+        for i in (1, 2, 3):
+            d = want[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                h = self._parabolic(i, d)
+                if not q[i - 1] < h < q[i + 1]:
+                    h = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = h
+                pos[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self._q, self._pos
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> Optional[float]:
+        if not self._q:
+            return None
+        if self.n <= 5:
+            return self._q[min(len(self._q) - 1, int(round(self.p * (len(self._q) - 1))))]
+        return self._q[2]
+
+
+class OnlineLearner:
+    """
+    Keeps the Analyzer's KMeans and threshold following the live traffic.
+
+    observe(rec, score, label) is called from the scoring loop for every final
+    flow; it only does bookkeeping (reservoir sampling, a streaming quantile).
+    Every `interval` seconds a background thread partial_fit()s a copy of the
+    current KMeans on the reservoir, moves the threshold towards the observed
+    quantile and installs both with Analyzer.swap_model; scoring continues on
+    the previous model meanwhile. The scaler (and preprocessing) stay as
+    trained offline.
+
+    Poisoning guards:
+      - only flows scoring below learn_margin * threshold enter the reservoir
+      - the threshold quantile sees benign/suspicious flows only
+      - a window in which more than max_positive_fraction of the flows were
+        suspicious/attack is discarded (no learning while under attack)
+      - an update whose mean centre shift exceeds max_shift * threshold is
+        rejected, and the threshold stays within threshold_bounds of the
+        offline value and moves by at most max_threshold_step per update
+
+    Drift is the mean distance of the current centres from the offline ones
+    (scaled feature units) and the current / offline threshold ratio.
+    """
+
+    def __init__(self, analyzer, interval: float = 300.0, reservoir_size: int = 5000,
+                 min_samples: int = 1000, learn_margin: float = 0.5,
+                 percentile: float = THRESHOLD_PERCENTILE, threshold_alpha: float = 0.2,
+                 max_threshold_step: float = 0.1, threshold_bounds=(0.5, 2.0),
+                 max_shift: float = 0.5, max_positive_fraction: float = 0.05,
+                 count_cap: int = 10000, seed: int = 42, start: bool = True):
+        self.analyzer = analyzer
+        self.interval = float(interval)
+        self.reservoir_size = int(reservoir_size)
+        self.min_samples = int(min_samples)
+        self.learn_margin = float(learn_margin)
+        self.percentile = float(percentile)
+        self.threshold_alpha = float(threshold_alpha)
+        self.max_threshold_step = float(max_threshold_step)
+        self.threshold_bounds = threshold_bounds
+        self.max_shift = float(max_shift)
+        self.max_positive_fraction = float(max_positive_fraction)
+        self.count_cap = int(count_cap)
+        self._rng = random.Random(seed)
+
+        self.base_centers = np.array(analyzer.kmeans.cluster_centers_, copy=True)
+        self.base_threshold = analyzer.threshold
+        self.drift = 0.0
+        self.last_shift = 0.0
+        self.updates = 0
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+        self._new_window()
+
+        metrics.gauge("model_drift", "Mean distance of the KMeans centres from the offline model",
+                      fn=lambda: self.drift)
+        metrics.gauge("model_threshold_ratio", "Current / offline anomaly threshold",
+                      fn=lambda: self.analyzer.threshold / self.base_threshold)
+        metrics.gauge("online_reservoir_size", "Flows sampled for the next model update",
+                      fn=lambda: len(self._reservoir))
+        self._m_updates = metrics.counter("model_updates_total", "Online model updates installed")
+        self._m_rejected = metrics.counter("model_updates_rejected_total",
+                                           "Online model updates discarded by a poisoning guard")
+
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _new_window(self):
+        self._reservoir: List[list] = []
+        self._seen = 0
+        self._flows = 0
+        self._positive = 0
+        self._quantile = P2Quantile(self.percentile / 100.0)
+
+    def observe(self, rec, score: float, label: str):
+        if score < 0:
+            return
+        threshold = self.analyzer.threshold
+        with self._lock:
+            self._flows += 1
+            if label in ("attack", "suspicious"):
+                self._positive += 1
+                if label == "attack":
+                    return
+            self._quantile.add(score)
+            if score >= self.learn_margin * threshold:
+                return
+            # Algorithm R: every candidate ends up in the reservoir with equal probability
+            self._seen += 1
+            if len(self._reservoir) < self.reservoir_size:
+                self._reservoir.append([float(rec.get(f, 0.0) or 0.0) for f in FEATURES])
+            else:
+                j = self._rng.randrange(self._seen)
+                if j < self.reservoir_size:
+                    self._reservoir[j] = [float(rec.get(f, 0.0) or 0.0) for f in FEATURES]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update()
+            except Exception as e:
+                print("[OnlineLearner] update failed:", e)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        self._m_rejected.inc()
+        print(f"[OnlineLearner] update rejected: {reason}")
+
+    def update(self) -> bool:
+        """Fit the flows seen since the last update and install the result; True if installed."""
+        with self._lock:
+            samples, flows, positive = self._reservoir, self._flows, self._positive
+            quantile = self._quantile.value()
+            self._new_window()
+        if len(samples) < self.min_samples:
+            return False
+        if flows and positive / flows > self.max_positive_fraction:
+            self._reject(f"{positive}/{flows} flows flagged in this window")
+            return False
+
+        model = self.analyzer.model
+        kmeans, threshold = model.kmeans, model.threshold
+        fitted = copy.deepcopy(kmeans)
+        # partial_fit weights a centre's update by 1 / (samples it has absorbed);
+        # after offline training that count is huge, so cap it to let the
+        # model move at all
+        counts = getattr(fitted, "_counts", None)
+        if counts is not None:
+            np.minimum(counts, self.count_cap, out=counts)
+        fitted.partial_fit(self.analyzer.scale(np.array(samples, dtype=float), model))
+
+        shift = float(np.linalg.norm(fitted.cluster_centers_ - kmeans.cluster_centers_, axis=1).mean())
+        if shift > self.max_shift * threshold:
+            self._reject(f"centre shift {shift:.4f} > {self.max_shift} * threshold")
+            return False
+
+        new_threshold = threshold
+        if quantile is not None:
+            target = (1 - self.threshold_alpha) * threshold + self.threshold_alpha * quantile
+            step = self.max_threshold_step * threshold
+            new_threshold = min(max(target, threshold - step), threshold + step)
+            lo, hi = self.threshold_bounds
+            new_threshold = min(max(new_threshold, lo * self.base_threshold), hi * self.base_threshold)
+
+        self.analyzer.swap_model(kmeans=fitted, threshold=new_threshold)
+        self.last_shift = shift
+        self.drift = float(np.linalg.norm(fitted.cluster_centers_ - self.base_centers, axis=1).mean())
+        self.updates += 1
+        self._m_updates.inc()
+        print(f"[OnlineLearner] model updated on {len(samples)} flows: shift {shift:.4f}, "
+              f"drift {self.drift:.4f}, threshold {threshold:.4f} -> {new_threshold:.4f}")
+        return True
+
+    def memory_usage(self) -> int:
+        """Approximate bytes of the reservoir (lists of Python floats)."""
+        return len(self._reservoir) * (56 + 32 * len(FEATURES))
+
+    def stats(self) -> dict:
+        return {
+            "updates": self.updates,
+            "rejected": self.rejected,
+            "drift": round(self.drift, 6),
+            "last_shift": round(self.last_shift, 6),
+            "threshold": self.analyzer.threshold,
+            "base_threshold": self.base_threshold,
+            "reservoir": len(self._reservoir),
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
@@ -0,0 +1,77 @@
+# src/models/preprocessing.py
+# Feature transform applied before the StandardScaler, fitted and saved by
+# train_models.py (models/preprocess.pkl) and applied by Analyzer whenever
+# that file exists. Models trained without it keep working on raw features.
+import numpy as np
+
+from src.models.features import FEATURES
+
+# Counters, byte sums, durations and rates span orders of magnitude: log1p
+HEAVY_TAILED = {
+    "duration", "tot_fwd_pkts", "tot_bwd_pkts", "src_bytes", "dst_bytes", "total_pkts", "total_bytes",
+    "flow_iat_mean", "flow_iat_std", "flow_iat_min", "flow_iat_max",
+    "fwd_iat_mean", "fwd_iat_std", "fwd_iat_min", "fwd_iat_max",
+    "bwd_iat_mean", "bwd_iat_std", "bwd_iat_min", "bwd_iat_max",
+    "fin_flag_cnt", "syn_flag_cnt", "rst_flag_cnt", "psh_flag_cnt", "ack_flag_cnt", "urg_flag_cnt",
+    "flow_bytes_s", "flow_pkts_s",
+}
+# (name, numerator, denominator), computed from the raw values; 0 when the
+# denominator is 0. Added only if both inputs are in the feature set.
+RATIOS = [
+    ("bytes_per_pkt", "total_bytes", "total_pkts"),
+    ("fwd_pkt_share", "tot_fwd_pkts", "total_pkts"),
+    ("src_byte_share", "src_bytes", "total_bytes"),
+]
+# Outputs are clipped to these training quantiles: extreme flows stay at the
+# edge of the fitted range instead of stretching the scaler
+CLIP_QUANTILE = 0.9999
+
+
+class Preprocessor:
+    """
+    X (rows x features, raw FEATURES order) -> log1p of HEAVY_TAILED columns,
+    RATIOS appended, every column clipped to the range seen in fit().
+    transform() is a handful of vectorised numpy operations per batch.
+    """
+
+    def __init__(self, features=FEATURES, log_features=HEAVY_TAILED, ratios=RATIOS,
+                 clip_quantile: float = CLIP_QUANTILE):
+        self.features = list(features)
+        index = {f: i for i, f in enumerate(self.features)}
+        self.log_idx = np.array([index[f] for f in self.features if f in log_features], dtype=np.intp)
+        self.ratios = [(name, index[num], index[den]) for name, num, den in ratios
+                       if num in index and den in index]
+        self.output_features = self.features + [name for name, _, _ in self.ratios]
+        self.clip_quantile = float(clip_quantile)
+        self.lo = None
+        self.hi = None
+
+    def _expand(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        out = np.empty((len(X), len(self.output_features)))
+        out[:, :X.shape[1]] = X
+        for j, (_, num, den) in enumerate(self.ratios, start=X.shape[1]):
+            d = X[:, den]
+            np.divide(X[:, num], d, out=out[:, j], where=d > 0)
+            out[d <= 0, j] = 0.0
+        if len(self.log_idx):
+            logs = out[:, self.log_idx]
+            np.maximum(logs, 0.0, out=logs)
+            out[:, self.log_idx] = np.log1p(logs)
+        return out
+
+    def fit(self, X):
+        """Learn the clipping range from a sample of raw rows."""
+        T = self._expand(X)
+        self.lo = np.quantile(T, 1.0 - self.clip_quantile, axis=0)
+        self.hi = np.quantile(T, self.clip_quantile, axis=0)
+        return self
+
+    def transform(self, X) -> np.ndarray:
+        T = self._expand(X)
+        if self.lo is not None:
+            np.clip(T, self.lo, self.hi, out=T)
+        return T
+
+    def fit_transform(self, X) -> np.ndarray:
+        return self.fit(X).transform(X)
@@ -0,0 +1,98 @@
+# src/models/score_cache.py
+import math
+from collections import OrderedDict
+from operator import itemgetter
+
+from src.models.features import FEATURES
+from src.reporting import metrics
+
+# Approximate bytes per entry (key tuple, score, LRU links; tracemalloc)
+ENTRY_BYTES = 400
+MIN_ENTRIES = 1024
+
+
+class ScoreCache:
+    """
+    LRU map from a flow's feature tuple to its anomaly score, in front of
+    Analyzer scoring. Floods produce thousands of flows with the same
+    features (1 SYN, 54 bytes, duration 0), which then cost one score.
+
+    quantization = 0 keys on the exact feature values (no effect on scores).
+    quantization = r > 0 puts every feature in a log bucket of relative
+    width r, so near-identical flows share an entry and get the score of
+    the first flow seen in their bucket.
+
+    The cache is bound to one model snapshot: bind() with another snapshot
+    (Analyzer.swap_model, a reload) clears it.
+    """
+
+    def __init__(self, size: int = 65536, quantization: float = 0.0, features=FEATURES):
+        self.size = int(size)
+        self.quantization = float(quantization)
+        self.features = list(features)
+        self._values = itemgetter(*self.features)
+        self._step = math.log1p(self.quantization) if self.quantization > 0 else 0.0
+        self._data = OrderedDict()
+        self.model = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._m_hits = metrics.counter("score_cache_hits_total", "Scores served from the score cache")
+        self._m_misses = metrics.counter("score_cache_misses_total", "Scores computed on a cache miss")
+        metrics.gauge("score_cache_entries", "Entries in the score cache", fn=lambda: len(self._data))
+
+    def bind(self, model):
+        if model is not self.model:
+            if self.model is not None:
+                self.invalidations += 1
+            self._data.clear()
+            self.model = model
+
+    def key(self, row) -> tuple:
+        try:
+            vals = self._values(row)
+        except KeyError:
+            vals = tuple(row.get(f, 0.0) for f in self.features)
+        step = self._step
+        if not step:
+            return vals
+        log1p = math.log1p
+        return tuple(int(log1p(v) / step) if v >= 0 else -int(log1p(-v) / step) for v in vals)
+
+    def get(self, key):
+        score = self._data.get(key)
+        if score is None:
+            self.misses += 1
+            self._m_misses.inc()
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        self._m_hits.inc()
+        return score
+
+    def put(self, key, score: float):
+        data = self._data
+        data[key] = score
+        if len(data) > self.size:
+            data.popitem(last=False)
+
+    def memory_usage(self) -> int:
+        return len(self._data) * ENTRY_BYTES
+
+    def set_memory_limit(self, nbytes):
+        """Set `size` to about `nbytes` of entries; the least recently used go first."""
+        if nbytes is None:
+            return
+        self.size = max(MIN_ENTRIES, int(nbytes) // ENTRY_BYTES)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -1,4 +1,5 @@
 import os
+import sys
 import numpy as np
 import pandas as pd
 import pyarrow.parquet as pq
@@ -9,6 +10,15 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import MiniBatchKMeans
 from tqdm import tqdm
 
+# --- FIX PYTHONPATH FOR ANY EXECUTION LOCATION ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+# --------------------------------------------------
+
+from src.models.features import FEATURES
+from src.models.preprocessing import Preprocessor
+
 # CONFIG
 
 PARQUET_FILE = "data/flows/processed/merged_dataset.parquet"
@@ -19,6 +29,12 @@ BATCH_SIZE = 200_000
 N_CLUSTERS = 30
 THRESHOLD_PERCENTILE = 98
 
+# log1p / ratio / clipping transform before the scaler (preprocessing.py),
+# saved as models/preprocess.pkl; its clip range is fitted on a random
+# sample of PREPROCESS_SAMPLE_FRAC of the rows
+PREPROCESS = True
+PREPROCESS_SAMPLE_FRAC = 0.05
+
 # UTILS
 
 def ensure_dir(path):
@@ -41,6 +57,23 @@ def main():
     ensure_dir(MODELS_DIR)
     ensure_dir(PLOTS_DIR)
 
+    # FIT PREPROCESSING
+
+    preprocess = None
+    if PREPROCESS:
+        print("  FITTING Preprocessor")
+        rng = np.random.default_rng(42)
+        sample = []
+        for batch in tqdm(load_batches(PARQUET_FILE, BATCH_SIZE), desc="Preprocess"):
+            X = batch[FEATURES].values
+            sample.append(X[rng.random(len(X)) < PREPROCESS_SAMPLE_FRAC])
+        preprocess = Preprocessor(FEATURES).fit(np.concatenate(sample))
+        print(f"Preprocessor fitted: {len(preprocess.output_features)} model inputs.\n")
+
+    def features_of(batch):
+        X = batch[FEATURES].values
+        return preprocess.transform(X) if preprocess is not None else X
+
     # TRAIN SCALER
     
     print("  TRAINING StandardScaler")
@@ -48,7 +81,7 @@ def main():
     scaler = StandardScaler()
 
     for batch in tqdm(load_batches(PARQUET_FILE, BATCH_SIZE), desc="Scaler"):
-        X = batch.drop(columns=["label"]).values
+        X = features_of(batch)
         scaler.partial_fit(X)
 
     print("Scaler trained.\n")
@@ -66,7 +99,7 @@ def main():
     batch_rejection_rates = []
 
     for batch in tqdm(load_batches(PARQUET_FILE, BATCH_SIZE), desc="KMeans"):
-        X = batch.drop(columns=["label"]).values
+        X = features_of(batch)
         X_scaled = scaler.transform(X)
         kmeans.partial_fit(X_scaled)
 
@@ -83,7 +116,7 @@ def main():
     all_scores = []
 
     for batch in tqdm(load_batches(PARQUET_FILE, BATCH_SIZE), desc="Scores"):
-        X = batch.drop(columns=["label"]).values
+        X = features_of(batch)
         X_scaled = scaler.transform(X)
         d = anomaly_score(X_scaled, kmeans)
         all_scores.append(d)
@@ -98,6 +131,12 @@ def main():
     joblib.dump(scaler, f"{MODELS_DIR}/scaler.pkl")
     joblib.dump(kmeans, f"{MODELS_DIR}/kmeans.pkl")
     joblib.dump(threshold, f"{MODELS_DIR}/threshold.pkl")
+    preprocess_path = f"{MODELS_DIR}/preprocess.pkl"
+    if preprocess is not None:
+        joblib.dump(preprocess, preprocess_path)
+    elif os.path.exists(preprocess_path):
+        # Analyzer applies preprocess.pkl whenever it exists
+        os.remove(preprocess_path)
 
     print("Models saved.\n")
 
@@ -0,0 +1,33 @@
+# src/reporting/dashboard_utils.py
+import io
+import os
+
+import pandas as pd
+
+TAIL_BLOCK = 1 << 16
+
+
+def read_csv_tail(path: str, max_rows: int) -> pd.DataFrame:
+    """
+    Last `max_rows` rows of a CSV with a header line, reading only the end
+    of the file: the GUI refreshes from live_flows.csv every second, which
+    grows for as long as capture runs.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        tail = b""
+        # one newline more than rows wanted, so the first line kept is whole
+        while pos > start and tail.count(b"\n") <= max_rows:
+            step = min(TAIL_BLOCK, pos - start)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+    lines = tail.splitlines(keepends=True)
+    if pos > start:
+        # partial first line
+        lines = lines[1:]
+    lines = lines[-max_rows:] if max_rows > 0 else []
+    return pd.read_csv(io.BytesIO(header + b"".join(lines)))
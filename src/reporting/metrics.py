@@ -0,0 +1,348 @@
+# src/reporting/metrics.py
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class _NullMetric:
+    """Returned for every metric while the registry is disabled; all calls are no-ops."""
+
+    enabled = False
+
+    def inc(self, n=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return _NULL_TIMER
+
+
+NULL = _NullMetric()
+
+
+class Counter:
+    enabled = True
+    kind = "counter"
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def get(self):
+        return self.value
+
+
+class Gauge:
+    enabled = True
+    kind = "gauge"
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        self.value += n
+
+    def get(self):
+        return self.value
+
+
+class Callback:
+    """Counter or gauge read from `fn` at scrape time (no cost on the hot path)."""
+
+    enabled = True
+
+    def __init__(self, name, help, labels, kind, fn: Callable[[], float]):
+        self.name, self.help, self.labels, self.kind = name, help, labels, kind
+        self.fn = fn
+
+    def get(self):
+        try:
+            return float(self.fn())
+        except Exception:
+            return float("nan")
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram. Values are scaled to integers
+    (`scale`, default microseconds for values in seconds) and counted in
+    buckets of 2**sub_bits sub-buckets per power of two, so any recorded
+    value is reported within 1/2**(sub_bits-1) relative error (~6% by
+    default) with a few hundred buckets at most, whatever the range.
+    Exported as a Prometheus summary (quantiles, _sum, _count).
+    """
+
+    enabled = True
+    kind = "summary"
+
+    def __init__(self, name, help, labels, scale: float = 1e6, sub_bits: int = 5):
+        self.name, self.help, self.labels = name, help, labels
+        self.scale = float(scale)
+        self.sub_bits = int(sub_bits)
+        self._sub = 1 << self.sub_bits
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        n = int(value * self.scale)
+        if n < self._sub:
+            key = n if n > 0 else 0
+        else:
+            shift = n.bit_length() - self.sub_bits
+            key = shift * self._sub + (n >> shift)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def time(self):
+        return _Timer(self)
+
+    def _bucket_mid(self, key: int) -> float:
+        shift, mantissa = divmod(key, self._sub)
+        if shift == 0:
+            return mantissa / self.scale
+        return ((mantissa << shift) + (1 << (shift - 1))) / self.scale
+
+    def quantiles(self, qs=QUANTILES) -> List[float]:
+        if not self.count:
+            return [0.0 for _ in qs]
+        items = sorted(self._counts.items())
+        out = []
+        for q in qs:
+            rank = q * self.count
+            seen = 0
+            for key, c in items:
+                seen += c
+                if seen >= rank:
+                    out.append(min(self._bucket_mid(key), self.max))
+                    break
+            else:
+                out.append(self.max)
+        return out
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _key(name: str, labels: Optional[Dict]) -> Tuple:
+    return (name, tuple(sorted((labels or {}).items())))
+
+
+def _fmt_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms, each optionally with labels.
+    While `enabled` is False every factory returns NULL, whose methods do
+    nothing, so instrumented code costs one no-op call per event. Enable
+    the registry before creating the components to be measured.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        self._last_counts: Dict[Tuple, float] = {}
+        self._last_line = time.time()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        if not self.enabled:
+            return NULL
+        key = _key(name, labels)
+        m = self._metrics.get(key)
+        if m is None:
+            with self._lock:
+                m = self._metrics.get(key)
+                if m is None:
+                    m = cls(name, help, key[1], **kwargs)
+                    self._metrics[key] = m
+        return m
+
+    def counter(self, name: str, help: str = "", labels: Optional[Dict] = None,
+                fn: Optional[Callable] = None):
+        if fn is not None:
+            return self._callback(name, help, labels, "counter", fn)
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", labels: Optional[Dict] = None,
+              fn: Optional[Callable] = None):
+        if fn is not None:
+            return self._callback(name, help, labels, "gauge", fn)
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str = "", labels: Optional[Dict] = None,
+                  scale: float = 1e6):
+        return self._get(Histogram, name, help, labels, scale=scale)
+
+    def _callback(self, name, help, labels, kind, fn):
+        if not self.enabled:
+            return NULL
+        # a newer component of the same name replaces the old callback
+        m = Callback(name, help, _key(name, labels)[1], kind, fn)
+        with self._lock:
+            self._metrics[_key(name, labels)] = m
+        return m
+
+    def metrics(self) -> List:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        seen = set()
+        for m in sorted(self.metrics(), key=lambda m: m.name):
+            if m.name not in seen:
+                seen.add(m.name)
+                if m.help:
+                    lines.append(f"# HELP {m.name} {m.help}")
+                lines.append(f"# TYPE {m.name} {m.kind}")
+            if isinstance(m, Histogram):
+                for q, v in zip(QUANTILES, m.quantiles()):
+                    lines.append(f"{m.name}{_fmt_labels(m.labels, [('quantile', q)])} {v:.9g}")
+                lines.append(f"{m.name}_sum{_fmt_labels(m.labels)} {m.sum:.9g}")
+                lines.append(f"{m.name}_count{_fmt_labels(m.labels)} {m.count}")
+            else:
+                lines.append(f"{m.name}{_fmt_labels(m.labels)} {m.get():.9g}")
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self) -> str:
+        """One-line summary: counter rates since the previous call, gauges, histogram p50/p99."""
+        now = time.time()
+        dt = max(now - self._last_line, 1e-9)
+        self._last_line = now
+        parts = []
+        for m in sorted(self.metrics(), key=lambda m: (m.name, m.labels)):
+            name = m.name + _fmt_labels(m.labels)
+            if isinstance(m, Histogram):
+                if m.count:
+                    p50, p99 = m.quantiles((0.5, 0.99))
+                    parts.append(f"{name} p50={p50 * 1e3:.3g}ms p99={p99 * 1e3:.3g}ms"
+                                 if m.scale >= 1e3 else f"{name} p50={p50:.3g} p99={p99:.3g}")
+            elif m.kind == "counter":
+                key = _key(m.name, dict(m.labels))
+                v = m.get()
+                rate = (v - self._last_counts.get(key, 0)) / dt
+                self._last_counts[key] = v
+                parts.append(f"{name}={v:.0f} ({rate:.1f}/s)")
+            else:
+                parts.append(f"{name}={m.get():.4g}")
+        return " ".join(parts)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def configure(enabled: bool):
+    REGISTRY.enabled = bool(enabled)
+
+
+def counter(name, help="", labels=None, fn=None):
+    return REGISTRY.counter(name, help, labels, fn)
+
+
+def gauge(name, help="", labels=None, fn=None):
+    return REGISTRY.gauge(name, help, labels, fn)
+
+
+def histogram(name, help="", labels=None, scale=1e6):
+    return REGISTRY.histogram(name, help, labels, scale)
+
+
+class MetricsServer:
+    """Serves REGISTRY.render() on http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry = None, host: str = "127.0.0.1", port: int = 9108):
+        registry = registry or REGISTRY
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsLogger:
+    """Prints REGISTRY.summary_line() every `interval` seconds."""
+
+    def __init__(self, registry: MetricsRegistry = None, interval: float = 30.0):
+        self.registry = registry or REGISTRY
+        self.interval = float(interval)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print("[metrics]", self.registry.summary_line())
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
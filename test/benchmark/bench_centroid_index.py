@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Nearest-centre lookup cost vs number of clusters k for the CentroidIndex
+backends Analyzer can use: kmeans.predict (sklearn), numpy brute force and
+a KD-tree (exact and with eps > 0). Centres and queries are drawn from the
+same clustered 8-D distribution (plus 2% outliers) as in the scaled feature
+space. For every approximate mode the distance error and the label agreement
+with the exact path (threshold = 98th percentile of exact distances) are
+reported.
+
+    python test/benchmark/bench_centroid_index.py
+    python test/benchmark/bench_centroid_index.py --k 30 1000 --eps 0 0.5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.models.centroid_index import CentroidIndex
+
+DIMS = 8
+K_VALUES = [30, 100, 300, 1000, 3000, 10000]
+EPS_VALUES = [0.0, 0.1, 0.5]
+N_SINGLE = 2000      # one-row queries (Analyzer.score)
+N_BATCH = 20000      # rows per batch query
+THRESHOLD_PERCENTILE = 98
+
+
+def fake_kmeans(k, rng):
+    """A fitted MiniBatchKMeans whose centres are set directly (fitting k=10000 takes minutes)."""
+    km = MiniBatchKMeans(n_clusters=k, n_init=1, random_state=0)
+    km.fit(rng.normal(size=(k, DIMS)))
+    blobs = rng.normal(scale=3.0, size=(max(4, k // 50), DIMS))
+    km.cluster_centers_ = blobs[rng.integers(len(blobs), size=k)] + rng.normal(scale=0.5, size=(k, DIMS))
+    return km
+
+
+def queries(km, n, rng):
+    c = km.cluster_centers_
+    X = c[rng.integers(len(c), size=n)] + rng.normal(scale=0.3, size=(n, DIMS))
+    out = rng.random(n) < 0.02
+    X[out] += rng.normal(scale=5.0, size=(out.sum(), DIMS))
+    return X
+
+
+def single_us(index, X):
+    query = index.query
+    t0 = time.perf_counter()
+    for i in range(len(X)):
+        query(X[i:i + 1])
+    return (time.perf_counter() - t0) / len(X) * 1e6
+
+
+def batch_rows_s(index, X):
+    t0 = time.perf_counter()
+    index.query(X)
+    return len(X) / (time.perf_counter() - t0)
+
+
+def bench(k_values, eps_values):
+    rng = np.random.default_rng(1)
+    print(f"[bench_centroid_index] {'k':>6s} {'mode':14s} {'1-row us':>9s} {'batch rows/s':>13s} "
+          f"{'max err':>8s} {'mean err':>9s} {'labels':>8s}")
+    for k in k_values:
+        km = fake_kmeans(k, rng)
+        Xs, Xb = queries(km, N_SINGLE, rng), queries(km, N_BATCH, rng)
+        exact, _ = CentroidIndex(km, "brute").query(Xb)
+        threshold = np.percentile(exact, THRESHOLD_PERCENTILE)
+        modes = [("sklearn", "sklearn", 0.0), ("brute", "brute", 0.0)]
+        modes += [(f"kdtree eps={e:g}", "kdtree", e) for e in eps_values]
+        for name, backend, eps in modes:
+            index = CentroidIndex(km, backend, eps)
+            d, _ = index.query(Xb)
+            err = d / np.maximum(exact, 1e-12) - 1.0
+            agree = np.mean((d > threshold) == (exact > threshold))
+            print(f"[bench_centroid_index] {k:6d} {name:14s} {single_us(index, Xs):9.1f} "
+                  f"{batch_rows_s(index, Xb):13,.0f} {err.max():8.2%} {err.mean():9.3%} {agree:8.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=K_VALUES)
+    parser.add_argument("--eps", type=float, nargs="+", default=EPS_VALUES)
+    args = parser.parse_args(argv)
+    bench(args.k, args.eps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.ingestion.flow_aggregator import FlowAggregator
+from generators import benign_mix
+
+N_PACKETS = 300_000
+REPEATS = 3
+
+
+def per_packet_ns(extended, packets):
+    best = float("inf")
+    for _ in range(REPEATS):
+        agg = FlowAggregator(timeout=10, bidirectional=True, active_timeout=None,
+                             extended_stats=extended)
+        push = agg.push_packet
+        t0 = time.perf_counter()
+        for src, dst, sport, dport, proto, size, flags, ts in packets:
+            push(src, dst, sport, dport, proto, size, ts=ts, flags=flags)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(packets) * 1e9, agg
+
+
+def bench():
+    packets = benign_mix(n_packets=N_PACKETS)
+    basic_ns, _ = per_packet_ns(False, packets)
+    ext_ns, agg = per_packet_ns(True, packets)
+    print(f"[bench_flow_stats] basic    push_packet: {basic_ns:8.0f} ns/pkt")
+    print(f"[bench_flow_stats] extended push_packet: {ext_ns:8.0f} ns/pkt "
+          f"(+{ext_ns - basic_ns:.0f} ns, x{ext_ns / basic_ns:.2f})")
+
+    flows = agg.force_close_all()
+    t0 = time.perf_counter()
+    for f in flows:
+        f.to_dict()
+    dt = time.perf_counter() - t0
+    print(f"[bench_flow_stats] extended to_dict     : {dt / len(flows) * 1e6:8.1f} us/flow "
+          f"({len(flows)} flows)")
+
+
+if __name__ == "__main__":
+    bench()
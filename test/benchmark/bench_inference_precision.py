@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Analyzer scoring in float64 (the original scaler.transform + kmeans.predict
+path) vs the CompactModel precisions (float32, int16, int8), on a validation
+set of flow records:
+  - throughput (rows/s) per batch size of flow dicts (what FlowPipeline
+    passes, includes building the feature matrix) and on one feature matrix
+  - label agreement and largest score difference against float64
+  - bytes of the model arrays and of one batch of feature rows
+
+The validation set is data/flows/processed/merged_dataset.parquet when it
+exists (or --parquet), otherwise the flows FlowAggregator extracts from the
+generated "mixed" scenario (benign traffic plus every attack).
+
+    python test/benchmark/bench_inference_precision.py
+    python test/benchmark/bench_inference_precision.py --parquet other.parquet --rows 500000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.models.analyzer import Analyzer
+from src.models.compact_model import CompactModel, PRECISIONS
+from src.models.features import FEATURES
+from generators import mixed
+
+PARQUET_FILE = os.path.join(PROJECT_ROOT, "data", "flows", "processed", "merged_dataset.parquet")
+N_ROWS = 200_000
+BATCH_SIZES = [1, 64, 1024, 16384]
+REPEATS = 3
+
+
+def validation_set(parquet, n_rows):
+    if parquet and os.path.exists(parquet):
+        import pandas as pd
+        df = pd.read_parquet(parquet, columns=FEATURES)
+        print(f"[bench_inference_precision] validation set: {parquet}")
+        return df.iloc[:n_rows].reset_index(drop=True)
+    agg = FlowAggregator(timeout=10.0, bidirectional=True, idle_timeouts={6: 10.0, 17: 5.0}, linger=1.0)
+    rows = []
+    for src, dst, sport, dport, proto, size, flags, ts in mixed(n_benign=400_000, duration=60.0):
+        agg.push_packet(src, dst, sport, dport, proto, size, ts=ts, flags=flags)
+        for f in agg.extract_ready_flows(now=ts):
+            rows.append(f.to_dict())
+    rows += [f.to_dict() for f in agg.force_close_all()]
+    print(f"[bench_inference_precision] validation set: {len(rows)} flows from the mixed scenario")
+    import pandas as pd
+    return pd.DataFrame(rows)[FEATURES].iloc[:n_rows].reset_index(drop=True)
+
+
+def rows_per_s(analyzer, records, batch):
+    # flow dicts, as FlowPipeline hands them over
+    n = min(len(records), max(batch * 20, 2000))
+    chunks = [records[s:s + batch] for s in range(0, n, batch)]
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        for c in chunks:
+            analyzer.score_batch(c)
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+
+def matrix_rows_per_s(analyzer, df):
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        analyzer.score_batch(df)
+        best = min(best, time.perf_counter() - t0)
+    return len(df) / best
+
+
+def bench(parquet, n_rows):
+    df = validation_set(parquet, n_rows)
+    reference = Analyzer(precision="float64")
+    ref_scores = reference.score_batch(df)
+    label = np.vectorize(reference.label_from_score, otypes=[object])
+    ref_labels = label(ref_scores)
+    records = df.to_dict("records")
+    counts = {lb: int((ref_labels == lb).sum()) for lb in ("benign", "suspicious", "attack")}
+    print(f"[bench_inference_precision] {len(df)} rows, float64 labels {counts}")
+
+    header = " ".join(f"{'rows/s @' + str(b):>15s}" for b in BATCH_SIZES)
+    print(f"[bench_inference_precision] {'precision':9s} {header} {'matrix rows/s':>14s} {'agree':>8s} {'max |d|':>9s} "
+          f"{'model B':>8s} {'batch KiB':>9s}")
+    for precision in PRECISIONS:
+        analyzer = reference if precision == "float64" else Analyzer(precision=precision)
+        scores = analyzer.score_batch(df)
+        agree = float((label(scores) == ref_labels).mean())
+        max_diff = float(np.abs(scores - ref_scores).max())
+        if precision == "float64":
+            model_bytes = reference.scaler.mean_.nbytes * 2 + reference.kmeans.cluster_centers_.nbytes
+            item = 8
+        else:
+            compact = CompactModel(reference.scaler, reference.kmeans, precision)
+            model_bytes = compact.nbytes()
+            item = compact.qcenters.itemsize if compact.qcenters is not None else 4
+        batch_kib = max(BATCH_SIZES) * len(FEATURES) * item / 1024
+        speeds = " ".join(f"{rows_per_s(analyzer, records, b):15,.0f}" for b in BATCH_SIZES)
+        print(f"[bench_inference_precision] {precision:9s} {speeds} {matrix_rows_per_s(analyzer, df):14,.0f} "
+              f"{agree:8.3%} {max_diff:9.2e} "
+              f"{model_bytes:8d} {batch_kib:9.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parquet", default=PARQUET_FILE)
+    parser.add_argument("--rows", type=int, default=N_ROWS)
+    args = parser.parse_args(argv)
+    bench(args.parquet, args.rows)
+
+
+if __name__ == "__main__":
+    main()
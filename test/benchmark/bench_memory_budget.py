@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Memory of the capture pipeline under a SYN flood from spoofed sources
+(every packet a new flow and, mostly, a new source), without and with a
+MemoryBudget (src/capture/memory_budget.py). The pipeline is the one
+capture_live builds: FlowAggregator with early scoring, HostAggregator,
+DecisionController (fake firewall), Analyzer if models/ loads, flow-hash
+PacketSampler; the budget is checked after every batch, as capture_live does.
+
+Each run is a fresh process; its budget is the start-up RSS plus
+--budget-mb. Reported: packets/s, RSS growth, largest flow table, flows
+flushed early, final sampling rate, degradation level changes.
+
+    python test/benchmark/bench_memory_budget.py
+    python test/benchmark/bench_memory_budget.py --packets 2000000 --budget-mb 64 128
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.capture.memory_budget import MemoryBudget, current_rss
+from src.capture.pipeline import FlowPipeline
+from src.capture.sampling import PacketSampler
+from src.control.decision_controller import DecisionController
+from src.control.firewall_backend import IpsetBackend, FakeCommandRunner
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.ingestion.host_aggregator import HostAggregator
+
+N_PACKETS = 1_000_000
+BUDGETS_MB = [0, 48]
+RATE = 100_000
+BATCH = 512
+START_TS = 1_000_000.0
+TARGET_IP = "192.168.0.10"
+
+# capture_live defaults (capture_live itself needs scapy to import)
+FLOW_TIMEOUT = 10.0
+PROTO_TIMEOUTS = {6: FLOW_TIMEOUT, 17: 5.0}
+ACTIVE_TIMEOUT = 60.0
+FLOW_LINGER = 1.0
+EARLY_SCORE_PACKETS = 20
+EARLY_SCORE_SECONDS = 1.0
+RESCORE_INTERVAL = 1.0
+HOST_WINDOW = 5.0
+MEMORY_SHARES = {"flows": 0.5, "controller": 0.2, "hosts": 0.15, "score_cache": 0.1}
+
+
+def spoofed_syn_flood(n_packets, rate=RATE, seed=5):
+    """Bare SYNs to one port from random sources in 100.64.0.0/10, generated lazily."""
+    rng = random.Random(seed)
+    step = 1.0 / rate
+    for i in range(n_packets):
+        a = rng.getrandbits(22)
+        src = f"100.{64 + (a >> 16)}.{(a >> 8) & 255}.{a & 255}"
+        yield (src, TARGET_IP, rng.randint(1024, 65535), 80, 6, 54, 0x02, START_TS + i * step)
+
+
+def run(n_packets: int, budget_mb: float) -> dict:
+    try:
+        from src.models.analyzer import Analyzer
+        analyzer = Analyzer()
+    except Exception as e:
+        print(f"[bench_memory_budget] Analyzer not available, flows stay unscored: {e}")
+        analyzer = None
+
+    aggregator = FlowAggregator(timeout=FLOW_TIMEOUT, bidirectional=True, idle_timeouts=PROTO_TIMEOUTS,
+                                active_timeout=ACTIVE_TIMEOUT, linger=FLOW_LINGER,
+                                provisional_packets=EARLY_SCORE_PACKETS,
+                                provisional_seconds=EARLY_SCORE_SECONDS,
+                                rescore_interval=RESCORE_INTERVAL)
+    hosts = HostAggregator(window=HOST_WINDOW)
+    workdir = tempfile.mkdtemp(prefix="bench_memory_budget_")
+    state = os.path.join(workdir, "temp_blocks.json")
+    controller = DecisionController(backend=IpsetBackend(runner=FakeCommandRunner()), state_file=state)
+    # fixed 1 in 1: only memory pressure may engage sampling
+    sampler = PacketSampler(auto=False)
+
+    budget = None
+    start_rss = current_rss()
+    if budget_mb:
+        budget = MemoryBudget(start_rss + int(budget_mb * 2 ** 20), interval=0.2)
+        components = {"flows": aggregator, "controller": controller, "hosts": hosts,
+                      "score_cache": analyzer.cache if analyzer is not None else None, "sampler": sampler}
+        for name, component in components.items():
+            if component is not None:
+                budget.register(name, component, MEMORY_SHARES.get(name, 0.0))
+
+    pipeline = FlowPipeline(aggregator, analyzer, controller, hosts=hosts, sampler=sampler,
+                            host_eval_interval=1.0)
+    peak_rss = start_rss
+    max_flows = 0
+    batch = []
+    t0 = time.perf_counter()
+    for pkt in spoofed_syn_flood(n_packets):
+        batch.append(("bench", pkt[7], pkt[:7]))
+        if len(batch) == BATCH:
+            pipeline.handle_batch(batch)
+            batch = []
+            if budget is not None:
+                budget.check()
+            max_flows = max(max_flows, len(aggregator))
+            if len(aggregator) == max_flows or budget is not None:
+                peak_rss = max(peak_rss, current_rss())
+    if batch:
+        pipeline.handle_batch(batch)
+    elapsed = time.perf_counter() - t0
+    peak_rss = max(peak_rss, current_rss())
+    controller.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "budget_mb": budget_mb,
+        "pkts_per_s": n_packets / elapsed,
+        "rss_growth_mb": (peak_rss - start_rss) / 2 ** 20,
+        "max_flows": max_flows,
+        "evicted": aggregator.evicted,
+        "sampling_rate": sampler.rate,
+        "level_changes": budget.level_changes if budget is not None else 0,
+        "blocked": controller.stats()["blocked"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=N_PACKETS)
+    parser.add_argument("--budget-mb", type=float, nargs="+", default=BUDGETS_MB,
+                        help="MB above start-up RSS, 0 = no budget")
+    args = parser.parse_args(argv)
+
+    ctx = mp.get_context("spawn")
+    print(f"[bench_memory_budget] spoofed SYN flood, {args.packets} packets at {RATE} pkt/s")
+    print(f"  {'budget':>8s} {'pkt/s':>9s} {'rss +MB':>8s} {'max flows':>10s} {'evicted':>9s} "
+          f"{'sampling':>8s} {'levels':>6s} {'blocked':>8s}")
+    for budget_mb in args.budget_mb:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run, (args.packets, budget_mb))
+        name = f"{budget_mb:.0f} MB" if budget_mb else "none"
+        print(f"  {name:>8s} {r['pkts_per_s']:9.0f} {r['rss_growth_mb']:8.1f} {r['max_flows']:10d} "
+              f"{r['evicted']:9d} {'1/' + str(r['sampling_rate']):>8s} {r['level_changes']:6d} "
+              f"{r['blocked']:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+In-process benchmark of the capture pipeline: FlowAggregator (capture_live
+settings) -> Analyzer.score -> CSV sink, on the synthetic scenarios of
+generators.py. Each scenario runs in a fresh process so peak RSS is its own.
+Results go to a JSON file; --compare prints the change against an older run.
+
+    python test/benchmark/bench_pipeline.py
+    python test/benchmark/bench_pipeline.py --packets 100000 --scenarios syn_flood hulk
+    python test/benchmark/bench_pipeline.py --compare test/benchmark/results/pipeline_<rev>.json
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+if CURRENT not in sys.path:
+    sys.path.insert(0, CURRENT)
+
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.reporting.metrics import Histogram
+from generators import SCENARIOS
+
+N_PACKETS = 200_000
+RESULTS_DIR = os.path.join(CURRENT, "results")
+# a metric this much worse than the baseline is reported as a regression
+REGRESSION_TOLERANCE = 0.10
+
+# capture_live defaults (capture_live itself needs scapy to import)
+FLOW_TIMEOUT = 10.0
+PROTO_TIMEOUTS = {6: FLOW_TIMEOUT, 17: 5.0}
+ACTIVE_TIMEOUT = 60.0
+FLOW_LINGER = 1.0
+EARLY_SCORE_PACKETS = 20
+EARLY_SCORE_SECONDS = 1.0
+RESCORE_INTERVAL = 1.0
+
+# higher is better for these, lower for everything else that is compared
+HIGHER_IS_BETTER = {"pkts_per_s", "flows_per_s"}
+COMPARED = ["pkts_per_s", "flows_per_s", "pkt_p50_us", "pkt_p99_us", "score_p50_us", "score_p99_us",
+            "peak_rss_mb"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_scenario(name: str, n_packets: int) -> dict:
+    packets = SCENARIOS[name](n_packets)
+    input_rss = peak_rss_mb()
+
+    try:
+        from src.models.analyzer import Analyzer
+        analyzer = Analyzer()
+    except Exception as e:
+        print(f"[bench_pipeline] Analyzer not available, scoring skipped: {e}")
+        analyzer = None
+
+    agg = FlowAggregator(timeout=FLOW_TIMEOUT, bidirectional=True, idle_timeouts=PROTO_TIMEOUTS,
+                         active_timeout=ACTIVE_TIMEOUT, linger=FLOW_LINGER,
+                         provisional_packets=EARLY_SCORE_PACKETS,
+                         provisional_seconds=EARLY_SCORE_SECONDS,
+                         rescore_interval=RESCORE_INTERVAL)
+    pkt_lat = Histogram("pkt", "", (), scale=1e9)
+    score_lat = Histogram("score", "", (), scale=1e9)
+    csv_time = 0.0
+    flows = scored = 0
+    labels = {}
+
+    def score(rec):
+        nonlocal scored
+        if analyzer is None:
+            return
+        t = time.perf_counter()
+        s = analyzer.score(rec)
+        score_lat.observe(time.perf_counter() - t)
+        lb = analyzer.label_from_score(s)
+        rec["anomaly_score"], rec["label"] = s, lb
+        labels[lb] = labels.get(lb, 0) + 1
+        scored += 1
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "w", newline="") as out:
+        writer = None
+        push = agg.push_packet
+        perf = time.perf_counter
+        t_start = perf()
+        for src, dst, sport, dport, proto, size, flags, ts in packets:
+            t0 = perf()
+            push(src, dst, sport, dport, proto, size, ts=ts, flags=flags)
+            for f in agg.extract_provisional_flows(now=ts):
+                score(f.to_dict())
+            ready = agg.extract_ready_flows(now=ts)
+            if ready:
+                rows = []
+                for f in ready:
+                    rec = f.to_dict()
+                    score(rec)
+                    rows.append(rec)
+                t1 = perf()
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(rows[0]) + ["anomaly_score", "label"],
+                                            extrasaction="ignore")
+                    writer.writeheader()
+                writer.writerows(rows)
+                csv_time += perf() - t1
+                flows += len(rows)
+            pkt_lat.observe(perf() - t0)
+        remaining = agg.force_close_all()
+        flows += len(remaining)
+        elapsed = perf() - t_start
+    os.unlink(path)
+
+    p50, p99 = pkt_lat.quantiles((0.5, 0.99))
+    s50, s99 = score_lat.quantiles((0.5, 0.99))
+    return {
+        "packets": len(packets),
+        "flows": flows,
+        "seconds": round(elapsed, 3),
+        "pkts_per_s": round(len(packets) / elapsed, 1),
+        "flows_per_s": round(flows / elapsed, 1),
+        "pkt_p50_us": round(p50 * 1e6, 2),
+        "pkt_p99_us": round(p99 * 1e6, 2),
+        "pkt_max_us": round(pkt_lat.max * 1e6, 2),
+        "scored": scored,
+        "score_p50_us": round(s50 * 1e6, 2),
+        "score_p99_us": round(s99 * 1e6, 2),
+        "labels": labels,
+        "score_cache_hit_rate": analyzer.cache.stats()["hit_rate"] if analyzer and analyzer.cache else None,
+        "csv_seconds": round(csv_time, 3),
+        "input_rss_mb": round(input_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def git_rev() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict) -> int:
+    """Print per-metric changes; returns the number of regressions."""
+    regressions = 0
+    print(f"[bench_pipeline] vs {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for name, res in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        parts = []
+        for key in COMPARED:
+            a, b = old.get(key), res.get(key)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if key in HIGHER_IS_BETTER else change
+            mark = ""
+            if worse > REGRESSION_TOLERANCE:
+                mark = " REGRESSION"
+                regressions += 1
+            parts.append(f"{key} {change:+.1%}{mark}")
+        print(f"  {name:10s} " + ", ".join(parts))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=N_PACKETS)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--out", help="result file (default: results/pipeline_<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    result = {
+        "commit": git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "packets": args.packets,
+        "scenarios": {},
+    }
+    ctx = mp.get_context("spawn")
+    for name in args.scenarios:
+        with ctx.Pool(1) as pool:
+            res = pool.apply(run_scenario, (name, args.packets))
+        result["scenarios"][name] = res
+        print(f"[bench_pipeline] {name:10s} {res['pkts_per_s']:>10.0f} pkt/s {res['flows_per_s']:>9.0f} flows/s "
+              f"p50 {res['pkt_p50_us']:6.1f} us p99 {res['pkt_p99_us']:7.1f} us "
+              f"score p99 {res['score_p99_us']:6.1f} us rss {res['peak_rss_mb']:6.1f} MiB")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline_{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"[bench_pipeline] results written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(result, baseline) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import random
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.control.prefix_map import PrefixMap
+
+N_PREFIXES = 100_000
+N_LOOKUPS = 500_000
+SEED = 42
+
+
+def random_v4_prefix(rng):
+    plen = rng.choice([16, 20, 22, 24, 24, 24, 28, 32])
+    addr = rng.getrandbits(32)
+    return f"{addr >> 24}.{(addr >> 16) & 255}.{(addr >> 8) & 255}.{addr & 255}/{plen}"
+
+
+def random_v6_prefix(rng):
+    plen = rng.choice([32, 48, 56, 64, 64, 128])
+    groups = [f"{rng.getrandbits(16):x}" for _ in range(8)]
+    return ":".join(groups) + f"/{plen}"
+
+
+def random_v4(rng):
+    a = rng.getrandbits(32)
+    return f"{a >> 24}.{(a >> 16) & 255}.{(a >> 8) & 255}.{a & 255}"
+
+
+def bench():
+    rng = random.Random(SEED)
+    pm = PrefixMap()
+
+    t0 = time.perf_counter()
+    for i in range(N_PREFIXES):
+        pm.insert(random_v6_prefix(rng) if i % 10 == 0 else random_v4_prefix(rng))
+    build = time.perf_counter() - t0
+    print(f"[bench_prefix_map] loaded {len(pm)} distinct prefixes in {build:.2f}s")
+
+    addrs = [random_v4(rng) for _ in range(N_LOOKUPS)]
+
+    t0 = time.perf_counter()
+    hits = sum(1 for a in addrs if a in pm)
+    dt = time.perf_counter() - t0
+    print(f"[bench_prefix_map] contains: {N_LOOKUPS / dt:,.0f} lookups/s ({hits} hits)")
+
+    t0 = time.perf_counter()
+    for a in addrs:
+        pm.lookup(a)
+    dt = time.perf_counter() - t0
+    print(f"[bench_prefix_map] longest match: {N_LOOKUPS / dt:,.0f} lookups/s")
+
+    exact = set(addrs[: N_PREFIXES])
+    t0 = time.perf_counter()
+    for a in addrs:
+        a in exact
+    dt = time.perf_counter() - t0
+    print(f"[bench_prefix_map] baseline set[str]: {N_LOOKUPS / dt:,.0f} lookups/s")
+
+
+if __name__ == "__main__":
+    bench()
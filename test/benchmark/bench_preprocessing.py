@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Raw features vs preprocessing.Preprocessor (log1p, ratios, clipping) in
+front of the StandardScaler + MiniBatchKMeans of train_models.py:
+  - cost: ns per row of the transform and of scoring a batch with and
+    without it
+  - detection quality: both models are trained the same way on flows of
+    generated benign traffic (threshold = 98th percentile of the training
+    scores) and evaluated on the flows of the "mixed" scenario with another
+    seed: recall per attack type, benign false positive rate, ROC AUC.
+
+    python test/benchmark/bench_preprocessing.py
+    python test/benchmark/bench_preprocessing.py --train-packets 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.models.centroid_index import CentroidIndex
+from src.models.features import FEATURES
+from src.models.preprocessing import Preprocessor
+from generators import benign_mix, mixed, label_of
+
+# as train_models.py
+N_CLUSTERS = 30
+THRESHOLD_PERCENTILE = 98
+TRAIN_PACKETS = 600_000
+BATCH = 1024
+REPEATS = 5
+
+
+def flows_of(packets):
+    """(feature matrix, source addresses) of the flows FlowAggregator builds from `packets`."""
+    agg = FlowAggregator(timeout=10.0, bidirectional=True, idle_timeouts={6: 10.0, 17: 5.0}, linger=1.0)
+    recs = []
+    for src, dst, sport, dport, proto, size, flags, ts in packets:
+        agg.push_packet(src, dst, sport, dport, proto, size, ts=ts, flags=flags)
+        recs += [f.to_dict() for f in agg.extract_ready_flows(now=ts)]
+    recs += [f.to_dict() for f in agg.force_close_all()]
+    X = np.array([[float(r.get(f, 0.0)) for f in FEATURES] for r in recs])
+    return X, [r["src_ip"] for r in recs]
+
+
+class Model:
+    def __init__(self, X_train, preprocess: bool):
+        self.pre = Preprocessor(FEATURES).fit(X_train) if preprocess else None
+        Z = self._features(X_train)
+        self.scaler = StandardScaler().fit(Z)
+        self.kmeans = MiniBatchKMeans(n_clusters=N_CLUSTERS, batch_size=5000, random_state=42)
+        self.kmeans.fit(self.scaler.transform(Z))
+        self.index = CentroidIndex(self.kmeans, "brute")
+        self.threshold = np.percentile(self.score(X_train), THRESHOLD_PERCENTILE)
+
+    def _features(self, X):
+        return self.pre.transform(X) if self.pre is not None else X
+
+    def score(self, X):
+        return self.index.query(self.scaler.transform(self._features(X)))[0]
+
+
+def roc_auc(scores, positive):
+    """Probability that a random attack flow outscores a random benign one (ties count half)."""
+    order = np.argsort(scores, kind="mergesort")
+    ranks = np.empty(len(scores))
+    ranks[order] = np.arange(1, len(scores) + 1)
+    # average ranks over ties
+    s = scores[order]
+    start = 0
+    for i in range(1, len(s) + 1):
+        if i == len(s) or s[i] != s[start]:
+            ranks[order[start:i]] = (start + 1 + i) / 2.0
+            start = i
+    n_pos, n_neg = positive.sum(), (~positive).sum()
+    if not n_pos or not n_neg:
+        return float("nan")
+    return float((ranks[positive].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+def ns_per_row(fn, X):
+    chunks = [X[s:s + BATCH] for s in range(0, len(X), BATCH)]
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        for c in chunks:
+            fn(c)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(X) * 1e9
+
+
+def bench(train_packets):
+    X_train, _ = flows_of(benign_mix(n_packets=train_packets, n_flows=train_packets // 20, seed=11,
+                                     rate=20_000))
+    X_test, sources = flows_of(mixed(n_benign=train_packets // 2, duration=60.0, seed=23))
+    kinds = np.array([label_of(s) for s in sources])
+    attack = kinds != "benign"
+    print(f"[bench_preprocessing] train {len(X_train)} benign flows, test {len(X_test)} flows "
+          f"({attack.sum()} attack)")
+
+    models = {"raw": Model(X_train, False), "preprocessed": Model(X_train, True)}
+    pre = models["preprocessed"].pre
+    print(f"[bench_preprocessing] transform: {ns_per_row(pre.transform, X_test):.0f} ns/row "
+          f"(batches of {BATCH}), {len(pre.output_features)} model inputs")
+    for name, m in models.items():
+        print(f"[bench_preprocessing] {name:12s} scoring: {ns_per_row(m.score, X_test):.0f} ns/row")
+
+    types = sorted(set(kinds[attack]))
+    print(f"[bench_preprocessing] {'model':12s} {'AUC':>6s} {'benign FPR':>10s} "
+          + " ".join(f"{t:>10s}" for t in types))
+    for name, m in models.items():
+        scores = m.score(X_test)
+        flagged = scores > m.threshold
+        recall = " ".join(f"{flagged[kinds == t].mean():10.2%}" for t in types)
+        print(f"[bench_preprocessing] {name:12s} {roc_auc(scores, attack):6.3f} "
+              f"{flagged[~attack].mean():10.2%} {recall}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-packets", type=int, default=TRAIN_PACKETS)
+    args = parser.parse_args(argv)
+    bench(args.train_packets)
+
+
+if __name__ == "__main__":
+    main()
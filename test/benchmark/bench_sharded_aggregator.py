@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.ingestion.sharded_aggregator import ShardedFlowAggregator
+from generators import benign_mix
+
+N_PACKETS = 400_000
+N_FLOWS = 20_000
+PKT_RATE = 200_000      # simulated packets per second (timestamps only)
+SHARD_COUNTS = [1, 2, 4, 8]
+SEED = 7
+
+
+def synthetic_packets(n_packets=N_PACKETS, n_flows=N_FLOWS, seed=SEED):
+    """Deterministic mix of TCP/UDP conversations with both directions and FINs."""
+    return benign_mix(n_packets=n_packets, n_flows=n_flows, seed=seed, rate=PKT_RATE)
+
+
+def run(agg, packets, extract_every=256):
+    t0 = time.perf_counter()
+    emitted = 0
+    for i, (src, dst, sport, dport, proto, size, flags, ts) in enumerate(packets):
+        agg.push_packet(src, dst, sport, dport, proto, size, ts=ts, flags=flags)
+        if i % extract_every == 0:
+            emitted += len(agg.extract_ready_flows(now=ts))
+    emitted += len(agg.force_close_all())
+    dt = time.perf_counter() - t0
+    return len(packets) / dt, emitted
+
+
+def bench():
+    packets = synthetic_packets()
+    kwargs = dict(timeout=10, bidirectional=True, idle_timeouts={17: 5.0}, linger=0.2)
+
+    pps, emitted = run(FlowAggregator(**kwargs), packets)
+    print(f"[bench_sharded] in-process      : {pps:>12,.0f} pkt/s  flows={emitted}")
+
+    for n in SHARD_COUNTS:
+        agg = ShardedFlowAggregator(n_shards=n, tick_interval=0.01, **kwargs)
+        try:
+            pps, emitted = run(agg, packets)
+        finally:
+            agg.close()
+        print(f"[bench_sharded] shards={n:<2}       : {pps:>12,.0f} pkt/s  flows={emitted}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic traffic for benchmarks and replay tests.
+Every generator returns a list of packet tuples in timestamp order:
+    (src, dst, sport, dport, proto, size, flags, ts)
+the same fields capture_live.pkt_to_tuple produces (size = frame length).
+Attack generators follow test/integration_test/*.py (ports, flags, payload
+sizes, pacing) with the rate as a parameter instead of send() + sleep().
+"""
+
+import heapq
+import random
+
+TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+START_TS = 1_000_000.0
+ETH_IP_TCP = 54   # Ethernet + IPv4 + TCP headers, no options
+ETH_IP_UDP = 42
+
+TARGET_IP = "192.168.0.10"
+# one source address per attack, so flows can be labelled by source
+ATTACKERS = {
+    "syn_flood": "203.0.113.10",
+    "udp_flood": "203.0.113.20",
+    "hulk": "203.0.113.30",
+}
+BOTNET_NET = "198.51.100."
+USER_AGENTS = ["Mozilla/5.0", "curl/7.58.0", "python-requests/2.26", "Wget/1.19.4"]
+
+
+def label_of(src_ip: str) -> str:
+    """Ground-truth attack type of a generated packet / flow source ('benign' otherwise)."""
+    for name, ip in ATTACKERS.items():
+        if src_ip == ip:
+            return name
+    if src_ip.startswith(BOTNET_NET):
+        return "botnet"
+    return "benign"
+
+
+def label_prefixes() -> dict:
+    """Ground truth as CIDR -> attack type, the format of e2e_regression.py --labels files."""
+    out = {f"{ip}/32": name for name, ip in ATTACKERS.items()}
+    out[BOTNET_NET + "0/24"] = "botnet"
+    return out
+
+
+def benign_mix(n_packets=400_000, n_flows=20_000, seed=7, rate=200_000, start=START_TS):
+    """Mix of TCP/UDP conversations with both directions and FINs; clients open each flow."""
+    rng = random.Random(seed)
+    started = set()
+    flows = []
+    for _ in range(n_flows):
+        client = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        server = f"192.168.{rng.randint(0, 3)}.{rng.randint(1, 20)}"
+        proto = 6 if rng.random() < 0.8 else 17
+        flows.append((client, server, rng.randint(1024, 65535), rng.choice([53, 80, 443, 8080]), proto))
+    ts = start
+    step = 1.0 / rate
+    out = []
+    for i in range(n_packets):
+        idx = rng.randrange(n_flows)
+        client, server, cport, sport, proto = flows[idx]
+        flags = 0
+        if proto == 6:
+            flags = TCP_ACK if i % 50 else TCP_FIN | TCP_ACK
+            if rng.random() < 0.02:
+                flags = TCP_SYN
+        if rng.random() < 0.5 or idx not in started:
+            started.add(idx)
+            out.append((client, server, cport, sport, proto, rng.randint(60, 1500), flags, ts))
+        else:
+            out.append((server, client, sport, cport, proto, rng.randint(60, 1500), flags, ts))
+        ts += step
+    return out
+
+
+def syn_flood(n_packets=100_000, rate=5000, seed=1, start=START_TS, target=TARGET_IP, dport=80):
+    """syn_flood.py: bare SYNs to one port; the source port varies per packet."""
+    rng = random.Random(seed)
+    src = ATTACKERS["syn_flood"]
+    step = 1.0 / rate
+    return [(src, target, rng.randint(1024, 65535), dport, 6, ETH_IP_TCP, TCP_SYN, start + i * step)
+            for i in range(n_packets)]
+
+
+def udp_flood(n_packets=100_000, rate=2000, seed=2, start=START_TS, target=TARGET_IP, dport=80):
+    """udp_flood.py: random 200-1400 byte payloads from port 65535."""
+    rng = random.Random(seed)
+    src = ATTACKERS["udp_flood"]
+    step = 1.0 / rate
+    return [(src, target, 65535, dport, 17, ETH_IP_UDP + rng.randint(200, 1400), 0, start + i * step)
+            for i in range(n_packets)]
+
+
+def hulk(n_packets=60_000, burst_size=1500, delay=0.0003, seed=3, start=START_TS, target=TARGET_IP):
+    """dos_hulk.py: bursts of HTTP GETs (PSH|ACK), one source port per burst."""
+    rng = random.Random(seed)
+    src = ATTACKERS["hulk"]
+    out = []
+    ts = start
+    sport = rng.randint(1024, 65535)
+    for i in range(n_packets):
+        if i % burst_size == 0:
+            sport = rng.randint(1024, 65535)
+            agent = rng.choice(USER_AGENTS)
+            payload = len(f"GET /test/{rng.randint(1, 999999)} HTTP/1.1\r\nHost: {target}\r\n"
+                          f"User-Agent: {agent}\r\nAccept: */*\r\nConnection: Keep-Alive\r\n\r\n")
+        out.append((src, target, sport, 80, 6, ETH_IP_TCP + payload, TCP_PSH | TCP_ACK, ts))
+        ts += delay
+    return out
+
+
+def botnet(duration=300.0, n_bots=20, seed=4, start=START_TS, target=TARGET_IP, port=4444):
+    """botnet_ares.py: each bot sends a beacon, then a C2 command, at irregular intervals."""
+    rng = random.Random(seed)
+    streams = []
+    for b in range(n_bots):
+        src = f"{BOTNET_NET}{b + 1}"
+        ts = start + rng.uniform(0, 2.0)
+        pkts = []
+        while ts < start + duration:
+            pkts.append((src, target, 65000, port, 6, ETH_IP_TCP + 7 + rng.randint(4, 12),
+                         TCP_PSH | TCP_ACK, ts))
+            ts += rng.uniform(0.3, 1.2)
+            pkts.append((src, target, 65000, port, 6, ETH_IP_TCP + 4 + rng.randint(20, 80),
+                         TCP_PSH | TCP_ACK, ts))
+            ts += rng.uniform(0.5, 2.0)
+        streams.append(pkts)
+    return merge(*streams)
+
+
+def merge(*streams):
+    """Interleave packet lists by timestamp."""
+    return list(heapq.merge(*streams, key=lambda p: p[7]))
+
+
+def mixed(n_benign=100_000, duration=30.0, attack_start=5.0, seed=7, start=START_TS,
+          syn_rate=5000, udp_rate=2000, hulk_delay=0.0003, n_bots=20):
+    """
+    Benign background over `duration` seconds with every attack (at the
+    rates of the integration scripts) running from `attack_start` on.
+    """
+    t = start + attack_start
+    span = max(0.0, duration - attack_start)
+    benign = benign_mix(n_packets=n_benign, n_flows=max(1000, n_benign // 20), seed=seed,
+                        rate=n_benign / duration, start=start)
+    return merge(benign,
+                 syn_flood(n_packets=int(syn_rate * span), rate=syn_rate, start=t),
+                 udp_flood(n_packets=int(udp_rate * span), rate=udp_rate, start=t),
+                 hulk(n_packets=int(span / hulk_delay), delay=hulk_delay, start=t),
+                 botnet(duration=span, n_bots=n_bots, start=t))
+
+
+SCENARIOS = {
+    "benign": lambda n: benign_mix(n_packets=n, n_flows=max(1000, n // 20)),
+    "syn_flood": lambda n: syn_flood(n_packets=n, rate=100_000),
+    "udp_flood": lambda n: udp_flood(n_packets=n, rate=100_000),
+    "hulk": lambda n: hulk(n_packets=n),
+    "botnet": lambda n: botnet(duration=n / 20.0, n_bots=20)[:n],
+    "mixed": lambda n: mixed(n_benign=n // 2, duration=n / 20_000)[:n],
+}
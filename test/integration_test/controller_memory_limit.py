@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+DecisionController.set_memory_limit() must cap the temporary-block timers
+(ExpiryScheduler.max_tracked), not only max_blocked and the source tracker:
+timers beyond a lower cap are released right away (nearest expiry first),
+and set_memory_limit(None) restores MAX_TEMP_BLOCKS.
+Runs against a fake firewall, no root needed; exits non-zero on failure.
+
+    python test/integration_test/controller_memory_limit.py
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.control.decision_controller import (BLOCK_BYTES, MAX_TEMP_BLOCKS, MIN_TEMP_BLOCKS,
+                                             DecisionController)
+from src.control.firewall_backend import IpsetBackend, FakeCommandRunner
+
+N_TEMP_BLOCKS = 3000
+
+
+def run() -> list:
+    failures = []
+    workdir = tempfile.mkdtemp(prefix="controller_memory_limit_")
+    controller = DecisionController(backend=IpsetBackend(runner=FakeCommandRunner()),
+                                    state_file=os.path.join(workdir, "temp_blocks.json"),
+                                    aggregate=False, allow_list=[])
+    try:
+        # distinct /24s so no prefix block absorbs the hosts; 10.0.0.x expires first
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(N_TEMP_BLOCKS):
+                controller.temporary_block(f"10.{i // 250}.{i % 250}.1", duration=600 + i)
+        stats = controller.stats()
+        if stats["temp_tracked"] != N_TEMP_BLOCKS:
+            failures.append(f"expected {N_TEMP_BLOCKS} timers, got {stats['temp_tracked']}")
+
+        # budget worth MIN_TEMP_BLOCKS timers (1/3 of the entries)
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller.set_memory_limit(3 * MIN_TEMP_BLOCKS * BLOCK_BYTES)
+        stats = controller.stats()
+        if controller._expiry.max_tracked != MIN_TEMP_BLOCKS:
+            failures.append(f"max_tracked {controller._expiry.max_tracked}, expected {MIN_TEMP_BLOCKS}")
+        if stats["temp_tracked"] != MIN_TEMP_BLOCKS:
+            failures.append(f"{stats['temp_tracked']} timers left, expected {MIN_TEMP_BLOCKS}")
+        released = N_TEMP_BLOCKS - MIN_TEMP_BLOCKS
+        if stats["temp_evicted"] != released:
+            failures.append(f"{stats['temp_evicted']} timers released, expected {released}")
+        if "10.0.0.1" in controller._blocked:
+            failures.append("the nearest expiry was not released")
+        last = N_TEMP_BLOCKS - 1
+        if f"10.{last // 250}.{last % 250}.1" not in controller._blocked:
+            failures.append("the latest expiry was released")
+
+        controller.set_memory_limit(None)
+        if controller._expiry.max_tracked != MAX_TEMP_BLOCKS:
+            failures.append(f"max_tracked {controller._expiry.max_tracked} after reset, "
+                            f"expected {MAX_TEMP_BLOCKS}")
+    finally:
+        controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return failures
+
+
+def main() -> int:
+    failures = run()
+    for f in failures:
+        print(f"[controller_memory_limit] FAIL: {f}")
+    if not failures:
+        print("[controller_memory_limit] ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Labelled end-to-end detection run: replays a pcap through the same
+FlowPipeline capture_live uses (flow + host aggregation, early scoring,
+Analyzer, DecisionController with an ipset backend on a fake runner) and
+reports, per attack type:
+  - flows, detected flows and recall over the flows that got a final
+    verdict (flows still open at the end of the capture are "flushed",
+    unscored, and reported apart)
+  - precision over every positive (suspicious/attack) label, since each one
+    reaches the controller: early and final flow scores and host alerts;
+    the models only tell attack from benign, so the false positives on
+    benign sources are shared by every type
+  - time to label: first attack packet -> first verdict on an attacker
+    (early flow score, final flow score or host alert)
+  - time to block: first attack packet -> first firewall add for an
+    attacker address (or a prefix covering one)
+  - unblocked: attacker addresses removed from the firewall before that
+    attack's last packet
+plus overall precision and the benign sources that got blocked.
+The controller runs on capture time (its clock is the pipeline's), so
+source windows, cooldowns and temporary-block expiries line up with the
+SLA times, i.e. what the sensor would see if processing keeps up; the
+firewall apply latency (wall clock) is reported separately.
+The SLA check runs by default and exits 1 on a violation.
+
+    python test/integration_test/e2e_regression.py                # generated mixed traffic
+    python test/integration_test/e2e_regression.py --pcap x.pcap --labels x.labels.json
+    python test/integration_test/e2e_regression.py --no-check     # report only
+
+Without --pcap, benign background plus every attack of
+test/benchmark/generators.py is written to a pcap (pcap_flood.py) with
+its labels file next to it, and that file is replayed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "test", "benchmark"))
+
+from src.capture.pcap_reader import read_pcap
+from src.capture.pipeline import FlowPipeline
+from src.control.decision_controller import DecisionController
+from src.control.firewall_backend import IpsetBackend, FakeCommandRunner
+from src.control.prefix_map import PrefixMap
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.ingestion.host_aggregator import HostAggregator
+from src.models.features import FEATURES as MODEL_FEATURES, needs_extended_stats
+from generators import mixed, label_prefixes
+from pcap_flood import write_pcap
+
+# capture_live defaults (capture_live itself needs scapy to import)
+FLOW_TIMEOUT = 10.0
+PROTO_TIMEOUTS = {6: FLOW_TIMEOUT, 17: 5.0}
+ACTIVE_TIMEOUT = 60.0
+FLOW_LINGER = 1.0
+EARLY_SCORE_PACKETS = 20
+EARLY_SCORE_SECONDS = 1.0
+RESCORE_INTERVAL = 1.0
+HOST_WINDOW = 5.0
+HOST_EVAL_INTERVAL = 1.0
+
+# SLA (seconds of capture time), checked with --check
+SLA_TIME_TO_LABEL = 2.0
+SLA_TIME_TO_BLOCK = 5.0
+SLA_MIN_PRECISION = 0.95
+
+POSITIVE = ("attack", "suspicious")
+
+
+class RecordingBackend(IpsetBackend):
+    """IpsetBackend (fake runner) that notes (capture time, "block"/"unblock", ip) per change."""
+
+    def __init__(self, clock, **kwargs):
+        self.clock = clock
+        self.events = []
+        super().__init__(**kwargs)
+
+    def add(self, ip: str):
+        self.events.append((self.clock(), "block", ip))
+        super().add(ip)
+
+    def remove(self, ip: str):
+        self.events.append((self.clock(), "unblock", ip))
+        super().remove(ip)
+
+
+def load_labels(path=None) -> PrefixMap:
+    labels = label_prefixes()
+    if path:
+        with open(path) as f:
+            labels = json.load(f)
+    truth = PrefixMap()
+    for cidr, name in labels.items():
+        truth.insert(cidr, name)
+    return truth
+
+
+def truth_of(truth: PrefixMap, ip: str) -> str:
+    hit = truth.lookup(ip) if ip else None
+    return hit[1] if hit else "benign"
+
+
+def run(packets, truth: PrefixMap, state_file: str):
+    try:
+        from src.models.analyzer import Analyzer
+        analyzer = Analyzer()
+    except Exception as e:
+        print("[e2e_regression] Analyzer not available, flows stay unscored:", e)
+        analyzer = None
+
+    pipeline = None
+    clock = lambda: pipeline.now
+    backend = RecordingBackend(clock, runner=FakeCommandRunner())
+    controller = DecisionController(backend=backend, state_file=state_file, clock=clock)
+    aggregator = FlowAggregator(timeout=FLOW_TIMEOUT, bidirectional=True, idle_timeouts=PROTO_TIMEOUTS,
+                                active_timeout=ACTIVE_TIMEOUT, linger=FLOW_LINGER,
+                                extended_stats=needs_extended_stats(MODEL_FEATURES),
+                                provisional_packets=EARLY_SCORE_PACKETS,
+                                provisional_seconds=EARLY_SCORE_SECONDS,
+                                rescore_interval=RESCORE_INTERVAL)
+
+    first_packet = {}
+    last_packet = {}
+    sources = {}    # type -> source addresses seen
+    first_label = {}
+    flows = {}      # type -> [final verdicts, detected]
+    flushed = {}    # type -> flows closed unscored at the end
+    true_pos = {}   # type -> positive labels of any kind on its sources
+    false_pos = 0   # positive labels of any kind on benign sources
+
+    def on_label(rec, label, ts):
+        nonlocal false_pos
+        kind = truth_of(truth, rec.get("src_ip"))
+        if label in POSITIVE:
+            if kind == "benign":
+                false_pos += 1
+            else:
+                true_pos[kind] = true_pos.get(kind, 0) + 1
+                first_label.setdefault(kind, ts)
+        if rec.get("provisional") or rec.get("host_alert"):
+            return
+        counts = flows.setdefault(kind, [0, 0])
+        counts[0] += 1
+        if label in POSITIVE:
+            counts[1] += 1
+
+    def sink(rows):
+        for r in rows:
+            if r.get("label") == "flushed":
+                kind = truth_of(truth, r.get("src_ip"))
+                flushed[kind] = flushed.get(kind, 0) + 1
+
+    pipeline = FlowPipeline(aggregator, analyzer, controller,
+                            hosts=HostAggregator(window=HOST_WINDOW), sink=sink,
+                            host_eval_interval=HOST_EVAL_INTERVAL, on_label=on_label)
+    process = pipeline.process
+    n = 0
+    t0 = time.perf_counter()
+    for src, dst, sport, dport, proto, size, flags, ts in packets:
+        kind = truth_of(truth, src)
+        if kind != "benign":
+            first_packet.setdefault(kind, ts)
+            last_packet[kind] = ts
+        sources.setdefault(kind, set()).add(src)
+        process(src, dst, sport, dport, proto, size, flags, ts)
+        n += 1
+    pipeline.flush()
+    elapsed = time.perf_counter() - t0
+    backend.flush()
+    controller.close()
+
+    first_block = {}
+    blocked_benign = []
+    unblocked = {}  # type -> attacker addresses unblocked while the attack was on
+    kinds_of = {}
+    for ts, action, ip in backend.events:
+        kinds = kinds_of.get(ip)
+        if kinds is None:
+            if "/" in ip:
+                # a prefix block counts for every source it covers
+                net = PrefixMap([ip])
+                kinds = {k for k, ips in sources.items() if any(s in net for s in ips)}
+            else:
+                kinds = {truth_of(truth, ip)}
+            kinds_of[ip] = kinds
+        for kind in kinds:
+            if kind == "benign":
+                if action == "block" and ip not in blocked_benign:
+                    blocked_benign.append(ip)
+            elif action == "block":
+                first_block.setdefault(kind, ts)
+            elif ts < last_packet[kind]:
+                unblocked.setdefault(kind, set()).add(ip)
+
+    report = {"packets": n, "seconds": round(elapsed, 2), "pkts_per_s": round(n / elapsed, 1),
+              "attacks": {}}
+    for kind, start in sorted(first_packet.items()):
+        total, detected = flows.get(kind, [0, 0])
+        tp = true_pos.get(kind, 0)
+        label_at, block_at = first_label.get(kind), first_block.get(kind)
+        report["attacks"][kind] = {
+            "flows": total,
+            "detected": detected,
+            "flushed": flushed.get(kind, 0),
+            "recall": round(detected / total, 4) if total else None,
+            "precision": round(tp / (tp + false_pos), 4) if tp + false_pos else None,
+            "time_to_label": round(label_at - start, 3) if label_at is not None else None,
+            "time_to_block": round(block_at - start, 3) if block_at is not None else None,
+            "unblocked": sorted(unblocked.get(kind, ())),
+        }
+    tp_total = sum(true_pos.values())
+    positives = tp_total + false_pos
+    report["precision"] = round(tp_total / positives, 4) if positives else None
+    report["benign_flows"] = flows.get("benign", [0, 0])[0]
+    report["false_positive_labels"] = false_pos
+    report["benign_blocked"] = blocked_benign
+    stats = backend.stats()
+    report["firewall_apply_latency"] = {"avg": round(stats["avg_latency"], 4),
+                                        "max": round(stats["max_latency"], 4)}
+    return report
+
+
+def check_sla(report) -> list:
+    problems = []
+    for kind, r in report["attacks"].items():
+        if r["time_to_label"] is None or r["time_to_label"] > SLA_TIME_TO_LABEL:
+            problems.append(f"{kind}: time to label {r['time_to_label']} > {SLA_TIME_TO_LABEL}s")
+        if r["time_to_block"] is None or r["time_to_block"] > SLA_TIME_TO_BLOCK:
+            problems.append(f"{kind}: time to block {r['time_to_block']} > {SLA_TIME_TO_BLOCK}s")
+    if report["precision"] is not None and report["precision"] < SLA_MIN_PRECISION:
+        problems.append(f"precision {report['precision']} < {SLA_MIN_PRECISION}")
+        if r["unblocked"]:
+            problems.append(f"{kind}: unblocked during the attack: {', '.join(r['unblocked'][:10])}")
+    if report["benign_blocked"]:
+        problems.append(f"{len(report['benign_blocked'])} benign sources blocked: "
+                        f"{', '.join(report['benign_blocked'][:10])}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pcap", help="labelled pcap to replay (default: generate one)")
+    parser.add_argument("--labels", help="JSON {cidr: attack type} (default: generators.py address plan)")
+    parser.add_argument("--benign", type=int, default=200_000, help="benign packets when generating")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic when generating")
+    parser.add_argument("--out", help="write the report as JSON here")
+    parser.add_argument("--no-check", dest="check", action="store_false",
+                        help="report only, do not exit 1 when an SLA is violated")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="e2e_")
+    pcap, labels = args.pcap, args.labels
+    if not pcap:
+        pcap = os.path.join(workdir, "mixed.pcap")
+        labels = os.path.join(workdir, "mixed.labels.json")
+        n = write_pcap(pcap, mixed(n_benign=args.benign, duration=args.duration))
+        with open(labels, "w") as f:
+            json.dump(label_prefixes(), f, indent=2)
+        print(f"[e2e_regression] generated {n} packets: {pcap}")
+
+    report = run(read_pcap(pcap), load_labels(labels), os.path.join(workdir, "temp_blocks.json"))
+    report["pcap"] = pcap
+
+    print(f"[e2e_regression] {report['packets']} packets in {report['seconds']}s "
+          f"({report['pkts_per_s']:.0f} pkt/s)")
+    print(f"  {'attack':10s} {'flows':>7s} {'detected':>8s} {'flushed':>7s} {'recall':>7s} {'precision':>9s} "
+          f"{'to label':>9s} {'to block':>9s} {'unblocked':>9s}")
+    fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+    for kind, r in report["attacks"].items():
+        print(f"  {kind:10s} {r['flows']:7d} {r['detected']:8d} {r['flushed']:7d} {fmt(r['recall'], '7.2%'):>7s} "
+              f"{fmt(r['precision'], '9.2%'):>9s} {fmt(r['time_to_label'], '8.3f'):>8s}s "
+              f"{fmt(r['time_to_block'], '8.3f'):>8s}s {len(r['unblocked']):9d}")
+    print(f"  precision {fmt(report['precision'], '.2%')}, false positive labels "
+          f"{report['false_positive_labels']} ({report['benign_flows']} benign flows), "
+          f"benign sources blocked {len(report['benign_blocked'])}, "
+          f"firewall apply latency avg {report['firewall_apply_latency']['avg'] * 1e3:.0f} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.check:
+        problems = check_sla(report)
+        for p in problems:
+            print("[e2e_regression] SLA:", p)
+        if problems:
+            print(f"[e2e_regression] FAILED: {len(problems)} SLA violations (--no-check to report only)")
+            return 1
+        print("[e2e_regression] all SLAs met")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Early (provisional) flow verdicts must not block benign sources: through
+FlowPipeline and a real DecisionController (fake firewall, capture-time
+clock), one open flow of 30 packets gets an early score and no final one.
+  - suspicious early score            -> no block, no temporary block
+  - attack early score below the
+    provisional confidence ratio      -> no block
+  - attack early score above it       -> blocked
+Scores come from FixedScoreAnalyzer so each case hits its band exactly;
+exits non-zero on failure.
+
+    python test/integration_test/early_verdict.py
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.capture.pipeline import FlowPipeline
+from src.control.decision_controller import DecisionController
+from src.control.firewall_backend import IpsetBackend, FakeCommandRunner
+from src.ingestion.flow_aggregator import FlowAggregator
+
+EARLY_SCORE_PACKETS = 20
+EARLY_SCORE_SECONDS = 1.0
+START_TS = 1_000_000.0
+THRESHOLD = 1.0
+EARLY_ATTACK_RATIO = 3.0
+SRC_IP = "10.20.30.40"
+
+
+class FixedScoreAnalyzer:
+    """Analyzer stand-in: every flow scores `score`; labels as Analyzer.label_from_score."""
+
+    threshold = THRESHOLD
+
+    def __init__(self, score: float):
+        self.score = score
+        self.scored = 0
+
+    def score_batch(self, recs):
+        self.scored += len(recs)
+        return [self.score] * len(recs)
+
+    def label_from_score(self, score: float) -> str:
+        if score > self.threshold * 1.8:
+            return "attack"
+        if score > self.threshold:
+            return "suspicious"
+        return "benign"
+
+
+def run_case(score: float):
+    workdir = tempfile.mkdtemp(prefix="early_verdict_")
+    pipeline = None
+    controller = DecisionController(backend=IpsetBackend(runner=FakeCommandRunner()),
+                                    state_file=os.path.join(workdir, "temp_blocks.json"),
+                                    allow_list=[], clock=lambda: pipeline.now)
+    aggregator = FlowAggregator(timeout=10.0, bidirectional=True,
+                                provisional_packets=EARLY_SCORE_PACKETS,
+                                provisional_seconds=EARLY_SCORE_SECONDS)
+    analyzer = FixedScoreAnalyzer(score)
+    labels = []
+    pipeline = FlowPipeline(aggregator, analyzer, controller, provisional_attack_ratio=EARLY_ATTACK_RATIO,
+                            on_label=lambda rec, label, ts: labels.append(label))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(30):
+                pipeline.process(SRC_IP, "192.168.0.10", 40000, 443, 6, 600, 0x18, START_TS + i * 0.01)
+        return {
+            "blocked": SRC_IP in controller._blocked,
+            "temp_blocks": controller.stats()["temp_tracked"],
+            "labels": labels,
+            "scored": analyzer.scored,
+        }
+    finally:
+        controller.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> int:
+    cases = [
+        ("suspicious", 1.5 * THRESHOLD, False),
+        ("attack, not confident", 0.5 * (1.8 + EARLY_ATTACK_RATIO) * THRESHOLD, False),
+        ("attack, confident", (EARLY_ATTACK_RATIO + 1.0) * THRESHOLD, True),
+    ]
+    failures = []
+    for name, score, expect_block in cases:
+        r = run_case(score)
+        if not r["scored"]:
+            failures.append(f"{name}: the flow got no early score")
+        if r["blocked"] != expect_block:
+            failures.append(f"{name} (score {score:.2f}): blocked={r['blocked']}, expected {expect_block}")
+        if r["temp_blocks"]:
+            failures.append(f"{name} (score {score:.2f}): {r['temp_blocks']} temporary blocks")
+        if bool(r["labels"]) != expect_block:
+            failures.append(f"{name}: on_label saw {r['labels']}")
+    for f in failures:
+        print(f"[early_verdict] FAIL: {f}")
+    if not failures:
+        print("[early_verdict] ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+High-rate version of the attack scripts in this directory: instead of
+building and send()-ing one scapy packet at a time, frames are packed from
+a fixed header template (only ports, flags, IP id, sequence number and the
+two checksums change) and written to a pcap in large batches, or sent over
+an AF_PACKET socket in paced batches (root only).
+
+    python test/integration_test/pcap_flood.py syn_flood --packets 1000000 -o syn.pcap
+    python test/integration_test/pcap_flood.py mixed --packets 2000000 -o mixed.pcap
+    sudo python test/integration_test/pcap_flood.py udp_flood -o - --send eth0 --rate 200000
+
+Scenarios and their pacing come from test/benchmark/generators.py, so the
+pcap timestamps follow the configured attack rate whatever the write speed.
+Payload bytes are zero and by default only the first `snaplen` bytes of
+each frame are stored (pcap orig_len keeps the full size), which is all
+the sensor looks at; use --snaplen 0 to store full frames. Replay the file
+with capture_live (-i pcap:<file>) or tcpreplay --topspeed.
+"""
+
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "test", "benchmark"))
+
+from generators import SCENARIOS
+
+PCAP_MAGIC = 0xA1B2C3D4
+LINKTYPE_ETHERNET = 1
+DEFAULT_SNAPLEN = 96
+BATCH = 8192
+
+SRC_MAC = bytes.fromhex("020000000001")
+DST_MAC = bytes.fromhex("020000000002")
+
+# Ethernet + IPv4 (no options) + TCP (no options) / UDP
+_ETH_IP = "!6s6sH BBHHHBBH4s4s"
+_TCP = struct.Struct(_ETH_IP + "HHIIBBHHH")
+_UDP = struct.Struct(_ETH_IP + "HHHH")
+_REC = struct.Struct("<IIII")
+
+
+def _fold(s: int) -> int:
+    s = (s & 0xFFFF) + (s >> 16)
+    s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+def _words(b: bytes) -> int:
+    return sum(struct.unpack(f"!{len(b) // 2}H", b))
+
+
+class FrameBuilder:
+    """
+    Packs (src, dst, sport, dport, proto, size, flags) into an Ethernet frame.
+    The checksum contribution of the constant fields (addresses, protocol,
+    TTL) is computed once per address pair; per packet only the varying
+    16-bit words are added. With zero payload the payload adds nothing to
+    the TCP/UDP checksum, so it stays correct for truncated frames.
+    """
+
+    def __init__(self, snaplen: int = DEFAULT_SNAPLEN):
+        self.snaplen = int(snaplen)
+        self._pairs = {}
+        self._ip_id = 0
+        self._seq = 0x1000
+        self._tcp = bytearray(_TCP.size)
+        self._udp = bytearray(_UDP.size)
+
+    def _pair(self, src, dst, proto):
+        key = (src, dst, proto)
+        p = self._pairs.get(key)
+        if p is None:
+            s, d = socket.inet_aton(src), socket.inet_aton(dst)
+            addr = _words(s + d)
+            # version/ihl + tos, ttl + proto
+            ip_base = 0x4500 + (64 << 8 | proto) + addr
+            p = (s, d, ip_base, addr + proto)
+            self._pairs[key] = p
+        return p
+
+    def frame(self, src, dst, sport, dport, proto, size, flags=0):
+        """Returns (stored bytes, original frame length)."""
+        s, d, ip_base, pseudo = self._pair(src, dst, proto)
+        self._ip_id = ip_id = (self._ip_id + 1) & 0xFFFF
+        if proto == 6:
+            total = max(size, _TCP.size)
+            ip_len = total - 14
+            ip_sum = _fold(ip_base + ip_len + ip_id + 0x4000)
+            l4_len = ip_len - 20
+            self._seq = seq = (self._seq + 1) & 0xFFFFFFFF
+            off_flags = 0x5000 | (flags & 0xFF)
+            l4_sum = _fold(pseudo + l4_len + sport + dport + (seq >> 16) + (seq & 0xFFFF)
+                           + off_flags + 0xFFFF)
+            buf = self._tcp
+            _TCP.pack_into(buf, 0, DST_MAC, SRC_MAC, 0x0800,
+                           0x45, 0, ip_len, ip_id, 0x4000, 64, proto, ip_sum, s, d,
+                           sport, dport, seq, 0, 0x50, flags & 0xFF, 0xFFFF, l4_sum, 0)
+        else:
+            total = max(size, _UDP.size)
+            ip_len = total - 14
+            ip_sum = _fold(ip_base + ip_len + ip_id + 0x4000)
+            l4_len = ip_len - 20
+            l4_sum = _fold(pseudo + l4_len + sport + dport + l4_len) or 0xFFFF
+            buf = self._udp
+            _UDP.pack_into(buf, 0, DST_MAC, SRC_MAC, 0x0800,
+                           0x45, 0, ip_len, ip_id, 0x4000, 64, proto, ip_sum, s, d,
+                           sport, dport, l4_len, l4_sum)
+        caplen = total if not self.snaplen else min(total, self.snaplen)
+        if caplen <= len(buf):
+            return bytes(buf[:caplen]), total
+        return bytes(buf) + bytes(caplen - len(buf)), total
+
+
+class PcapWriter:
+    """Classic pcap (microsecond timestamps), written in batches of `batch` records."""
+
+    def __init__(self, path, snaplen: int = DEFAULT_SNAPLEN, batch: int = BATCH):
+        self.f = sys.stdout.buffer if path == "-" else open(path, "wb")
+        self.batch = int(batch)
+        self.f.write(struct.pack("<IHHiIII", PCAP_MAGIC, 2, 4, 0, 0, snaplen or 65535,
+                                 LINKTYPE_ETHERNET))
+        self._buf = bytearray()
+        self._n = 0
+        self.count = 0
+
+    def write(self, ts: float, data: bytes, orig_len: int):
+        sec = int(ts)
+        self._buf += _REC.pack(sec, int((ts - sec) * 1e6), len(data), orig_len)
+        self._buf += data
+        self._n += 1
+        if self._n >= self.batch:
+            self.flush()
+
+    def flush(self):
+        self.f.write(self._buf)
+        self.count += self._n
+        self._buf = bytearray()
+        self._n = 0
+
+    def close(self):
+        self.flush()
+        if self.f is not sys.stdout.buffer:
+            self.f.close()
+
+
+def write_pcap(path, packets, snaplen: int = DEFAULT_SNAPLEN) -> int:
+    """Write generator tuples (src, dst, sport, dport, proto, size, flags, ts) to a pcap."""
+    builder = FrameBuilder(snaplen)
+    writer = PcapWriter(path, snaplen)
+    frame, write = builder.frame, writer.write
+    for src, dst, sport, dport, proto, size, flags, ts in packets:
+        data, orig = frame(src, dst, sport, dport, proto, size, flags)
+        write(ts, data, orig)
+    writer.close()
+    return writer.count
+
+
+def send_frames(iface: str, packets, rate: float = 0.0, batch: int = 256) -> int:
+    """
+    Send full frames on `iface` through an AF_PACKET socket (root only).
+    Frames are built `batch` at a time and sent back to back; pacing to
+    `rate` packets/s (0 = as fast as possible) sleeps once per batch.
+    """
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    sock.bind((iface, 0))
+    builder = FrameBuilder(snaplen=0)
+    send = sock.send
+    sent = 0
+    t0 = time.perf_counter()
+    frames = []
+    try:
+        for src, dst, sport, dport, proto, size, flags, _ts in packets:
+            frames.append(builder.frame(src, dst, sport, dport, proto, size, flags)[0])
+            if len(frames) >= batch:
+                for fr in frames:
+                    send(fr)
+                sent += len(frames)
+                frames = []
+                if rate:
+                    ahead = sent / rate - (time.perf_counter() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        for fr in frames:
+            send(fr)
+        sent += len(frames)
+    finally:
+        sock.close()
+    return sent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=list(SCENARIOS))
+    parser.add_argument("--packets", type=int, default=1_000_000)
+    parser.add_argument("-o", "--out", default=None, help="pcap file ('-' = stdout)")
+    parser.add_argument("--snaplen", type=int, default=DEFAULT_SNAPLEN, help="bytes stored per frame (0 = all)")
+    parser.add_argument("--send", metavar="IFACE", help="send on this interface instead of writing")
+    parser.add_argument("--rate", type=float, default=0.0, help="packets/s when sending (0 = max)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    packets = SCENARIOS[args.scenario](args.packets)
+    t_gen = time.perf_counter() - t0
+    log = sys.stderr if args.out == "-" else sys.stdout
+
+    t0 = time.perf_counter()
+    if args.send:
+        n = send_frames(args.send, packets, rate=args.rate)
+        what = f"sent on {args.send}"
+    else:
+        out = args.out or f"{args.scenario}.pcap"
+        n = write_pcap(out, packets, snaplen=args.snaplen)
+        what = f"written to {out}"
+    dt = time.perf_counter() - t0
+    print(f"[pcap_flood] {n} packets {what} in {dt:.2f}s ({n / dt:,.0f} pkt/s, "
+          f"generation {t_gen:.2f}s)", file=log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+FlowPipeline on a ShardedFlowAggregator (capture_live with FLOW_SHARDS > 0)
+must produce the same flow records and host alerts as on the in-process
+FlowAggregator. Generated mixed traffic (benign background plus every
+attack of test/benchmark/generators.py, at reduced rates) goes through both
+pipelines; flow records are compared without their label (flows a shard
+had not handed back yet come out of the final flush instead), host
+alerts as (host, reason) sets. Also checks that shard_of is stable across
+processes. No Analyzer: flows stay unscored. Exits non-zero on failure.
+
+    python test/integration_test/sharded_pipeline.py
+    python test/integration_test/sharded_pipeline.py --shards 2 4
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import sys
+from collections import Counter
+
+CURRENT = os.path.abspath(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "test", "benchmark"))
+
+from src.capture.pipeline import FlowPipeline
+from src.ingestion.flow_aggregator import FlowAggregator
+from src.ingestion.host_aggregator import HostAggregator
+from src.ingestion.sharded_aggregator import ShardedFlowAggregator, shard_of
+from generators import mixed
+
+# capture_live defaults (capture_live itself needs scapy to import)
+FLOW_TIMEOUT = 10.0
+PROTO_TIMEOUTS = {6: FLOW_TIMEOUT, 17: 5.0}
+ACTIVE_TIMEOUT = 60.0
+FLOW_LINGER = 1.0
+EARLY_SCORE_PACKETS = 20
+EARLY_SCORE_SECONDS = 1.0
+RESCORE_INTERVAL = 1.0
+HOST_WINDOW = 5.0
+HOST_EVAL_INTERVAL = 1.0
+SHARD_TICK_INTERVAL = 0.1
+SHARDS = [2, 4]
+
+RECORD_FIELDS = ("src_ip", "dst_ip", "src_port", "dst_port", "protocol", "tot_fwd_pkts", "tot_bwd_pkts",
+                 "src_bytes", "dst_bytes", "duration", "end_reason")
+
+
+def traffic():
+    return mixed(n_benign=20_000, duration=15.0, attack_start=3.0, syn_rate=400, udp_rate=400,
+                 hulk_delay=0.01, n_bots=5)
+
+
+def run(aggregator, packets):
+    rows = []
+    alerts = set()
+
+    def on_label(rec, label, ts):
+        if rec.get("host_alert"):
+            alerts.add((rec["src_ip"], rec["host_alert"]))
+
+    pipeline = FlowPipeline(aggregator, hosts=HostAggregator(window=HOST_WINDOW), sink=rows.extend,
+                            host_eval_interval=HOST_EVAL_INTERVAL, on_label=on_label)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for src, dst, sport, dport, proto, size, flags, ts in packets:
+            pipeline.process(src, dst, sport, dport, proto, size, flags, ts)
+        pipeline.flush()
+    records = Counter(tuple(round(r[k], 6) if k == "duration" else r[k] for k in RECORD_FIELDS)
+                      for r in rows)
+    return records, alerts
+
+
+def _shards_in_child(keys, n):
+    return [shard_of(*k, n) for k in keys]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=SHARDS)
+    args = parser.parse_args(argv)
+
+    packets = traffic()
+    kwargs = dict(timeout=FLOW_TIMEOUT, bidirectional=True, idle_timeouts=PROTO_TIMEOUTS,
+                  active_timeout=ACTIVE_TIMEOUT, linger=FLOW_LINGER,
+                  provisional_packets=EARLY_SCORE_PACKETS, provisional_seconds=EARLY_SCORE_SECONDS,
+                  rescore_interval=RESCORE_INTERVAL)
+    failures = []
+
+    keys = [p[:5] for p in packets[:1000]]
+    with mp.get_context("spawn").Pool(1) as pool:
+        if pool.apply(_shards_in_child, (keys, 8)) != _shards_in_child(keys, 8):
+            failures.append("shard_of differs between processes")
+
+    expected, expected_alerts = run(FlowAggregator(**kwargs), packets)
+    print(f"[sharded_pipeline] {len(packets)} packets: {sum(expected.values())} flows, "
+          f"{len(expected_alerts)} host alerts in-process")
+    for n in args.shards:
+        agg = ShardedFlowAggregator(n_shards=n, tick_interval=SHARD_TICK_INTERVAL, **kwargs)
+        try:
+            records, alerts = run(agg, packets)
+        finally:
+            agg.close()
+        missing, extra = expected - records, records - expected
+        print(f"[sharded_pipeline] shards={n}: {sum(records.values())} flows, {len(alerts)} host alerts")
+        if missing or extra:
+            failures.append(f"shards={n}: {sum(missing.values())} flow records missing, "
+                            f"{sum(extra.values())} unexpected, e.g. {next(iter(missing or extra))}")
+        if alerts != expected_alerts:
+            failures.append(f"shards={n}: host alerts differ: missing {sorted(expected_alerts - alerts)}, "
+                            f"unexpected {sorted(alerts - expected_alerts)}")
+    for f in failures:
+        print(f"[sharded_pipeline] FAIL: {f}")
+    if not failures:
+        print("[sharded_pipeline] ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())